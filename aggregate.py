@@ -0,0 +1,205 @@
+""" Puts the data of every session saved in the data directory together into two tables:
+
+- sessions: one row for each section of each session, with the configuration it was run with
+- trials: every trial of every session, without the configuration, sorted by participant, section and block
+
+The files of each session are read in parallel. Only files that changed since the last run are read again, so running
+it after every day of testing stays fast.
+
+Example:
+
+    python aggregate.py data aggregated
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+from multiprocessing import Pool
+
+import pandas
+
+from config import Configuration
+from experiment import save_frame
+
+READERS = {'.csv': pandas.read_csv, '.parquet': pandas.read_parquet, '.feather': pandas.read_feather}
+
+# The columns that come from the configuration, which are the same for a whole session
+CONFIG_COLUMNS = set(vars(Configuration('0', '0')))
+
+INDEX = ['participant', 'section', 'block_number']
+
+
+def find_session_files(data_dir):
+    """ Finds the data files in a data directory laid out like Experiment.save_data does,
+    "{age group}/{participant}/{section}.{extension}"
+
+    @param str data_dir: The data directory
+    @return lst((str, str, str, str)): The age group, participant, section and path of each file
+    """
+    session_files = []
+    for age_group in sorted(os.listdir(data_dir)):
+        age_dir = os.path.join(data_dir, age_group)
+        if not os.path.isdir(age_dir):
+            continue
+        for participant in sorted(os.listdir(age_dir)):
+            participant_dir = os.path.join(age_dir, participant)
+            if not os.path.isdir(participant_dir):
+                continue
+            for file_name in sorted(os.listdir(participant_dir)):
+                section, extension = os.path.splitext(file_name)
+                if extension in READERS and not section.endswith('_timing'):
+                    session_files.append((age_group, participant, section, os.path.join(participant_dir, file_name)))
+    return session_files
+
+
+def parse_session_file(age_group, participant, section, path):
+    """ Splits the data of one section of a session into its configuration and its trials
+
+    @param str age_group: The age group the session was saved under
+    @param str participant: The participant the session was saved under
+    @param str section: The section the file is for
+    @param str path: The path of the file
+    @return (dict, DataFrame): The row for the sessions table and the rows for the trials table
+    """
+    df = READERS[os.path.splitext(path)[1]](path)
+
+    # Booleans are saved as 0 or 1 in csv files, so do the same for the other formats to be able to put them together
+    for column in df.columns:
+        if df[column].dtype.name in ('bool', 'boolean'):
+            df[column] = df[column].astype('Int64')
+
+    config_columns = [column for column in df.columns if column in CONFIG_COLUMNS]
+
+    session = {}
+    if len(df) != 0:
+        session.update(df[config_columns].iloc[0].to_dict())
+    session.update({'participant': participant, 'age_group': age_group, 'section': section, 'trials': len(df)})
+
+    trials = df.drop(columns=config_columns)
+    if 'block_number' not in trials.columns:
+        trials['block_number'] = None
+    trials.insert(0, 'participant', participant)
+    trials.insert(1, 'age_group', age_group)
+    trials.insert(2, 'section', section)
+    return session, trials
+
+
+def cache_session_file(job):
+    """ Parses one data file and keeps the result in the cache
+
+    @param tuple job: The age group, participant, section and path of the file, and the path of its cache
+    @rtype: None
+    """
+    age_group, participant, section, path, cache_loc = job
+    session, trials = parse_session_file(age_group, participant, section, path)
+
+    cache_dir = os.path.dirname(cache_loc)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    pandas.to_pickle((session, trials), cache_loc)
+
+
+def aggregate(data_dir, output_dir, output_format='parquet', processes=None):
+    """ Puts the data of every session in data_dir together into a sessions table and a trials table, saved in
+    output_dir. Files that have not changed since the last time are not read again.
+
+    @param str data_dir: The data directory
+    @param str output_dir: Where to save the tables, the cache and the manifest of files that were read
+    @param str output_format: 'csv', 'parquet' or 'feather'
+    @param int|None processes: How many processes to read files with
+    @return (int, int): How many files were read, and how many there are in total
+    """
+    manifest_loc = os.path.join(output_dir, 'manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_loc):
+        with open(manifest_loc) as manifest_file:
+            manifest = json.load(manifest_file)
+
+    new_manifest = {}
+    cache_locs = []
+    jobs = []
+    for age_group, participant, section, path in find_session_files(data_dir):
+        key = os.path.relpath(path, data_dir)
+        stat = os.stat(path)
+        new_manifest[key] = [stat.st_mtime, stat.st_size]
+
+        cache_loc = os.path.join(output_dir, 'cache', age_group, participant, section + '.pickle')
+        cache_locs.append(cache_loc)
+        if manifest.get(key) != new_manifest[key] or not os.path.exists(cache_loc):
+            jobs.append((age_group, participant, section, path, cache_loc))
+
+    if len(jobs) != 0:
+        pool = Pool(processes)
+        pool.map(cache_session_file, jobs)
+        pool.close()
+        pool.join()
+
+    # Forget the files that were deleted
+    for key in manifest:
+        if key not in new_manifest:
+            age_group, participant, file_name = key.replace('\\', '/').split('/')
+            cache_loc = os.path.join(output_dir, 'cache', age_group, participant,
+                                     os.path.splitext(file_name)[0] + '.pickle')
+            if os.path.exists(cache_loc):
+                os.remove(cache_loc)
+
+    sessions = []
+    trials = []
+    for cache_loc in cache_locs:
+        session, session_trials = pandas.read_pickle(cache_loc)
+        sessions.append(session)
+        trials.append(session_trials)
+
+    if len(trials) != 0:
+        sessions = pandas.DataFrame(sessions)
+        keys = ['participant', 'age_group', 'section', 'trials']
+        sessions = sessions[keys + [column for column in sessions.columns if column not in keys]]
+        save_frame(sessions, os.path.join(output_dir, 'sessions'), output_format)
+        trials = pandas.concat(trials, ignore_index=True, sort=False)
+        trials = trials.sort_values(INDEX, kind='mergesort').reset_index(drop=True)
+
+        # Some columns mean different things in each section, like user_response. Keep those as text
+        for column in trials.columns:
+            if trials[column].dtype == object:
+                values = trials[column].dropna()
+                if len(set(type(value) for value in values)) > 1:
+                    trials[column] = trials[column].where(trials[column].isnull(), trials[column].astype(str))
+        save_frame(trials, os.path.join(output_dir, 'trials'), output_format)
+
+    with open(manifest_loc, 'w') as manifest_file:
+        json.dump(new_manifest, manifest_file)
+
+    return len(jobs), len(cache_locs)
+
+
+def load_trials(output_dir, output_format='parquet'):
+    """ Loads the trials table made by aggregate, indexed by participant, section and block
+
+    @param str output_dir: Where the tables were saved
+    @param str output_format: The format they were saved in
+    @return DataFrame: The trials
+    """
+    trials = READERS["." + output_format](os.path.join(output_dir, 'trials.' + output_format))
+    return trials.set_index(INDEX)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Put the data of every session together")
+    parser.add_argument('data_dir', nargs='?', default='data', help="The data directory. Defaults to 'data'")
+    parser.add_argument('output_dir', nargs='?', default='aggregated', help="Where to save the tables. Defaults "
+                                                                            "to 'aggregated'")
+    parser.add_argument('--format', choices=['csv', 'parquet', 'feather'], default='parquet',
+                        help="The format to save the tables in")
+    parser.add_argument('--processes', type=int, default=None, help="How many processes to read files with")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    read_total, file_total = aggregate(args.data_dir, args.output_dir, args.format, args.processes)
+    print("Read {0} of {1} files, the others had not changed".format(read_total, file_total))
+
+
+if __name__ == '__main__':
+    main()
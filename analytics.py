@@ -0,0 +1,419 @@
+""" Works out the outcomes of every session saved in the data directory:
+
+- n_back: for each participant and n-back level, the hit rate, false alarm rate and d', and the reaction times of hits
+- lures: for each participant and n-back level, the false alarm rate on each kind of lure, and on trials that are not
+  lures
+- recognition: for each participant, the difficulty post-task images were recognized at, for the images that were
+  shown in the n-back task and those that were not, and the difference between them (priming_effect)
+- cohort: the mean of each of those for each age group and n-back level
+
+Only the columns that are needed are read from each session's data, and they are kept in a cache, so the next run
+only reads the sessions that changed. The outcomes are then worked out for every session at once.
+
+Example:
+
+    python analytics.py data analytics
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+from multiprocessing import Pool
+
+import numpy
+import pandas
+
+from aggregate import READERS, find_session_files
+from experiment import save_frame
+
+# The parts of a reaction time distribution that are worked out
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+# The columns read from each section, and what they are turned into
+N_BACK_COLUMNS = ('n_back_type', 'expected_response', 'user_response', 'lure_kind', 'reaction_time')
+PRIME_COLUMNS = ('difficulty', 'appeared_in_n_back_task', 'reaction_time')
+SESSION_COLUMNS = ('age', 'condition', 'n_back_prime_list_name')
+
+
+def extract_session(paths):
+    """ Reads the columns the outcomes need from the data of one session
+
+    @param dict(str, str) paths: The path of the file of each section of the session
+    @return dict: The n-back and prime columns, named like 'n_back/reaction_time', and the configuration of the
+    session, named like 'session/age'
+    """
+    arrays = {}
+    session = dict((column, None) for column in SESSION_COLUMNS)
+    for section, columns, prefix in (('n-back', N_BACK_COLUMNS, 'n_back/'), ('prime', PRIME_COLUMNS, 'prime/')):
+        df = None
+        if section in paths:
+            df = READERS[os.path.splitext(paths[section])[1]](paths[section])
+
+        for column in columns:
+            if df is None or column not in df.columns:
+                arrays[prefix + column] = numpy.zeros(0)
+            elif column == 'lure_kind':
+                # Saved like '2-back', or empty if the trial is not a lure
+                kinds = df[column].astype(str).str.split('-').str[0]
+                arrays[prefix + column] = pandas.to_numeric(kinds, errors='coerce').fillna(0).to_numpy(dtype='int64')
+            else:
+                arrays[prefix + column] = df[column].to_numpy(dtype='float64', na_value=numpy.nan)
+
+        if df is not None and len(df) != 0:
+            for column in SESSION_COLUMNS:
+                if column in df.columns and session[column] is None:
+                    session[column] = df[column].iloc[0]
+
+    for column in SESSION_COLUMNS:
+        arrays['session/' + column] = session[column]
+    return arrays
+
+
+def cache_session(job):
+    """ Reads the columns the outcomes need from one session and keeps them in the cache
+
+    @param tuple job: The path of the file of each section of the session, and the path of its cache
+    @rtype: None
+    """
+    paths, cache_loc = job
+    cache_dir = os.path.dirname(cache_loc)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    pandas.to_pickle(extract_session(paths), cache_loc)
+
+
+def load_cohort(data_dir, output_dir, processes=None):
+    """ Reads the columns the outcomes need from every session in data_dir, from the cache in output_dir for the
+    sessions whose files have not changed since the last time
+
+    @param str data_dir: The data directory
+    @param str output_dir: Where to keep the cache and the manifest of files that were read
+    @param int|None processes: How many processes to read sessions with
+    @return (DataFrame, dict(str, numpy.ndarray), int): One row for each session, the columns of every session put
+    together, with the row of the session of each value in 'n_back/session' and 'prime/session', and how many
+    sessions were read again
+    """
+    manifest_loc = os.path.join(output_dir, 'manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_loc):
+        with open(manifest_loc) as manifest_file:
+            manifest = json.load(manifest_file)
+
+    sessions = {}
+    for age_group, participant, section, path in find_session_files(data_dir):
+        if section in ('n-back', 'prime'):
+            sessions.setdefault((age_group, participant), {})[section] = path
+
+    new_manifest = {}
+    jobs = []
+    cache_locs = []
+    for age_group, participant in sorted(sessions):
+        paths = sessions[(age_group, participant)]
+        key = "{0}/{1}".format(age_group, participant)
+        new_manifest[key] = dict((section, [os.stat(path).st_mtime, os.stat(path).st_size, path])
+                                 for section, path in paths.items())
+
+        cache_loc = os.path.join(output_dir, 'cache', age_group, participant + '.pickle')
+        cache_locs.append(cache_loc)
+        if manifest.get(key) != new_manifest[key] or not os.path.exists(cache_loc):
+            jobs.append((paths, cache_loc))
+
+    if len(jobs) > 1 and processes != 1:
+        pool = Pool(processes)
+        pool.map(cache_session, jobs)
+        pool.close()
+        pool.join()
+    else:
+        for job in jobs:
+            cache_session(job)
+
+    # Forget the sessions that were deleted
+    for key in manifest:
+        if key not in new_manifest:
+            cache_loc = os.path.join(output_dir, 'cache', *key.split('/')) + '.pickle'
+            if os.path.exists(cache_loc):
+                os.remove(cache_loc)
+
+    parts = {}
+    rows = []
+    for index, cache_loc in enumerate(cache_locs):
+        cached = pandas.read_pickle(cache_loc)
+        for name in cached:
+            if not name.startswith('session/'):
+                parts.setdefault(name, []).append(cached[name])
+        for prefix in ('n_back/', 'prime/'):
+            length = len(cached[prefix + 'reaction_time'])
+            parts.setdefault(prefix + 'session', []).append(numpy.full(length, index, dtype=numpy.int64))
+        rows.append(dict((column, cached['session/' + column]) for column in SESSION_COLUMNS))
+
+    session_table = pandas.DataFrame(rows, columns=list(SESSION_COLUMNS))
+    session_table.insert(0, 'age_group', [age_group for age_group, participant in sorted(sessions)])
+    session_table.insert(0, 'participant', [participant for age_group, participant in sorted(sessions)])
+    cohort = dict((name, numpy.concatenate(arrays)) for name, arrays in parts.items())
+
+    with open(manifest_loc, 'w') as manifest_file:
+        json.dump(new_manifest, manifest_file)
+
+    return session_table, cohort, len(jobs)
+
+
+def group(*keys):
+    """ Numbers the groups of values that have the same keys
+
+    @param keys: The arrays of whole numbers to group by, all of the same length
+    @return (numpy.ndarray, numpy.ndarray): The group of each value, and the keys of each group, one row for each
+    """
+    keys = numpy.column_stack([numpy.asarray(key, dtype=numpy.int64) for key in keys])
+    if len(keys) == 0:
+        return numpy.zeros(0, dtype=numpy.int64), keys
+    group_keys, groups = numpy.unique(keys, axis=0, return_inverse=True)
+    return groups.reshape(-1), group_keys
+
+
+def norm_ppf(p):
+    """ The inverse of the standard normal distribution function, for each value, using Acklam's approximation,
+    which is off by less than 1.15e-9
+
+    @param numpy.ndarray p: The probabilities, between 0 and 1
+    @return numpy.ndarray: The z scores
+    """
+    a = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02, 1.383577518672690e+02,
+         -3.066479806614716e+01, 2.506628277459239e+00)
+    b = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02, 6.680131188771972e+01,
+         -1.328068155288572e+01)
+    c = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00, -2.549732539343734e+00,
+         4.374664141464968e+00, 2.938163982698783e+00)
+    d = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00)
+
+    p = numpy.asarray(p, dtype=float)
+    z = numpy.full(p.shape, numpy.nan)
+
+    # The tails, and the middle, have their own approximations
+    low = p < 0.02425
+    high = p > 1 - 0.02425
+    middle = ~low & ~high & ~numpy.isnan(p)
+
+    q = numpy.sqrt(-2 * numpy.log(numpy.where(low, p, 1)))
+    z[low] = ((((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q + c[5]) /
+              ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1))[low]
+
+    q = numpy.sqrt(-2 * numpy.log(numpy.where(high, 1 - p, 1)))
+    z[high] = -((((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q + c[5]) /
+                ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1))[high]
+
+    q = numpy.where(middle, p, 0.5) - 0.5
+    r = q * q
+    z[middle] = ((((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r + a[5]) * q /
+                 (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1))[middle]
+    return z
+
+
+def grouped_quantiles(values, groups, group_total, quantiles=QUANTILES):
+    """ Works out quantiles of the values in each group, like numpy.quantile does. Groups without values get NaN.
+
+    @param numpy.ndarray values: The values, without NaN
+    @param numpy.ndarray groups: The group of each value
+    @param int group_total: How many groups there are
+    @param tuple(float) quantiles: The quantiles to work out, between 0 and 1
+    @return numpy.ndarray: One row for each group, with a column for each quantile
+    """
+    order = numpy.lexsort((values, groups))
+    values = values[order]
+    counts = numpy.bincount(groups, minlength=group_total)
+    starts = numpy.concatenate([[0], numpy.cumsum(counts)[:-1]])
+
+    result = numpy.full((group_total, len(quantiles)), numpy.nan)
+    present = counts != 0
+    for column, quantile in enumerate(quantiles):
+        position = quantile * (counts[present] - 1)
+        lower = numpy.floor(position).astype(numpy.int64)
+        upper = numpy.ceil(position).astype(numpy.int64)
+        fraction = position - lower
+        result[present, column] = (values[starts[present] + lower] * (1 - fraction) +
+                                   values[starts[present] + upper] * fraction)
+    return result
+
+
+def n_back_outcomes(cohort):
+    """ Works out the hit rate, false alarm rate and d' of each participant at each n-back level, along with the
+    reaction times of their hits. So that d' can be worked out when a participant got everything right or wrong, the
+    rates are corrected like (hits + 0.5) / (targets + 1).
+
+    @param dict(str, numpy.ndarray) cohort: The columns of every session, see load_cohort
+    @return DataFrame: One row for each session and n-back level, with the row of the session in 'session'
+    """
+    n_back_type = cohort['n_back/n_back_type']
+    target = cohort['n_back/expected_response'] == 1
+    pressed = cohort['n_back/user_response'] == 1
+    groups, keys = group(cohort['n_back/session'], n_back_type)
+    group_total = len(keys)
+
+    targets = numpy.bincount(groups[target], minlength=group_total)
+    hits = numpy.bincount(groups[target & pressed], minlength=group_total)
+    non_targets = numpy.bincount(groups[~target], minlength=group_total)
+    false_alarms = numpy.bincount(groups[~target & pressed], minlength=group_total)
+
+    hit_rate = (hits + 0.5) / (targets + 1)
+    false_alarm_rate = (false_alarms + 0.5) / (non_targets + 1)
+
+    outcomes = pandas.DataFrame({'session': keys[:, 0], 'n_back_type': keys[:, 1], 'targets': targets, 'hits': hits,
+                                 'non_targets': non_targets, 'false_alarms': false_alarms,
+                                 'hit_rate': hits / numpy.where(targets != 0, targets, numpy.nan),
+                                 'false_alarm_rate': false_alarms / numpy.where(non_targets != 0, non_targets,
+                                                                                numpy.nan),
+                                 'd_prime': norm_ppf(hit_rate) - norm_ppf(false_alarm_rate)},
+                                columns=['session', 'n_back_type', 'targets', 'hits', 'non_targets', 'false_alarms',
+                                         'hit_rate', 'false_alarm_rate', 'd_prime'])
+
+    # The reaction times of hits
+    reaction_time = cohort['n_back/reaction_time']
+    timed = target & pressed & ~numpy.isnan(reaction_time)
+    times = reaction_time[timed]
+    timed_groups = groups[timed]
+    timed_total = numpy.bincount(timed_groups, minlength=group_total)
+    total_time = numpy.bincount(timed_groups, weights=times, minlength=group_total)
+    mean = total_time / numpy.where(timed_total != 0, timed_total, numpy.nan)
+    squares = numpy.bincount(timed_groups, weights=(times - mean[timed_groups]) ** 2, minlength=group_total)
+
+    outcomes['rt_mean'] = mean
+    outcomes['rt_sd'] = numpy.sqrt(squares / numpy.where(timed_total > 1, timed_total - 1, numpy.nan))
+    rt_quantiles = grouped_quantiles(times, timed_groups, group_total)
+    for column, quantile in enumerate(QUANTILES):
+        outcomes['rt_p{0:g}'.format(quantile * 100)] = rt_quantiles[:, column]
+    return outcomes
+
+
+def lure_outcomes(cohort):
+    """ Works out how often each participant pressed for each kind of lure, and for trials that are neither targets
+    nor lures (lure_kind 0), at each n-back level
+
+    @param dict(str, numpy.ndarray) cohort: The columns of every session, see load_cohort
+    @return DataFrame: One row for each session, n-back level and kind of lure, with the row of the session in
+    'session'
+    """
+    non_target = cohort['n_back/expected_response'] != 1
+    pressed = cohort['n_back/user_response'][non_target] == 1
+    groups, keys = group(cohort['n_back/session'][non_target], cohort['n_back/n_back_type'][non_target],
+                         cohort['n_back/lure_kind'][non_target])
+
+    trials = numpy.bincount(groups, minlength=len(keys))
+    false_alarms = numpy.bincount(groups[pressed], minlength=len(keys))
+    return pandas.DataFrame({'session': keys[:, 0], 'n_back_type': keys[:, 1], 'lure_kind': keys[:, 2],
+                             'trials': trials, 'false_alarms': false_alarms,
+                             'false_alarm_rate': false_alarms / trials},
+                            columns=['session', 'n_back_type', 'lure_kind', 'trials', 'false_alarms',
+                                     'false_alarm_rate'])
+
+
+def recognition_outcomes(cohort, session_total):
+    """ Works out the recognition threshold of each participant: the mean difficulty post-task images were recognized
+    at, for the images that were shown in the n-back task and those that were not. Images that were not recognized
+    before the full image was shown count as difficulty 8.
+
+    @param dict(str, numpy.ndarray) cohort: The columns of every session, see load_cohort
+    @param int session_total: How many sessions there are
+    @return DataFrame: One row for each session, with the row of the session in 'session'
+    """
+    session = cohort['prime/session']
+    appeared = cohort['prime/appeared_in_n_back_task'] == 1
+    difficulty = cohort['prime/difficulty']
+    recognized = ~numpy.isnan(cohort['prime/reaction_time'])
+
+    outcomes = pandas.DataFrame({'session': numpy.arange(session_total)})
+    for name, shown in (('shown', appeared), ('not_shown', ~appeared)):
+        trials = numpy.bincount(session[shown], minlength=session_total)
+        total = numpy.bincount(session[shown], weights=difficulty[shown], minlength=session_total)
+        outcomes['trials_' + name] = trials
+        outcomes['recognized_' + name] = numpy.bincount(session[shown & recognized], minlength=session_total)
+        outcomes['threshold_' + name] = total / numpy.where(trials != 0, trials, numpy.nan)
+
+    # How much earlier images that were shown in the n-back task were recognized
+    outcomes['priming_effect'] = outcomes['threshold_not_shown'] - outcomes['threshold_shown']
+    return outcomes
+
+
+def cohort_outcomes(sessions, n_back, recognition):
+    """ Works out the mean outcomes of each age group at each n-back level
+
+    @param DataFrame sessions: One row for each session, see load_cohort
+    @param DataFrame n_back: The outcomes of n_back_outcomes
+    @param DataFrame recognition: The outcomes of recognition_outcomes
+    @return DataFrame: One row for each age group and n-back level
+    """
+    age_groups, age_group_of_session = numpy.unique(sessions['age_group'].to_numpy(dtype=str), return_inverse=True)
+    session = n_back['session'].to_numpy()
+    groups, keys = group(age_group_of_session[session], n_back['n_back_type'])
+    counts = numpy.bincount(groups, minlength=len(keys))
+
+    cohort = pandas.DataFrame({'age_group': age_groups[keys[:, 0]], 'n_back_type': keys[:, 1],
+                               'participants': counts}, columns=['age_group', 'n_back_type', 'participants'])
+    for column in ('hit_rate', 'false_alarm_rate', 'd_prime', 'rt_mean'):
+        values = n_back[column].to_numpy(dtype=float)
+        valid = ~numpy.isnan(values)
+        counts = numpy.bincount(groups[valid], minlength=len(keys))
+        cohort[column] = (numpy.bincount(groups[valid], weights=values[valid], minlength=len(keys)) /
+                          numpy.where(counts != 0, counts, numpy.nan))
+
+    effect = recognition['priming_effect'].to_numpy(dtype=float)
+    valid = ~numpy.isnan(effect)
+    effect_groups = age_group_of_session[recognition['session'].to_numpy()][valid]
+    counts = numpy.bincount(effect_groups, minlength=len(age_groups))
+    mean_effect = (numpy.bincount(effect_groups, weights=effect[valid], minlength=len(age_groups)) /
+                   numpy.where(counts != 0, counts, numpy.nan))
+    cohort['priming_effect'] = mean_effect[keys[:, 0]]
+    return cohort
+
+
+def analyze(data_dir, output_dir, output_format='csv', processes=None):
+    """ Works out the outcomes of every session in data_dir, and saves them in output_dir as n_back, lures,
+    recognition and cohort
+
+    @param str data_dir: The data directory
+    @param str output_dir: Where to save the outcomes, the cache and the manifest of files that were read
+    @param str output_format: 'csv', 'parquet' or 'feather'
+    @param int|None processes: How many processes to read sessions with
+    @return (dict(str, DataFrame), int, int): The outcomes, how many sessions were read, and how many there are
+    """
+    sessions, cohort, read_total = load_cohort(data_dir, output_dir, processes)
+    if len(sessions) == 0:
+        return {}, 0, 0
+
+    n_back = n_back_outcomes(cohort)
+    recognition = recognition_outcomes(cohort, len(sessions))
+    outcomes = {'n_back': n_back,
+                'lures': lure_outcomes(cohort),
+                'recognition': recognition,
+                'cohort': cohort_outcomes(sessions, n_back, recognition)}
+
+    # Put the participant in front of each row, in place of the row of their session
+    for name in ('n_back', 'lures', 'recognition'):
+        table = sessions.iloc[outcomes[name]['session']].reset_index(drop=True)
+        outcomes[name] = pandas.concat([table, outcomes[name].drop(columns='session')], axis=1)
+
+    for name in outcomes:
+        save_frame(outcomes[name], os.path.join(output_dir, name), output_format)
+    return outcomes, read_total, len(sessions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Work out the outcomes of every session")
+    parser.add_argument('data_dir', nargs='?', default='data', help="The data directory. Defaults to 'data'")
+    parser.add_argument('output_dir', nargs='?', default='analytics', help="Where to save the outcomes. Defaults "
+                                                                           "to 'analytics'")
+    parser.add_argument('--format', choices=['csv', 'parquet', 'feather'], default='csv',
+                        help="The format to save the outcomes in")
+    parser.add_argument('--processes', type=int, default=None, help="How many processes to read sessions with")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    outcomes, read_total, session_total = analyze(args.data_dir, args.output_dir, args.format, args.processes)
+    print("Read {0} of {1} sessions, the others had not changed".format(read_total, session_total))
+    if session_total != 0:
+        print(outcomes['cohort'].to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+""" Packs every image in /images into one archive of decoded pixels, so that a session opens a single file instead of
+hundreds of small ones, which is slow on network drives. The archive is memory mapped, and images are made straight
+from the mapped pixels, without copying or decoding them. Its index also lists the folders, so looking for images does
+not have to search the file system.
+
+Pack the images again whenever they change:
+
+    python archive.py pack
+    python archive.py check
+
+When there is no archive, the same methods are answered by an ImageFolder, from the files themselves.
+"""
+from __future__ import print_function
+
+import argparse
+import fnmatch
+import json
+import mmap
+import os
+import struct
+import sys
+import warnings
+from glob import glob
+
+from prefetch import decode_image
+
+
+# The start of every archive, followed by where the index is and its length
+MAGIC = b"LANTERN-IMAGES-1"
+HEADER = struct.Struct("<16sQQ")
+
+# Every image starts at a multiple of this many bytes
+ALIGNMENT = 64
+
+IMAGE_EXTENSIONS = ('.png', '.gif')
+
+
+def _normalize(path):
+    """ Gets a path as it is written in the archive, with '/' between folders
+
+    @param str path: The path
+    @return str: The path with '/' between folders
+    """
+    return path.replace('\\', '/')
+
+
+def _match(pattern, path):
+    """ Whether a path matches a glob pattern. Like glob, '*' does not match '/', and names that start with '.' are
+    only matched by patterns that start with '.'
+
+    @param str pattern: The pattern, with '/' between folders
+    @param str path: The path, with '/' between folders
+    @return bool: Whether they match
+    """
+    pattern_parts = pattern.split('/')
+    path_parts = path.split('/')
+    if len(pattern_parts) != len(path_parts):
+        return False
+    for pattern_part, path_part in zip(pattern_parts, path_parts):
+        if path_part.startswith('.') and not pattern_part.startswith('.'):
+            return False
+        if not fnmatch.fnmatchcase(path_part, pattern_part):
+            return False
+    return True
+
+
+class ImageFolder:
+    """ The images in /images, read from their files """
+
+    def glob(self, pattern):
+        """ Finds the files and folders that match a pattern
+
+        @param str pattern: The glob pattern
+        @return lst(str): The paths, sorted
+        """
+        return sorted(glob(pattern))
+
+    def isdir(self, path):
+        """ Whether a path is a folder
+
+        @param str path: The path
+        @return bool: Whether it is a folder
+        """
+        return os.path.isdir(path)
+
+    def listdir(self, path):
+        """ Gets the names of the files and folders in a folder
+
+        @param str path: The path of the folder
+        @return lst(str): The names, sorted
+        """
+        return sorted(os.listdir(path))
+
+    def get_version(self, path):
+        """ Gets what changes when an image changes: the time it was modified and its size
+
+        @param str path: The path of the image
+        @return lst(float): The version of the image
+        """
+        stat = os.stat(path)
+        return [stat.st_mtime, stat.st_size]
+
+    def load(self, path):
+        """ Reads and decodes an image
+
+        @param str path: The path of the image
+        @return PIL.Image.Image: The decoded image
+        """
+        return decode_image(path)
+
+
+class StimulusArchive:
+    """ The images in /images, read from an archive made by pack. Answers the same methods as ImageFolder. """
+
+    def __init__(self, archive_loc):
+        """ Opens an archive, and maps it into memory
+
+        @param str archive_loc: The path of the archive
+        """
+        self.archive_loc = archive_loc
+        with open(archive_loc, 'rb') as archive_file:
+            magic, index_offset, index_length = HEADER.unpack(archive_file.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("The file ", archive_loc, "is not an image archive")
+            archive_file.seek(index_offset)
+            index = json.loads(archive_file.read(index_length).decode('utf-8'))
+            self._map = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # For each image: where its pixels start, its mode, width and height, and the version of its file
+        self.images = index['images']
+        self.folders = {}
+        for path in self.images:
+            parts = path.split('/')
+            for depth in range(1, len(parts)):
+                self.folders.setdefault('/'.join(parts[:depth]), set()).add(parts[depth])
+
+    def glob(self, pattern):
+        """ Finds the images and folders in the archive that match a pattern
+
+        @param str pattern: The glob pattern
+        @return lst(str): The paths, sorted
+        """
+        pattern = _normalize(pattern).rstrip('/')
+        return sorted(path for path in list(self.images) + list(self.folders) if _match(pattern, path))
+
+    def isdir(self, path):
+        """ Whether a path is a folder in the archive
+
+        @param str path: The path
+        @return bool: Whether it is a folder
+        """
+        return _normalize(path).rstrip('/') in self.folders
+
+    def listdir(self, path):
+        """ Gets the names of the images and folders in a folder of the archive
+
+        @param str path: The path of the folder
+        @return lst(str): The names, sorted
+        """
+        return sorted(self.folders.get(_normalize(path).rstrip('/'), ()))
+
+    def has(self, path):
+        """ Whether an image is in the archive
+
+        @param str path: The path of the image
+        @return bool: Whether it is in the archive
+        """
+        return _normalize(path) in self.images
+
+    def get_version(self, path):
+        """ Gets the version the file of an image had when it was packed
+
+        @param str path: The path of the image
+        @return lst(float): The version of the image
+        """
+        return self.images[_normalize(path)]['version']
+
+    def load(self, path):
+        """ Gets an image from the archive. Its pixels are not copied, they are read from the mapped archive when the
+        image is used.
+
+        @param str path: The path of the image
+        @return PIL.Image.Image: The decoded image
+        """
+        from PIL import Image
+
+        entry = self.images[_normalize(path)]
+        size = (entry['width'], entry['height'])
+        length = size[0] * size[1] * len(entry['mode'])
+        try:
+            pixels = memoryview(self._map)[entry['offset']:entry['offset'] + length]
+        except TypeError:
+            # Python 2 can not make a memoryview of a memory map
+            pixels = buffer(self._map, entry['offset'], length)
+        return Image.frombuffer(entry['mode'], size, pixels, 'raw', entry['mode'], 0, 1)
+
+    def find_stale(self, images=None):
+        """ Compares the archive with the image files
+
+        @param ImageFolder|None images: The image files. Defaults to the ones in /images
+        @return lst(str): The images that were changed, added or removed since the archive was made
+        """
+        if images is None:
+            images = ImageFolder()
+        paths = set(find_images())
+        stale = [path for path in sorted(paths) if path not in self.images or
+                 self.images[path]['version'] != images.get_version(path)]
+        return stale + sorted(path for path in self.images if path not in paths)
+
+
+def find_images(directory="images"):
+    """ Finds every image file in directory and its folders
+
+    @param str directory: The folder to look in
+    @return lst(str): The paths of the images, with '/' between folders, sorted
+    """
+    paths = []
+    for folder, _, names in os.walk(directory):
+        for name in names:
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS and not name.startswith('.'):
+                paths.append(_normalize(os.path.join(folder, name)))
+    return sorted(paths)
+
+
+def pack(archive_loc, directory="images"):
+    """ Decodes every image in directory and its folders, and writes their pixels to an archive. The archive starts
+    with a header that says where the index is, followed by the pixels of each image and then the index.
+
+    @param str archive_loc: Where to write the archive
+    @param str directory: Where the images are
+    @return int: The number of images packed
+    """
+    folder = ImageFolder()
+    paths = find_images(directory)
+
+    index = {'images': {}}
+    with open(archive_loc + ".tmp", 'wb') as archive_file:
+        archive_file.write(HEADER.pack(MAGIC, 0, 0))
+        for path in paths:
+            image = folder.load(path)
+
+            # Start every image at an aligned offset
+            offset = -(-archive_file.tell() // ALIGNMENT) * ALIGNMENT
+            archive_file.write(b"\0" * (offset - archive_file.tell()))
+            archive_file.write(image.tobytes())
+
+            index['images'][path] = {'offset': offset, 'mode': image.mode, 'width': image.size[0],
+                                     'height': image.size[1], 'version': folder.get_version(path)}
+
+        index_offset = archive_file.tell()
+        index_json = json.dumps(index, sort_keys=True).encode('utf-8')
+        archive_file.write(index_json)
+        archive_file.seek(0)
+        archive_file.write(HEADER.pack(MAGIC, index_offset, len(index_json)))
+
+    if os.path.exists(archive_loc):
+        # Python 2 can not replace a file with os.rename on Windows
+        os.remove(archive_loc)
+    os.rename(archive_loc + ".tmp", archive_loc)
+    return len(paths)
+
+
+def open_images(archive_loc):
+    """ Opens the archive at archive_loc if there is one, or the image files if there is not. If images were changed,
+    added or removed since the archive was made, a warning is given and the image files are used instead.
+
+    @param str|None archive_loc: The path of the archive, or None to use the image files
+    @return StimulusArchive|ImageFolder: Where to get the images from
+    """
+    if archive_loc is not None and os.path.exists(archive_loc):
+        archive = StimulusArchive(archive_loc)
+        stale = archive.find_stale()
+        if len(stale) == 0:
+            return archive
+        warnings.warn("{0} images changed since {1} was made, like {2}, so the image files are used instead. Run "
+                      "python archive.py pack to make it again".format(len(stale), archive_loc, stale[0]))
+    return ImageFolder()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pack the images into one archive of decoded pixels")
+    parser.add_argument('command', choices=['pack', 'check'], help="pack makes the archive again, check lists the "
+                                                                   "images that changed since it was made")
+    parser.add_argument('--archive', default=None, help="The path of the archive. Defaults to stimulus_archive in "
+                                                        "config.py")
+    args = parser.parse_args()
+
+    archive_loc = args.archive
+    if archive_loc is None:
+        from config import Configuration
+        archive_loc = Configuration('0', '0').stimulus_archive
+
+    if args.command == 'pack':
+        image_total = pack(archive_loc)
+        print("Packed {0} images into {1} ({2:.0f} MB)".format(image_total, archive_loc,
+                                                              os.path.getsize(archive_loc) / 1e6))
+    else:
+        stale = StimulusArchive(archive_loc).find_stale()
+        for path in stale:
+            print(path)
+        print("{} images changed since the archive was made".format(len(stale)))
+        sys.exit(1 if len(stale) != 0 else 0)
@@ -0,0 +1,143 @@
+""" Keeps copies of the images the experiment shows, already scaled to the number of pixels they cover on the screen
+and decoded into raw pixels, so that loading one is only a read of its pixels, with no decoding or resampling.
+
+The copies are kept in a folder named after a hash of the settings they were made for, like the monitor and the sizes
+in config.py, so when any of them change, new copies are made. Each copy is named after a hash of the contents of its
+image and the size it was scaled to.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+
+
+# Change this when the way copies are made changes, so old ones are not used
+PIPELINE_VERSION = 1
+
+
+class AssetCache:
+    """ The scaled, decoded copies of images for one set of settings """
+
+    def __init__(self, directory, settings, target_size, images):
+        """ Creates an asset cache, in a folder of directory named after a hash of the settings
+
+        @param str directory: Where the asset caches for all settings are kept
+        @param dict settings: Everything the scaled images depend on. Must be JSON serializable
+        @param target_size: A function that is given the path of an image and its size in pixels, and gives the size
+        in pixels it is shown at, as a tuple of ints
+        @param ImageFolder|StimulusArchive images: Where the images are, see archive.open_images
+        """
+        self.settings = dict(settings, pipeline_version=PIPELINE_VERSION)
+        self.target_size = target_size
+        self.images = images
+
+        key = hashlib.sha1(json.dumps(self.settings, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        self.directory = os.path.join(directory, key)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        # For each image: its version, see ImageFolder.get_version, and the copy made from it
+        self._index_loc = os.path.join(self.directory, "index.json")
+        self._index = {}
+        if os.path.exists(self._index_loc):
+            with io.open(self._index_loc, encoding='utf-8') as index_file:
+                self._index = json.load(index_file)
+        self._index_changed = False
+        self._lock = threading.Lock()
+
+        # How many copies had to be made since the cache was opened
+        self.built = 0
+
+    def __get_entry(self, path):
+        """ Gets the index entry for an image, if it has a copy that was made from the current version of the image.
+        Should not use this outside of this class
+
+        @param str path: The path of the image
+        @return dict|None: The entry, or None if there is no up to date copy
+        """
+        with self._lock:
+            entry = self._index.get(path)
+        if entry is None or entry['version'] != self.images.get_version(path):
+            return None
+        if not os.path.exists(os.path.join(self.directory, entry['asset'])):
+            return None
+        return entry
+
+    def __build_one(self, path):
+        """ Makes a scaled, decoded copy of an image. Should not use this outside of this class
+
+        @param str path: The path of the image
+        @return (dict, PIL.Image.Image): The index entry for the copy, and the scaled image
+        """
+        from PIL import Image
+
+        version = self.images.get_version(path)
+        image = self.images.load(path)
+        content_hash = hashlib.sha1(image.mode.encode('utf-8') + repr(image.size).encode('utf-8') +
+                                    image.tobytes()).hexdigest()
+        size = tuple(int(value) for value in self.target_size(path, image.size))
+        if size != image.size:
+            image = image.resize(size, Image.LANCZOS)
+
+        asset = "{0}_{1}x{2}.{3}".format(content_hash[:20], size[0], size[1], image.mode.lower())
+        asset_loc = os.path.join(self.directory, asset)
+        if not os.path.exists(asset_loc):
+            # Write to a temporary file first, so a crash never leaves half a copy behind
+            with open(asset_loc + ".tmp", 'wb') as asset_file:
+                asset_file.write(image.tobytes())
+            os.rename(asset_loc + ".tmp", asset_loc)
+
+        entry = {'version': version, 'asset': asset, 'mode': image.mode,
+                 'width': size[0], 'height': size[1]}
+        with self._lock:
+            self._index[path] = entry
+            self._index_changed = True
+            self.built += 1
+        return entry, image
+
+    def build(self, paths):
+        """ Makes copies of the given images that do not have an up to date one, and saves the index
+
+        @param lst(str) paths: The paths of the images
+        @rtype: None
+        """
+        for path in paths:
+            if self.__get_entry(path) is None:
+                self.__build_one(path)
+        self.save()
+
+    def load(self, path):
+        """ Gets the scaled, decoded copy of an image, making it first if there is no up to date one
+
+        @param str path: The path of the image
+        @return PIL.Image.Image: The image, at the size it is shown at
+        """
+        from PIL import Image
+
+        entry = self.__get_entry(path)
+        if entry is None:
+            return self.__build_one(path)[1]
+
+        with open(os.path.join(self.directory, entry['asset']), 'rb') as asset_file:
+            pixels = asset_file.read()
+        size = (entry['width'], entry['height'])
+        return Image.frombuffer(entry['mode'], size, pixels, 'raw', entry['mode'], 0, 1)
+
+    def save(self):
+        """ Saves the index, if copies were made since it was last saved
+
+        @rtype: None
+        """
+        with self._lock:
+            if not self._index_changed:
+                return
+            index = dict(self._index)
+            self._index_changed = False
+
+        with open(self._index_loc + ".tmp", 'wb') as index_file:
+            index_file.write(json.dumps(index, sort_keys=True, indent=1).encode('utf-8'))
+        if os.path.exists(self._index_loc):
+            # Python 2 can not replace a file with os.rename on Windows
+            os.remove(self._index_loc)
+        os.rename(self._index_loc + ".tmp", self._index_loc)
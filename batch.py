@@ -0,0 +1,150 @@
+""" Runs many simulated sessions of the Lantern experiment at once, using the headless backend.
+
+Example, running participants 1 to 1000 at ages 5 and 8 on 4 processes:
+
+    python batch.py 1 1000 --ages 5 8 --processes 4
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import time
+from multiprocessing import Pool
+
+import headless
+import project
+from config import Configuration
+from experiment import Experiment, save_frame
+
+
+class _CollectingExperiment(Experiment):
+    """ An experiment that keeps the data of each section instead of saving it to its own files"""
+
+    def __init__(self, interface, settings=None):
+        self.collected = {}
+        Experiment.__init__(self, interface, settings=settings)
+
+    def save_data(self):
+        """ Keeps the data pushed since the last time new section was called """
+        if self.config.output_format == 'csv':
+            self.collected[self.section] = self.get_data()
+        else:
+            self.collected[self.section] = self.get_typed_data()
+
+
+def session_seed(seed, participant_num, age):
+    """ Gets the seed for one session. The same arguments always give the same seed.
+
+    @param int seed: The seed for the whole batch
+    @param int participant_num: The participant number of the session
+    @param int age: The age of the participant
+    @return int: The seed
+    """
+    return (seed * 1000003 + participant_num) * 101 + age
+
+
+def run_session(job):
+    """ Runs one simulated session
+
+    @param tuple job: (participant id, participant number, age, seed, output location, output format, whether to
+    collect the data)
+    @return dict(str, DataFrame)|None: The data of each section if it is collected, otherwise None
+    """
+    participant, participant_num, age, seed, output_location, output_format, collect = job
+
+    # The task uses the random module to shuffle images, so seed it for every session
+    random.seed(session_seed(seed, participant_num, age))
+    simulated_participant = headless.SimulatedParticipant(seed=session_seed(seed, participant_num, age))
+    backend = headless.Backend(participant, str(age), simulated_participant)
+
+    settings = {'output_format': output_format}
+    if output_location is not None:
+        settings['output_location'] = output_location
+    if collect:
+        # Nothing is saved to the session's own files, so there is nothing to journal or resume
+        settings['data_journal'] = False
+        settings['checkpoints'] = False
+        experiment = _CollectingExperiment(backend, settings)
+    else:
+        experiment = Experiment(backend, settings=settings)
+    project.run(experiment)
+
+    if collect:
+        return experiment.collected
+    return None
+
+
+def consolidate(results, output_dir, output_format):
+    """ Writes the data of all the sessions as one file per section
+
+    @param lst(dict(str, DataFrame)) results: The data of each section for each session
+    @param str output_dir: The directory to write the files to
+    @param str output_format: 'csv', 'parquet' or 'feather'
+    @rtype: None
+    """
+    import pandas
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    sections = {}
+    for result in results:
+        for section in result:
+            sections.setdefault(section, []).append(result[section])
+
+    for section in sections:
+        df = pandas.concat(sections[section], ignore_index=True)
+
+        # Categories with different values in each session become plain objects when put together
+        for column in sections[section][0].columns:
+            if sections[section][0][column].dtype.name == 'category':
+                df[column] = df[column].astype('category')
+
+        save_frame(df, os.path.join(output_dir, section), output_format)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run simulated sessions of the Lantern experiment")
+    parser.add_argument('first', type=int, help="The first participant number")
+    parser.add_argument('last', type=int, help="The last participant number")
+    parser.add_argument('--ages', type=int, nargs='+', default=[5, 8], help="The ages to run every participant at")
+    parser.add_argument('--prefix', default='sim', help="Put in front of the participant numbers to make the ids")
+    parser.add_argument('--processes', type=int, default=None, help="How many processes to use. Defaults to one "
+                                                                      "per CPU")
+    parser.add_argument('--seed', type=int, default=0, help="The seed for the whole batch")
+    parser.add_argument('--output', default=None, help="Where to save the data. Defaults to the output location "
+                                                       "in config.py")
+    parser.add_argument('--consolidate', action='store_true', help="Write one file per section for all sessions, "
+                                                                   "instead of files for each session")
+    parser.add_argument('--format', choices=['csv', 'parquet', 'feather'], default=None,
+                        help="The format to save the data in. Defaults to the output format in config.py")
+    args = parser.parse_args()
+
+    output_format = args.format
+    if output_format is None:
+        output_format = Configuration('0', '0').output_format
+
+    jobs = []
+    for participant_num in range(args.first, args.last + 1):
+        for age in args.ages:
+            participant = "{0}{1}".format(args.prefix, participant_num)
+            jobs.append((participant, participant_num, age, args.seed, args.output, output_format, args.consolidate))
+
+    start = time.time()
+    pool = Pool(args.processes)
+    results = list(pool.imap_unordered(run_session, jobs, chunksize=max(1, len(jobs) // 100)))
+    pool.close()
+    pool.join()
+    duration = time.time() - start
+
+    if args.consolidate:
+        output_dir = args.output if args.output is not None else 'data'
+        consolidate(results, os.path.join(output_dir, 'batch'), output_format)
+
+    print("Ran {0} sessions in {1:.2f} s ({2:.1f} sessions/second)".format(len(jobs), duration,
+                                                                          len(jobs) / duration))
+
+
+if __name__ == '__main__':
+    main()
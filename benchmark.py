@@ -0,0 +1,336 @@
+""" Benchmarks for the Lantern experiment, run on simulated sessions from the headless backend, or on the real window
+with a stand-in for psychopy.
+
+Example, comparing how big the data of 200 sessions is in each output format and how long it takes to load:
+
+    python benchmark.py formats --sessions 200
+
+Example, timing the n-back and post-task pipelines, and checking them against an earlier run:
+
+    python benchmark.py pipeline --sessions 5 --output pipeline.json
+    python benchmark.py pipeline --sessions 5 --baseline pipeline.json
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+import numpy
+
+import batch
+
+FORMATS = ['csv', 'parquet', 'feather']
+
+# The results of the pipeline benchmark, and whether a larger value is better. Times are in seconds
+PIPELINE_METRICS = [('session_setup', False), ('orderings_load', False), ('n_back_trial', False),
+                    ('n_back_block_setup', False), ('post_task_trial', False), ('push_data', False),
+                    ('save_data', False), ('write_throughput', True), ('peak_memory', False)]
+
+
+def make_corpus(output_location, output_format, session_total, processes=None):
+    """ Runs simulated sessions and saves their data in the given format
+
+    @param str output_location: Where to save the data
+    @param str output_format: 'csv', 'parquet' or 'feather'
+    @param int session_total: How many sessions to run
+    @param int|None processes: How many processes to use
+    @rtype: None
+    """
+    jobs = [("bench{}".format(i), i, 5 + i % 4, 0, output_location, output_format, False)
+            for i in range(1, session_total + 1)]
+    pool = Pool(processes)
+    pool.map(batch.run_session, jobs)
+    pool.close()
+    pool.join()
+
+
+def read_corpus(output_location, output_format):
+    """ Reads all the data files saved in the given location
+
+    @param str output_location: Where the data was saved
+    @param str output_format: The format it was saved in
+    @return lst(dict(str, DataFrame)): The data in each file, keyed by its section
+    """
+    import pandas
+
+    readers = {'csv': pandas.read_csv, 'parquet': pandas.read_parquet, 'feather': pandas.read_feather}
+    files = []
+    for dir_path, dir_names, file_names in os.walk(output_location):
+        for file_name in file_names:
+            section, extension = os.path.splitext(file_name)
+            if extension == "." + output_format and not section.endswith('_timing'):
+                files.append({section: readers[output_format](os.path.join(dir_path, file_name))})
+    return files
+
+
+def load_corpus(output_location, output_format):
+    """ Loads all the data saved in the given location, one DataFrame per section
+
+    @param str output_location: Where the data was saved
+    @param str output_format: The format it was saved in
+    @return dict(str, DataFrame): All the data of each section
+    """
+    import pandas
+
+    sections = {}
+    for data in read_corpus(output_location, output_format):
+        for section in data:
+            sections.setdefault(section, []).append(data[section])
+    return dict((section, pandas.concat(frames, ignore_index=True)) for section, frames in sections.items())
+
+
+def time_load(output_location, output_format, repeats):
+    """ Finds how long it takes to load all the data saved in the given location
+
+    @param str output_location: Where the data was saved
+    @param str output_format: The format it was saved in
+    @param int repeats: How many times to load the data. The fastest time is kept
+    @return float: The time in seconds
+    """
+    load_times = []
+    for _ in range(repeats):
+        start = time.time()
+        load_corpus(output_location, output_format)
+        load_times.append(time.time() - start)
+    return min(load_times)
+
+
+def disk_size(output_location, output_format):
+    """ Finds how many bytes of data were saved in the given format
+
+    @param str output_location: Where the data was saved
+    @param str output_format: The format it was saved in
+    @return int: The total size of the files
+    """
+    total = 0
+    for dir_path, dir_names, file_names in os.walk(output_location):
+        for file_name in file_names:
+            if file_name.endswith("." + output_format):
+                total += os.path.getsize(os.path.join(dir_path, file_name))
+    return total
+
+
+def benchmark_formats(session_total, repeats, processes=None):
+    """ Saves the data of simulated sessions in each output format, then measures its size and how long it takes to
+    load all of it. This is done both for the files of each session and for the files made by putting all the
+    sessions together, like batch.py --consolidate does.
+
+    @param int session_total: How many sessions to run
+    @param int repeats: How many times to load the data. The fastest time is kept
+    @param int|None processes: How many processes to use to run the sessions
+    @return lst(dict): The results for each format
+    """
+    results = []
+    root = tempfile.mkdtemp()
+    try:
+        for output_format in FORMATS:
+            output_location = os.path.join(root, output_format)
+            make_corpus(output_location, output_format, session_total, processes)
+            results.append({'benchmark': 'formats', 'format': output_format, 'layout': 'sessions',
+                            'sessions': session_total, 'load_time': time_load(output_location, output_format, repeats),
+                            'disk_size': disk_size(output_location, output_format)})
+
+            consolidated_location = os.path.join(root, output_format + "_consolidated")
+            batch.consolidate(read_corpus(output_location, output_format), consolidated_location, output_format)
+            results.append({'benchmark': 'formats', 'format': output_format, 'layout': 'consolidated',
+                            'sessions': session_total,
+                            'load_time': time_load(consolidated_location, output_format, repeats),
+                            'disk_size': disk_size(consolidated_location, output_format)})
+    finally:
+        shutil.rmtree(root)
+    return results
+
+
+class _StubBackend:
+    """ Runs the experiment on the real window, with psychopy_stub in place of psychopy. Works like
+    headless.Backend
+    """
+
+    def __init__(self, participant, age_group):
+        """ Creates a backend for one session
+
+        @param str participant: The participant id
+        @param str age_group: The age of the participant
+        """
+        self.participant = participant
+        self.age_group = age_group
+
+    def ask_user_info(self, title):
+        return self.participant, self.age_group
+
+    def Window(self, experiment):
+        """ Creates the real window """
+        import visual
+
+        return visual.Window(experiment)
+
+
+def _peak_memory():
+    """ Gets the largest amount of memory this process has used
+
+    @return float|None: The peak resident memory in MB, or None where it can not be found, like on Windows
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives kB and macOS gives bytes
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+def run_stub_session(job):
+    """ Runs one session on the real window with psychopy_stub, in a process of its own, and measures it. Since the
+    stand-in's time is virtual, the spans in the session's timing log are only the time spent in our own code.
+
+    @param tuple job: (participant id, age, seed, output location, asset cache location)
+    @return dict: The measurements of the session, see PIPELINE_METRICS
+    """
+    participant, age, seed, output_location, asset_cache_location = job
+
+    import psychopy_stub
+    psychopy_stub.install(seed=seed)
+
+    import pandas
+    import project
+    from experiment import Experiment
+    from orderings import OrderingIndex
+
+    random.seed(seed)
+    start = time.time()
+    experiment = Experiment(_StubBackend(participant, str(age)),
+                            settings={'output_location': output_location, 'asset_cache_location': asset_cache_location})
+    session_setup = time.time() - start
+    project.run(experiment)
+
+    start = time.time()
+    for _ in range(10):
+        OrderingIndex.load(experiment.config)
+    orderings_load = (time.time() - start) / 10
+
+    data_dir = experiment.get_data_dir()
+    timing = pandas.read_csv(os.path.join(data_dir, "session_timing.csv"))
+    durations = timing.groupby('event')['duration']
+    written = sum(os.path.getsize(os.path.join(data_dir, file_name)) for file_name in os.listdir(data_dir)
+                  if not file_name.endswith('.csv') or not file_name[:-len('.csv')].endswith('_timing'))
+    push_data = timing[timing['event'] == 'push_data']
+    save_time = durations.sum().get('save_data', 0.0)
+
+    return {'session_setup': session_setup,
+            'orderings_load': orderings_load,
+            'n_back_trial': durations.mean().get('n_back_trial'),
+            'n_back_block_setup': (durations.mean().get('n_back_block_setup', 0.0) +
+                                   durations.mean().get('preload_n_back_images', 0.0)),
+            'post_task_trial': durations.mean().get('post_task_trial'),
+            'push_data': push_data['duration'].sum() / max(1, push_data['calls'].sum()),
+            'save_data': save_time,
+            'write_throughput': written / 1e6 / save_time if save_time > 0 else None,
+            'peak_memory': _peak_memory()}
+
+
+def benchmark_pipeline(session_total, age=8, asset_cache=None):
+    """ Runs sessions on the real window with psychopy_stub, one after another and each in a new process, and takes
+    the median of each measurement. A first session is run and left out, so the asset cache is made before the
+    sessions that are measured.
+
+    @param int session_total: How many sessions to measure
+    @param int age: The age of the participants
+    @param str|None asset_cache: Where to keep the scaled copies of the images. Defaults to a temporary folder
+    @return dict: The median of each measurement, and the measurements of each session
+    """
+    root = tempfile.mkdtemp()
+    try:
+        if asset_cache is None:
+            asset_cache = os.path.join(root, 'asset_cache')
+        jobs = [("bench{}".format(i), age, i, os.path.join(root, 'data'), asset_cache)
+                for i in range(session_total + 1)]
+        pool = Pool(1, maxtasksperchild=1)
+        sessions = pool.map(run_stub_session, jobs, chunksize=1)[1:]
+        pool.close()
+        pool.join()
+    finally:
+        shutil.rmtree(root)
+
+    results = {}
+    for metric, _ in PIPELINE_METRICS:
+        values = [session[metric] for session in sessions if session[metric] is not None]
+        # Saved as json, which can not write numpy numbers
+        results[metric] = float(numpy.median(values)) if len(values) != 0 else None
+    return {'benchmark': 'pipeline', 'sessions': session_total, 'age': age, 'results': results,
+            'per_session': sessions}
+
+
+def find_regressions(results, baseline, threshold):
+    """ Compares the results of the pipeline benchmark with an earlier run
+
+    @param dict results: The results, see benchmark_pipeline
+    @param dict baseline: The results of the earlier run
+    @param float threshold: How much worse a result can be, as a fraction of the earlier one
+    @return lst(str): A description of each result that got worse by more than threshold
+    """
+    regressions = []
+    for metric, larger_is_better in PIPELINE_METRICS:
+        new = results['results'].get(metric)
+        old = baseline['results'].get(metric)
+        if new is None or old is None or old == 0:
+            continue
+        change = (old - new) / old if larger_is_better else (new - old) / old
+        if change > threshold:
+            regressions.append("{0}: {1:.6g} -> {2:.6g} ({3:+.0f}%)".format(metric, old, new, 100 * change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the Lantern experiment")
+    subparsers = parser.add_subparsers(dest='benchmark')
+
+    formats_parser = subparsers.add_parser('formats', help="Compare the size and load time of each output format")
+    formats_parser.add_argument('--sessions', type=int, default=200, help="How many sessions to simulate")
+    formats_parser.add_argument('--repeats', type=int, default=3, help="How many times to load the data")
+    formats_parser.add_argument('--processes', type=int, default=None, help="How many processes to use")
+
+    pipeline_parser = subparsers.add_parser('pipeline', help="Time the n-back and post-task pipelines on the real "
+                                                             "window, with a stand-in for psychopy")
+    pipeline_parser.add_argument('--sessions', type=int, default=5, help="How many sessions to measure")
+    pipeline_parser.add_argument('--age', type=int, default=8, help="The age of the participants")
+    pipeline_parser.add_argument('--asset-cache', default=None, help="Where to keep the scaled copies of the images. "
+                                                                     "Defaults to a temporary folder")
+    pipeline_parser.add_argument('--output', default=None, help="Where to save the results as JSON")
+    pipeline_parser.add_argument('--baseline', default=None, help="The JSON results of an earlier run to compare with")
+    pipeline_parser.add_argument('--threshold', type=float, default=0.25, help="How much worse a result can be than "
+                                                                               "the baseline, as a fraction of it")
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'formats':
+        print("{0:<10}{1:<14}{2:>12}{3:>16}".format("format", "layout", "load time", "disk size"))
+        for result in benchmark_formats(args.sessions, args.repeats, args.processes):
+            print("{0:<10}{1:<14}{2:>10.3f} s{3:>13.1f} kB".format(result['format'], result['layout'],
+                                                                    result['load_time'], result['disk_size'] / 1000.0))
+
+    if args.benchmark == 'pipeline':
+        results = benchmark_pipeline(args.sessions, args.age, args.asset_cache)
+        for metric, _ in PIPELINE_METRICS:
+            print("{0:<20}{1:>14}".format(metric, "{0:.6g}".format(results['results'][metric])
+                                          if results['results'][metric] is not None else "-"))
+        if args.output is not None:
+            with open(args.output, 'w') as output_file:
+                json.dump(results, output_file, indent=1, sort_keys=True)
+
+        if args.baseline is not None:
+            with open(args.baseline) as baseline_file:
+                regressions = find_regressions(results, json.load(baseline_file), args.threshold)
+            for regression in regressions:
+                print("Slower than the baseline:", regression)
+            sys.exit(1 if len(regressions) != 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
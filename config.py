@@ -1,14 +1,52 @@
 import time
 
+# Settings for how the experiment runs, rather than for what the participant does. They are not saved with the data,
+# so the data files have the same columns whichever of these are used
+UNSAVED_SETTINGS = frozenset(['output_format', 'data_journal', 'data_journal_sync_every', 'checkpoints',
+                              'startup_budget', 'coordinator_ledger', 'coordinator_reserve', 'coordinator_station',
+                              'coordinator_prefix', 'coordinator_reserve_size', 'coordinator_timeout',
+                              'input_poll_interval', 'input_hog_period', 'input_hardware_timestamps', 'prefetch_images',
+                              'image_cache_size', 'asset_cache', 'asset_cache_location', 'stimulus_archive',
+                              'session_seed', 'n_back_trials_per_block', 'n_back_strict_orderings', 'prime_reveal',
+                              'prime_checkpoint_every'])
+
 
 class Configuration:
     """ The configuration for an experiment """
-    def __init__(self, participant, age):
-        """ Creates a configuration with the following values"""
+    def __init__(self, participant, age, condition=None):
+        """ Creates a configuration with the following values
+
+        @param str participant: The participant id
+        @param str age: The age of the participant
+        @param int|None condition: Optional. The counterbalancing condition, if it was handed out by coordinator.py.
+        Defaults to the participant number modulo 4
+        """
         self.output_location = "data"
+        self.output_format = "csv"
+        self.data_journal = True
+        self.data_journal_sync_every = 1
+        self.checkpoints = True
+        self.startup_budget = 5.0
+
+        self.coordinator_ledger = None
+        self.coordinator_reserve = "station_reserve.json"
+        self.coordinator_station = None
+        self.coordinator_prefix = "P"
+        self.coordinator_reserve_size = 10
+        self.coordinator_timeout = 2.0
 
         self.animation_time_between_frames = 1
 
+        self.input_poll_interval = 0.005
+        self.input_hog_period = 0.01
+        self.input_hardware_timestamps = True
+
+        self.prefetch_images = True
+        self.image_cache_size = 256
+        self.asset_cache = True
+        self.asset_cache_location = "asset_cache"
+        self.stimulus_archive = "images.pack"
+
         # Save the age group and participant
         self.participant = participant
         self.age = int(age)
@@ -17,9 +55,12 @@ class Configuration:
         self.participant_num = int("".join([c for c in self.participant if c.isdigit()]))
 
         self.practice_run = True
+        self.session_seed = None
 
         self.n_back_task = True
         self.n_back_block_total = 4
+        self.n_back_trials_per_block = 23
+        self.n_back_strict_orderings = False
         self.n_back_start_difficulty = 1
         self.n_back_min_errors_to_lower_difficulty = 5
         self.n_back_max_errors_to_raise_difficulty = 3
@@ -32,9 +73,11 @@ class Configuration:
 
         self.prime_task = True
         self.prime_image_display_time = 1.5
+        self.prime_reveal = False
+        self.prime_checkpoint_every = 5
 
         # The following are counter-balanced for the participant
-        self.condition = self.participant_num % 4
+        self.condition = self.participant_num % 4 if condition is None else condition
         if self.n_back_task:
             self.n_back_blocks_reversed = self.condition % 2 == 0
             self.n_back_prime_list_name = 'A' if ((self.condition // 2) % 2 == 0) else 'B'
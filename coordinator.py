@@ -0,0 +1,280 @@
+""" Hands out participant ids and counterbalancing conditions when many stations run the experiment at once, so no two
+participants get the same id and the conditions stay balanced in each age group.
+
+Every station shares one ledger, a json file on a shared drive set by coordinator_ledger in config.py. A station locks
+the ledger, gives the next participant the next id and the condition the fewest participants of their age group have
+had, and unlocks it, which takes a few milliseconds. Leave the participant id empty in the dialog to have one handed
+out.
+
+Each station also keeps a block of ids reserved for it in the ledger, in its own reserve file. When the ledger can not
+be reached, ids come from that block instead, with the condition that is the least used as far as the station knows.
+The participants that were handed out that way are added to the ledger the next time it can be reached.
+
+To reserve a block of ids for this station before it goes offline, or to see how many participants have each condition:
+
+    python coordinator.py reserve
+    python coordinator.py status
+"""
+from __future__ import print_function
+
+import argparse
+import errno
+import json
+import os
+import socket
+import time
+from timeit import default_timer
+
+from experiment import replace_file
+
+# The number of counterbalancing conditions, see config.Configuration
+CONDITIONS = 4
+
+
+class Station:
+    """ One of the stations that share a ledger """
+
+    def __init__(self, ledger_loc, reserve_loc, name=None, prefix="P", reserve_size=10, timeout=2.0, stale_lock=30.0):
+        """ Creates a station
+
+        @param str ledger_loc: The path of the ledger every station shares
+        @param str reserve_loc: The path of this station's reserve file, on its own disk
+        @param str|None name: Optional. The name of the station. Defaults to the name of the computer
+        @param str prefix: What is put in front of the participant numbers to make the ids
+        @param int reserve_size: How many ids to keep reserved for when the ledger can not be reached
+        @param float timeout: How many seconds to wait for the ledger to be unlocked before using the reserved ids
+        @param float stale_lock: How many seconds old a lock has to be to be taken as left behind by a station that
+        crashed
+        """
+        self.ledger_loc = ledger_loc
+        self.reserve_loc = reserve_loc
+        self.name = name if name is not None else socket.gethostname()
+        self.prefix = prefix
+        self.reserve_size = reserve_size
+        self.timeout = timeout
+        self.stale_lock = stale_lock
+
+    @classmethod
+    def from_config(cls, config):
+        """ Creates the station set up in a configuration
+
+        @param Configuration config: The configuration of the experiment
+        @return Station: The station
+        """
+        return cls(config.coordinator_ledger, config.coordinator_reserve, config.coordinator_station,
+                   config.coordinator_prefix, config.coordinator_reserve_size, config.coordinator_timeout)
+
+    def assign(self, age_group):
+        """ Hands out an id and a condition to a new participant. They come from the ledger if it can be reached, or
+        else from this station's reserved ids. Raises a ValueError if neither can.
+
+        @param str age_group: The age group of the participant
+        @return (str, int): The participant id and the condition
+        """
+        reserve = self.__read_reserve()
+        try:
+            return self.__update_ledger(reserve, lambda ledger: self.__assign_from(ledger, age_group))
+        except _Unreachable:
+            # What was changed before the ledger was lost was not saved
+            reserve = self.__read_reserve()
+
+        if len(reserve['numbers']) == 0:
+            raise ValueError("The ledger at ", self.ledger_loc, "can not be reached, and the station has no reserved "
+                                                                "ids left")
+        counts = _count_conditions(reserve['offline'], age_group, reserve['counts'].get(age_group))
+        entry = self.__new_entry(reserve['numbers'].pop(0), age_group, counts.index(min(counts)), offline=True)
+        reserve['offline'].append(entry)
+        replace_file(self.reserve_loc, json.dumps(reserve))
+        return entry['participant'], entry['condition']
+
+    def reserve(self):
+        """ Fills up this station's reserved ids from the ledger. Raises a ValueError if it can not be reached.
+
+        @return int: How many ids are reserved
+        """
+        reserve = self.__read_reserve()
+        try:
+            self.__update_ledger(reserve, lambda ledger: None)
+        except _Unreachable:
+            raise ValueError("The ledger at ", self.ledger_loc, "can not be reached")
+        return len(reserve['numbers'])
+
+    def __assign_from(self, ledger, age_group):
+        """ Hands out the next id and the least used condition of an age group from the ledger. Should not use this
+        outside of this class
+
+        @param dict ledger: The ledger, which is changed
+        @param str age_group: The age group of the participant
+        @return (str, int): The participant id and the condition
+        """
+        counts = _count_conditions(ledger['assignments'], age_group)
+        entry = self.__new_entry(ledger['next_number'], age_group, counts.index(min(counts)), offline=False)
+        ledger['next_number'] += 1
+        ledger['assignments'].append(entry)
+        return entry['participant'], entry['condition']
+
+    def __new_entry(self, number, age_group, condition, offline):
+        """ Makes the ledger entry of a participant. Should not use this outside of this class
+
+        @param int number: The participant number
+        @param str age_group: The age group of the participant
+        @param int condition: The condition of the participant
+        @param bool offline: Whether it was handed out from the reserved ids
+        @return dict: The entry
+        """
+        return {'participant': "{0}{1}".format(self.prefix, number), 'number': number, 'age_group': age_group,
+                'condition': condition, 'station': self.name, 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'offline': offline}
+
+    def __update_ledger(self, reserve, change):
+        """ Locks the ledger and changes it. The participants this station handed out from its reserved ids are added
+        to it first, and its reserved ids are filled up afterwards. Raises _Unreachable if the ledger can not be
+        reached or stays locked for longer than the timeout. Should not use this outside of this class
+
+        @param dict reserve: This station's reserve, which is changed and saved
+        @param function change: Changes the ledger it is given, and returns what this should return
+        @return: What change returned
+        """
+        ledger_dir = os.path.dirname(os.path.abspath(self.ledger_loc))
+        if not os.path.isdir(ledger_dir):
+            raise _Unreachable()
+
+        lock_loc = self.ledger_loc + ".lock"
+        self.__lock(lock_loc)
+        try:
+            if os.path.exists(self.ledger_loc):
+                with open(self.ledger_loc) as ledger_file:
+                    ledger = json.load(ledger_file)
+            else:
+                ledger = {'next_number': 1, 'assignments': [], 'reserved': {}}
+
+            # Unless they were added before, and the station stopped before it could save its reserve
+            added = set(entry['participant'] for entry in ledger['assignments'])
+            ledger['assignments'].extend(entry for entry in reserve['offline'] if entry['participant'] not in added)
+            reserve['offline'] = []
+
+            result = change(ledger)
+
+            while len(reserve['numbers']) < self.reserve_size:
+                reserve['numbers'].append(ledger['next_number'])
+                ledger['next_number'] += 1
+            ledger['reserved'][self.name] = reserve['numbers']
+
+            # The conditions as far as the station knows, for when the ledger can not be reached
+            age_groups = set(entry['age_group'] for entry in ledger['assignments'])
+            reserve['counts'] = dict((age_group, _count_conditions(ledger['assignments'], age_group))
+                                     for age_group in age_groups)
+
+            replace_file(self.ledger_loc, json.dumps(ledger))
+        except (IOError, OSError):
+            raise _Unreachable()
+        finally:
+            _unlock(lock_loc)
+
+        replace_file(self.reserve_loc, json.dumps(reserve))
+        return result
+
+    def __lock(self, lock_loc):
+        """ Locks the ledger by making its lock file, waiting for other stations to unlock it. A lock that is older
+        than stale_lock is removed. Raises _Unreachable if it can not be locked before the timeout. Should not use
+        this outside of this class
+
+        @param str lock_loc: The path of the lock file
+        @rtype: None
+        """
+        deadline = default_timer() + self.timeout
+        while True:
+            try:
+                os.close(os.open(lock_loc, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise _Unreachable()
+
+            try:
+                if time.time() - os.path.getmtime(lock_loc) > self.stale_lock:
+                    os.remove(lock_loc)
+                    continue
+            except OSError:
+                # It was unlocked in the meantime
+                continue
+
+            if default_timer() > deadline:
+                raise _Unreachable()
+            time.sleep(0.002)
+
+    def __read_reserve(self):
+        """ Reads this station's reserve file. Should not use this outside of this class
+
+        @return dict: The reserved participant numbers, the participants handed out from them that the ledger does
+        not have yet, and the number of participants of each condition in each age group when the ledger was last
+        reached
+        """
+        if not os.path.exists(self.reserve_loc):
+            return {'numbers': [], 'offline': [], 'counts': {}}
+        with open(self.reserve_loc) as reserve_file:
+            return json.load(reserve_file)
+
+
+class _Unreachable(Exception):
+    """ Raised when the ledger can not be reached or locked """
+
+
+def _unlock(lock_loc):
+    """ Unlocks the ledger
+
+    @param str lock_loc: The path of the lock file
+    @rtype: None
+    """
+    try:
+        os.remove(lock_loc)
+    except OSError:
+        pass
+
+
+def _count_conditions(entries, age_group, counts=None):
+    """ Counts the participants of an age group that have each condition
+
+    @param lst(dict) entries: The ledger entries of the participants
+    @param str age_group: The age group
+    @param lst(int)|None counts: Optional. Counts to add to
+    @return lst(int): The number of participants of each condition
+    """
+    counts = list(counts) if counts is not None else [0] * CONDITIONS
+    for entry in entries:
+        if entry['age_group'] == age_group:
+            counts[entry['condition']] += 1
+    return counts
+
+
+def main():
+    from config import Configuration
+
+    parser = argparse.ArgumentParser(description="Reserve ids for this station, or see the conditions handed out")
+    parser.add_argument('command', choices=['reserve', 'status'], help="What to do")
+    args = parser.parse_args()
+
+    config = Configuration('0', '0')
+    if config.coordinator_ledger is None:
+        print("There is no coordinator_ledger in config.py")
+        return
+    station = Station.from_config(config)
+
+    if args.command == 'reserve':
+        print("{0} has {1} reserved ids".format(station.name, station.reserve()))
+
+    elif args.command == 'status':
+        with open(config.coordinator_ledger) as ledger_file:
+            ledger = json.load(ledger_file)
+        age_groups = sorted(set(entry['age_group'] for entry in ledger['assignments']))
+        print("{0} participants, next number {1}".format(len(ledger['assignments']), ledger['next_number']))
+        for age_group in age_groups:
+            counts = _count_conditions(ledger['assignments'], age_group)
+            print("Age group {0}: {1}".format(age_group, " ".join("condition {0}: {1}".format(condition, count)
+                                                                   for condition, count in enumerate(counts))))
+        for name in sorted(ledger['reserved']):
+            print("{0} has {1} reserved ids".format(name, len(ledger['reserved'][name])))
+
+
+if __name__ == '__main__':
+    main()
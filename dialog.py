@@ -0,0 +1,26 @@
+""" The dialog that asks for the participant's details when the experiment starts. It only needs psychopy's gui, so it
+can be shown before the window and the rest of psychopy are loaded.
+"""
+import sys
+
+from psychopy import gui
+
+
+def ask_user_info(title):
+    """ A method used to ask the user for their participant id and their age group.
+        Will quit if the user presses 'cancel'
+
+        @param str title: The title of the pop-up box
+        @return (str, str): A tuple with of (participant id, age group)
+    """
+    info = {'Participant': '', 'Age group': ''}
+
+    # Store info about the experiment session
+    dialogue = gui.DlgFromDict(dictionary=info, title=title)
+
+    # User pressed cancel, so quit!
+    if dialogue.OK is False:
+        sys.exit()
+
+    # Return the results
+    return info['Participant'], info['Age group']
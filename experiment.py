@@ -1,14 +1,23 @@
 import time
 import os
 import sys
-import visual
-from config import Configuration
-from pandas import DataFrame
-import numpy
+import json
+import random
+import threading
+import warnings
+from collections import OrderedDict
+from timeit import default_timer
+from config import Configuration, UNSAVED_SETTINGS
+from orderings import OrderingIndex
+from manifest import ImageManifest
+from archive import open_images
+from planner import SessionPlan
 # ---------------- VERIFICATION --------------------
 # Ensure that relative paths start from the same directory as this script
-_thisDir = os.path.dirname(
-    os.path.abspath(__file__)).decode(sys.getfilesystemencoding())
+_thisDir = os.path.dirname(os.path.abspath(__file__))
+if isinstance(_thisDir, bytes):
+    # Python 2 gives the path as bytes
+    _thisDir = _thisDir.decode(sys.getfilesystemencoding())
 os.chdir(_thisDir)
 
 # ---------------------------------------------------
@@ -20,65 +29,775 @@ class Experiment:
     """ A general experiment class containing all the information for the experiment.
     """
 
-    def __init__(self):
-        """ Initializes a experiment class. """
+    def __init__(self, interface=None, started=None, resume=False, settings=None):
+        """ Initializes a experiment class.
+
+        The ordering files are read and checked, the images are found and the session is planned, see planner.py, on
+        a worker thread while the window opens.
+        How long each part of starting up took is added to the timing log, see log_startup.
+
+        When resuming, the participant's checkpoint is read, see save_checkpoint. Its configuration and random state
+        are used, the sections that were done are skipped, and the section that was stopped picks up where its
+        checkpoint was saved, see new_section.
+
+        @param interface: Optional. Where the ask_user_info function and the Window class used to interact with the
+        participant come from. Defaults to the visual module, which is only imported once the participant's details
+        are in. Can be a headless.Backend to run without a display.
+        @param float|None started: Optional. When the program started, from timeit.default_timer, so the time spent
+        importing is part of the startup profile
+        @param bool resume: Optional. Whether to carry on the participant's last session from its checkpoint, instead
+        of starting a new one
+        @param dict|None settings: Optional. Values to use instead of the ones in config.py, like
+        {'output_location': 'batch'}. They are set before anything uses the configuration, and are kept when resuming
+        """
         self.name = "Lantern"
+        start = default_timer() if started is None else started
+
+        if interface is None:
+            interface = _Display()
 
-        self.participant, self.age_group = visual.ask_user_info(self.name)
+        dialog_start = default_timer()
+        self.participant, self.age_group = interface.ask_user_info(self.name)
+        dialog_end = default_timer()
 
-        self.config = Configuration(self.participant, self.age_group)
+        # An empty participant id is handed out, along with a condition, by the coordinator, see coordinator.py
+        condition = None
+        if self.participant.strip() == '' and not resume:
+            self.participant, condition = self.__assign_participant()
+        assign_end = default_timer()
+
+        self.config = Configuration(self.participant, self.age_group, condition)
+        settings = {} if settings is None else settings
+        for key in settings:
+            if not hasattr(self.config, key):
+                raise ValueError("There is no setting ", key, "in config.py")
+        vars(self.config).update(settings)
+
+        # The checkpoint the session is resumed from, until the section it was saved in picks up from it
+        self._checkpoint = self.__read_checkpoint(resume)
+        if self._checkpoint is not None:
+            vars(self.config).update(self._checkpoint['config'])
+            vars(self.config).update(settings)
+
+        # The seed the session is planned from. Drawn from the random module, so seeding it seeds the whole session
+        if self.config.session_seed is None:
+            self.config.session_seed = random.randrange(2 ** 31)
+
+        # Read and check the ordering files, find the images and plan the session while the window opens, so a
+        # broken ordering file is still found before the session starts
+        self._loader = _Loader(self.config)
 
         self.date = time.strftime('%c')
         self._data = []
         self._data_type = None
+        self._timing = []
+        self._journal = None
+        self._journal_syncer = None
+        self._journal_rows_since_sync = 0
         self.section = 'setup'
-        self.window = visual.Window(self)
+
+        # The timing log of each section, which are also saved together for the whole session, see save_data
+        self._session_timing = OrderedDict([(self.section, self._timing)])
+
+        # The sections that are done, which a resumed session skips
+        self._completed = []
+
+        if self._checkpoint is not None:
+            self._completed = list(self._checkpoint['completed'])
+            state = self._checkpoint['random']
+            random.setstate((state[0], tuple(state[1]), state[2]))
+
+            # Starting up again is logged in its own section, after the sections of the stopped session
+            self._session_timing = OrderedDict((section, timing) for section, timing in self._checkpoint['timing'])
+            self.section = 'resume'
+            self._timing = self._session_timing.setdefault(self.section, [])
+
+        # How long push_data took since the data was last saved, and how many times it was called
+        self._push_time = 0.0
+        self._push_total = 0
+
+        window_start = default_timer()
+        self.window = interface.Window(self)
+        window_end = default_timer()
+        waited = self._loader.wait()
+
+        self.log_startup(to_dialog=dialog_start - start, dialog=dialog_end - dialog_start,
+                         assign=assign_end - dialog_end, window=window_end - window_start,
+                         loading=self._loader.duration, waited=waited,
+                         total=default_timer() - start - (dialog_end - dialog_start))
+
+    def __assign_participant(self):
+        """ Gets an id and a condition for the participant from the coordinator ledger set in config.py. Raises a
+        ValueError if there is none. Should not use this outside of this class
+
+        @return (str, int): The participant id and the condition
+        """
+        settings = Configuration('0', self.age_group)
+        if settings.coordinator_ledger is None:
+            raise ValueError("No participant id was typed in, and there is no coordinator_ledger in config.py to hand "
+                             "one out")
+
+        import coordinator
+        return coordinator.Station.from_config(settings).assign(self.age_group)
+
+    @property
+    def orderings(self):
+        """ The ordering files, read and checked when the experiment starts. Waits for them if they are still being
+        read
+        """
+        self._loader.wait()
+        return self._loader.orderings
+
+    @property
+    def images(self):
+        """ Where the images come from: the packed archive if there is one, or else the image files """
+        self._loader.wait()
+        return self._loader.images
+
+    @property
+    def manifest(self):
+        """ The instruction screens, found once, so showing them does not have to search for them """
+        self._loader.wait()
+        return self._loader.manifest
+
+    @property
+    def plan(self):
+        """ The plan of the whole session, made from config.session_seed when the experiment starts """
+        self._loader.wait()
+        return self._loader.plan
+
+    def log_startup(self, **phases):
+        """ Adds how long each phase of starting up took to the timing log, as one 'startup' entry, and warns if
+        starting up took longer than startup_budget. The time the participant's details were being typed in is not
+        counted.
+
+        @param phases: How long each phase took, in seconds. 'total' is the time it all took
+        @rtype None
+        """
+        self.log_timing('startup', phases.pop('total'), budget=self.config.startup_budget, **phases)
+        duration = self._timing[-1]['duration']
+        if duration > self.config.startup_budget:
+            warnings.warn("Starting up took {0:.1f}s, more than the startup_budget of {1:.1f}s".format(
+                duration, self.config.startup_budget))
 
     def push_data(self, data_point):
         """ Adds a data point to be saved later.
 
+            Data points that share the same parent, like the trials of a block, are kept together in a _RowGroup.
+            The parents are only flattened once for the whole group, and each data point only adds its own fields.
+
             @param lst data_point: The data point to be saved
             @rtype None
         """
+        start = default_timer()
         if self._data_type is None and data_point is not None:
             self._data_type = type(data_point)
         elif type(data_point) != self._data_type or data_point is None:
             raise ValueError("data_point ", data_point, "has the wrong type")
 
-        to_save = dict(vars(data_point))
-        while '_DataPoint__parent' in to_save:
-            parent = to_save.pop('_DataPoint__parent')
-            to_save.update(vars(parent))
+        fields = vars(data_point)
+        parent = fields.get('_DataPoint__parent')
+
+        if len(self._data) == 0 or self._data[-1].parent is not parent:
+            self._data.append(_RowGroup(data_point))
+            if self.config.data_journal:
+                self.__write_to_journal(self._data[-1].get_header())
+
+        row = self._data[-1].add(data_point)
+
+        if self.config.data_journal:
+            self.__write_to_journal(row)
+
+        self._push_time += default_timer() - start
+        self._push_total += 1
+
+    def __write_to_journal(self, row):
+        """ Adds a row to the end of the journal for the current section, "{section}.journal". The journal has one
+        JSON value per line, and is how the data of a section can be recovered if the experiment crashes before
+        save_data is called. Each group of rows starts with its header, see _RowGroup.get_header, and is followed by
+        the values of each row, where booleans are still true or false. Every data_journal_sync_every rows, the
+        journal is synced to the disk on a worker thread, so waiting for the disk does not delay the next trial.
+
+            @param dict|lst row: The row to add
+            @rtype None
+        """
+        if self._journal is None:
+            dir_loc = self.get_data_dir()
+            if not os.path.exists(dir_loc):
+                os.makedirs(dir_loc)
+            self._journal = open(dir_loc + self.section + ".journal", 'a')
+            self._journal_syncer = _JournalSyncer(self._journal)
+            self._journal_rows_since_sync = 0
+
+        self._journal.write(json.dumps(row, default=_to_json) + "\n")
+        self._journal.flush()
+
+        self._journal_rows_since_sync += 1
+        sync_every = self.config.data_journal_sync_every
+        if sync_every > 0 and self._journal_rows_since_sync >= sync_every:
+            self._journal_syncer.request()
+            self._journal_rows_since_sync = 0
+
+    def __close_journal(self, remove):
+        """ Closes the journal for the current section, if it is open. If it is kept, the rows written since it was
+        last synced are synced first, unless data_journal_sync_every is 0
+
+            @param bool remove: Whether to delete the journal, because the data it has was saved
+            @rtype None
+        """
+        journal_loc = self.get_data_dir() + self.section + ".journal"
+        if self._journal is not None:
+            self._journal_syncer.stop(sync=not remove and self.config.data_journal_sync_every > 0)
+            self._journal_syncer = None
+            self._journal.close()
+            self._journal = None
+        if remove and os.path.exists(journal_loc):
+            os.remove(journal_loc)
+
+    def log_timing(self, event, duration, **info):
+        """ Adds an entry to the timing log of the current section. The timing log is saved next to the data.
 
-        for key in to_save:
-            if type(to_save[key]) is bool or type(to_save[key]) is numpy.bool_:
-                to_save[key] = int(to_save[key])
+            @param str event: What was timed
+            @param float duration: How long it took, in seconds
+            @param info: Any extra information to be saved with the entry
+            @rtype None
+        """
+        entry = {'event': event, 'duration': duration}
+        entry.update(info)
+        self._timing.append(entry)
+
+    def span(self, event, **info):
+        """ Times the code in a with statement, and adds it to the timing log of the current section when it ends:
 
-        self._data.append(to_save)
+                with experiment.span('n_back_block', block_number=1):
+                    block.run()
+
+            @param str event: What is timed
+            @param info: Any extra information to be saved with the entry
+            @return _Span: The span, to use in a with statement
+        """
+        return _Span(self, event, info)
 
     def new_section(self, section_name):
-        """ Start a new section of the experiment"""
+        """ Start a new section of the experiment. If the session was resumed and its checkpoint was saved in this
+        section, the data and timing log the section had then are put back, and its journal is written again to
+        match them.
+
+        @param str section_name: The name of the section
+        @return dict|None: Where to pick up the section from, as given to save_checkpoint, if it is being resumed
+        """
+        self.__close_journal(remove=False)
         self.section = section_name
         self._data = []
         self._data_type = None
+        self._timing = []
+        self._session_timing[self.section] = self._timing
+        self.window.clear_image_cache()
+        self.window.clear_prefetched()
+
+        checkpoint = self._checkpoint
+        if checkpoint is None or checkpoint['section'] != section_name or section_name in self._completed:
+            return None
+        self._checkpoint = None
+
+        self._data = [_RowGroup(state=state) for state in checkpoint['data']]
+        self._timing.extend(dict(checkpoint['timing'])[section_name])
+
+        if self.config.data_journal:
+            self.__close_journal(remove=True)
+            for group in self._data:
+                self.__write_to_journal(group.get_header())
+                for row in zip(*group.values):
+                    self.__write_to_journal(list(row))
+        return checkpoint['progress']
+
+    def has_completed(self, section_name):
+        """ Checks if a section was done, in this session or the stopped one it resumes
+
+        @param str section_name: The name of the section
+        @rtype: bool
+        """
+        return section_name in self._completed
+
+    def end_section(self):
+        """ Marks the current section as done, once its data is saved, so a resumed session skips it
+
+        @rtype None
+        """
+        self._completed.append(self.section)
+        self.save_checkpoint()
+
+    def get_checkpoint_path(self):
+        """ Gets the path of this participant's checkpoint
+
+        @return str: The path, "checkpoint.json" in the data directory
+        """
+        return self.get_data_dir() + "checkpoint.json"
+
+    def save_checkpoint(self, **progress):
+        """ Saves a checkpoint that the session can be resumed from if it is stopped, replacing the last one. It has
+        the configuration, the state of the random module, the sections that are done, the data and timing log of
+        the current section so far, and where the current section is. The checkpoint is written to a new file that
+        then takes the place of the old one, so a crash while saving leaves the last checkpoint as it was.
+
+        @param progress: Where the current section is, as values json can write. new_section gives them back when the
+        session is resumed
+        @rtype None
+        """
+        if not self.config.checkpoints:
+            return
+
+        start = default_timer()
+        checkpoint = {'config': vars(self.config),
+                      'random': random.getstate(),
+                      'completed': self._completed,
+                      'section': self.section,
+                      'progress': progress,
+                      'data': [group.get_state() for group in self._data],
+                      'timing': list(self._session_timing.items())}
+        text = json.dumps(checkpoint, default=_to_json, separators=(',', ':'))
+
+        dir_loc = self.get_data_dir()
+        if not os.path.exists(dir_loc):
+            os.makedirs(dir_loc)
+        replace_file(self.get_checkpoint_path(), text)
+        self.log_timing('checkpoint', default_timer() - start, size=len(text))
+
+    def __read_checkpoint(self, resume):
+        """ Reads this participant's checkpoint. Should not use this outside of this class
+
+        @param bool resume: Whether the session is resumed. If not, a warning is shown when there is a checkpoint, as
+        the new session replaces it
+        @return dict|None: The checkpoint, or None if the session is not resumed
+        """
+        checkpoint_loc = self.get_checkpoint_path()
+        if not resume:
+            if self.config.checkpoints and os.path.exists(checkpoint_loc):
+                warnings.warn("Participant {0} has a checkpoint of a session that did not finish, which this session "
+                              "replaces. Use --resume to carry it on instead".format(self.participant))
+            return None
+
+        if not os.path.exists(checkpoint_loc):
+            raise ValueError("There is no checkpoint to resume at ", checkpoint_loc)
+        with open(checkpoint_loc) as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def get_data(self):
+        """ Gets the data that was pushed since the last time new section was called
+
+        @return DataFrame: One row for each data point
+        """
+        from pandas import DataFrame
+
+        rows = []
+        for group in self._data:
+            rows.extend(group.get_rows())
+        return DataFrame(rows)
+
+    def get_typed_data(self):
+        """ Gets the data like get_data, but with a type for each column that fits what was pushed. Booleans are
+        booleans, whole numbers are integers even when some are missing, and columns that are the same for a whole
+        block or section, like the configuration, are categories.
+
+        @return DataFrame: One row for each data point
+        """
+        bool_columns = set()
+        constant_columns = set()
+        column_values = []
+        for group in self._data:
+            bool_columns.update(group.bool_columns)
+            constant_columns.update(group.constants)
+            column_values.extend(zip(group.columns, group.values))
+        return set_column_types(self.get_data(), bool_columns, constant_columns, column_values)
+
+    def get_data_dir(self):
+        """ Gets the directory that the data of this experiment is saved to
+
+        @return str: The directory, ending with a '/'
+        """
+        return "{0}/{1}/{2}/".format(self.config.output_location, self.age_group, self.participant)
 
     def save_data(self):
         """ Saves the data data that was pushed since the last time new section was called to:
-        "{section}.csv" and resets the data to be saved
+        "{section}.csv" (or .parquet or .feather, depending on output_format) and resets the data to be saved. The
+        timing log is saved to "{section}_timing.csv", and the timing logs of every section so far are saved together
+        to "session_timing.csv". The plan of the session is saved to "session_plan.json". Once the data is saved, the
+        section's journal is deleted.
 
         """
+        from pandas import DataFrame
 
-        dir_loc = "{0}/{1}/{2}/".format(self.config.output_location,
-                                        self.age_group, self.participant)
+        start = default_timer()
+        dir_loc = self.get_data_dir()
         # Make sure the file directory exists
         if not os.path.exists(dir_loc):
             os.makedirs(dir_loc)
 
         # Get the output file
-        file_loc = dir_loc + self.section + ".csv"
-        df = DataFrame(self._data)
-        df.to_csv(file_loc, index=False)
+        if self.config.output_format == 'csv':
+            df = self.get_data()
+        else:
+            df = self.get_typed_data()
+        save_frame(df, dir_loc + self.section, self.config.output_format)
+
+        # Save how long things took during this section
+        self.log_timing('push_data', self._push_time, calls=self._push_total)
+        self._push_time = 0.0
+        self._push_total = 0
+        if self._journal_syncer is not None:
+            syncer = self._journal_syncer
+            self.log_timing('journal_sync', syncer.duration, calls=syncer.calls, longest=syncer.longest)
+        self.log_timing('save_data', default_timer() - start, rows=len(df))
+        DataFrame(self._timing).to_csv(dir_loc + self.section + "_timing.csv", index=False)
+
+        # And during the whole session, with the section of each entry in the first column
+        rows = [dict(entry, section=section) for section, timing in self._session_timing.items() for entry in timing]
+        session_timing = DataFrame(rows)
+        session_timing = session_timing[['section'] + [column for column in session_timing if column != 'section']]
+        session_timing.to_csv(dir_loc + "session_timing.csv", index=False)
+
+        self.plan.save(dir_loc + "session_plan.json")
+
+        # The data is safe now, so the journal is not needed
+        self.__close_journal(remove=True)
 
     def close(self):
-        """ Ends the experiment. Does not save any data"""
+        """ Ends the experiment. Does not save any data. The session is over, so its checkpoint is deleted"""
+        self.__close_journal(remove=False)
+        if os.path.exists(self.get_checkpoint_path()):
+            os.remove(self.get_checkpoint_path())
         self.window.close()
+
+
+class _Display:
+    """ The interface to the participant when the experiment is run on a display: a dialog for their details, then
+    the window. Only the dialog's part of psychopy is imported before it is shown, and the window's part once it is
+    done.
+    """
+
+    def __init__(self):
+        import dialog
+        self.dialog = dialog
+
+    def ask_user_info(self, title):
+        return self.dialog.ask_user_info(title)
+
+    def Window(self, experiment):
+        import visual
+        return visual.Window(experiment)
+
+
+class _Loader:
+    """ Reads and checks the ordering files, finds the images and plans the session on a worker thread, see
+    Experiment.__init__
+    """
+
+    def __init__(self, config):
+        """ Starts loading for the given configuration
+
+        @param Configuration config: The configuration of the experiment
+        """
+        self.config = config
+        self.orderings = None
+        self.images = None
+        self.manifest = None
+        self.plan = None
+
+        # How long loading took, and the error it raised if it failed
+        self.duration = None
+        self.error = None
+
+        self._thread = threading.Thread(target=self.__load, name="startup")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __load(self):
+        """ Loads everything. Runs on the worker thread. Should not use this outside of this class
+
+        @rtype: None
+        """
+        start = default_timer()
+        try:
+            self.orderings = OrderingIndex.load(self.config)
+            self.images = open_images(self.config.stimulus_archive)
+            self.manifest = ImageManifest.load(self.images)
+            self.plan = SessionPlan.make(self.config, self.orderings, self.images)
+        except Exception as error:
+            self.error = error
+        self.duration = default_timer() - start
+
+    def wait(self):
+        """ Waits until everything is loaded. Raises the error loading raised, if it failed
+
+        @return float: How long it waited, in seconds
+        """
+        start = default_timer()
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        return default_timer() - start
+
+
+class _JournalSyncer:
+    """ Syncs a journal to the disk on a worker thread, whenever it is asked to, see Experiment.__write_to_journal """
+
+    def __init__(self, journal):
+        """ Starts the worker thread for the given journal
+
+        @param file journal: The open journal
+        """
+        self.journal = journal
+
+        # How long syncing took in total, how many times it was done and the longest it took
+        self.duration = 0.0
+        self.calls = 0
+        self.longest = 0.0
+
+        self._wake = threading.Event()
+        self._stopping = False
+        self._sync_on_stop = False
+        self._thread = threading.Thread(target=self.__run, name="journal_sync")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def request(self):
+        """ Asks for the journal to be synced. Rows written while it is syncing are synced the next time it is asked
+
+        @rtype: None
+        """
+        self._wake.set()
+
+    def stop(self, sync):
+        """ Stops the worker thread, and waits for it to finish
+
+        @param bool sync: Whether to sync the journal one last time before stopping
+        @rtype: None
+        """
+        self._sync_on_stop = sync
+        self._stopping = True
+        self._wake.set()
+        self._thread.join()
+
+    def __run(self):
+        """ Syncs the journal each time it is asked to, until it is stopped. Runs on the worker thread. Should not use
+        this outside of this class
+
+        @rtype: None
+        """
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if not self._stopping or self._sync_on_stop:
+                start = default_timer()
+                os.fsync(self.journal.fileno())
+                duration = default_timer() - start
+                self.duration += duration
+                self.calls += 1
+                self.longest = max(self.longest, duration)
+            if self._stopping:
+                return
+
+
+class _Span:
+    """ Times the code in a with statement, see Experiment.span """
+
+    def __init__(self, experiment, event, info):
+        self.experiment = experiment
+        self.event = event
+        self.info = info
+        self.start = None
+
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.experiment.log_timing(self.event, default_timer() - self.start, **self.info)
+        return False
+
+
+class _RowGroup:
+    """ The saved rows of data points that have the same parent. The fields of the parents are the same for every row,
+    so they are flattened once and kept as constants. For each row, only the values of the data point's own fields
+    are kept, in one list per field.
+    """
+
+    def __init__(self, data_point=None, state=None):
+        """ Creates a group for data points like the given one, and with the same parent
+
+        @param data_point: The first data point of the group
+        @param dict|None state: Optional. A group saved by get_state to put back, instead of a new group. It has no
+        parent, so data points pushed after it start a new group
+        """
+        if state is not None:
+            self.parent = None
+            self.columns = state['columns']
+            self.values = state['values']
+            self.bool_columns = set(state['bool_columns'])
+            self.constants = state['constants']
+            return
+
+        fields = vars(data_point)
+        self.parent = fields.get('_DataPoint__parent')
+        self.columns = [key for key in fields if key != '_DataPoint__parent']
+        self.values = [[] for _ in self.columns]
+
+        # The columns that had booleans, which are saved as 0 or 1
+        self.bool_columns = set()
+
+        # Flatten the parents, so that the fields of nearer parents come first. The settings of the configuration that
+        # are only about how the experiment runs are left out
+        self.constants = {}
+        parent = self.parent
+        while parent is not None:
+            parent_fields = vars(parent)
+            unsaved = UNSAVED_SETTINGS if isinstance(parent, Configuration) else ()
+            for key in parent_fields:
+                if key != '_DataPoint__parent' and key not in unsaved:
+                    self.constants[key] = self.__to_saved(key, parent_fields[key])
+            parent = parent_fields.get('_DataPoint__parent')
+
+    def __to_saved(self, key, value):
+        """ Converts the value of a field to how it is saved. Booleans are saved as 0 or 1.
+
+        @param str key: The name of the field
+        @param value: The value to convert
+        @return: The value to save
+        """
+        import numpy
+
+        if type(value) is bool or type(value) is numpy.bool_:
+            self.bool_columns.add(key)
+            return int(value)
+        return value
+
+    def get_header(self):
+        """ Gets what the journal needs to know about this group to rebuild its rows
+
+        @return dict: The columns of the rows, the constants and the columns that had booleans so far
+        """
+        return {'columns': self.columns, 'constants': self.constants, 'bool_columns': sorted(self.bool_columns)}
+
+    def get_state(self):
+        """ Gets everything in this group, for a checkpoint
+
+        @return dict: The columns, the values of each column, the constants and the columns that had booleans
+        """
+        return {'columns': self.columns, 'values': self.values, 'constants': self.constants,
+                'bool_columns': sorted(self.bool_columns)}
+
+    def add(self, data_point):
+        """ Adds a row with the values of the given data point's fields
+
+        @param data_point: The data point, which must have the same fields as the first one
+        @return lst: The values of the data point's fields, before they were converted to how they are saved, so the
+        journal can tell which ones were booleans
+        """
+        fields = vars(data_point)
+        if len(fields) != len(self.columns) + (self.parent is not None):
+            raise ValueError("data_point ", data_point, "has different fields from the others")
+
+        row = [fields[key] for key in self.columns]
+        for column, key, value in zip(self.values, self.columns, row):
+            column.append(self.__to_saved(key, value))
+        return row
+
+    def get_rows(self):
+        """ Gets the rows in this group, joined with the constants
+
+        @return lst(dict): The rows
+        """
+        rows = []
+        for values in zip(*self.values):
+            row = dict(zip(self.columns, values))
+            row.update(self.constants)
+            rows.append(row)
+        return rows
+
+
+def set_column_types(df, bool_columns, constant_columns, column_values):
+    """ Gives each column of the data a type that fits what was pushed, see Experiment.get_typed_data
+
+    @param DataFrame df: The data, which is changed
+    @param set(str) bool_columns: The columns that had booleans
+    @param set(str) constant_columns: The columns that came from the parents of the data points
+    @param lst((str, lst)) column_values: The values each data point field had, as (column, values), for each group
+    of rows
+    @return DataFrame: The data
+    """
+    import numpy
+
+    int_columns = set()
+    other_columns = set()
+    for column, values in column_values:
+        for value in values:
+            if value is None:
+                continue
+            elif isinstance(value, (int, numpy.integer)):
+                int_columns.add(column)
+            else:
+                other_columns.add(column)
+
+    for column in df.columns:
+        if column in bool_columns:
+            df[column] = df[column].astype('boolean')
+        elif column in constant_columns:
+            df[column] = df[column].astype('category')
+        elif column in int_columns and column not in other_columns:
+            df[column] = df[column].astype('Int64')
+    return df
+
+
+def save_frame(df, file_loc, output_format):
+    """ Saves a DataFrame in the given format
+
+    @param DataFrame df: The data to save
+    @param str file_loc: Where to save it, without the extension
+    @param str output_format: 'csv', 'parquet' or 'feather'
+    @return str: The path of the saved file
+    """
+    file_loc = file_loc + "." + output_format
+    if output_format == 'csv':
+        df.to_csv(file_loc, index=False)
+    elif output_format == 'parquet':
+        df.to_parquet(file_loc, index=False)
+    elif output_format == 'feather':
+        df.reset_index(drop=True).to_feather(file_loc)
+    else:
+        raise ValueError("Unknown output format ", output_format)
+    return file_loc
+
+
+def replace_file(file_loc, text):
+    """ Writes text to a new file that then takes the place of the given one, so the file is never half written
+
+    @param str file_loc: The path of the file
+    @param str text: What to write
+    @rtype: None
+    """
+    temp_loc = file_loc + ".tmp"
+    with open(temp_loc, 'w') as temp_file:
+        temp_file.write(text)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+
+    if hasattr(os, 'replace'):
+        os.replace(temp_loc, file_loc)
+    else:
+        # Python 2 can not rename over a file on Windows
+        if os.path.exists(file_loc):
+            os.remove(file_loc)
+        os.rename(temp_loc, file_loc)
+
+
+def _to_json(value):
+    """ Converts values that json does not know about, like numpy numbers, to ones it does
+
+    @param value: The value to convert
+    @return: A value json can write
+    """
+    import numpy
+
+    if isinstance(value, numpy.generic):
+        return value.item()
+    raise TypeError("{} can not be written to a journal".format(repr(value)))
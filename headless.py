@@ -0,0 +1,346 @@
+""" A backend that runs the experiment without a display or a keyboard. A simulated participant answers every prompt
+instead, so whole sessions can be run on machines without a screen.
+
+Use it in place of the visual module:
+
+    experiment = Experiment(headless.Backend('P1', '7'))
+"""
+
+import random
+import re
+import time
+
+
+class SimulatedParticipant:
+    """ A participant that answers prompts the way a real one might. How well they do depends on the n-back level of
+    the block they are in, which they learn from the prompt shown before each block, like a real participant would.
+
+    Any object with the same methods can be used as a participant.
+    """
+
+    def __init__(self, hit_rate=None, false_alarm_rate=None, reaction_time=None, recognition_level=(5.0, 1.5),
+                 priming_effect=1.0, seed=None):
+        """ Creates a simulated participant
+
+        @param dict(int, float)|None hit_rate: The chance of pressing 'a' for an n-back target, by n-back level
+        @param dict(int, float)|None false_alarm_rate: The chance of pressing 'a' for a non-target, by n-back level
+        @param dict(int, (float, float))|None reaction_time: The mean and standard deviation of n-back reaction times
+        in seconds, by n-back level
+        @param (float, float) recognition_level: The mean and standard deviation of the detail level (1-8) at which
+        a post-task image is recognized
+        @param float priming_effect: How many detail levels earlier an image that was shown in the n-back task is
+        recognized
+        @param seed: Optional. The seed for this participant's random choices
+        """
+        self.hit_rate = hit_rate if hit_rate is not None else {1: 0.95, 2: 0.85, 3: 0.7}
+        self.false_alarm_rate = false_alarm_rate if false_alarm_rate is not None else {1: 0.03, 2: 0.06, 3: 0.1}
+        self.reaction_time = reaction_time if reaction_time is not None else {1: (0.5, 0.1), 2: (0.6, 0.12),
+                                                                             3: (0.7, 0.15)}
+        self.recognition_level = recognition_level
+        self.priming_effect = priming_effect
+        self.random = random.Random(seed)
+
+        # What the participant remembers
+        self.n_back_type = 1
+        self.focal_history = []
+        self.primes_seen = set()
+        self.recognized_at = {}
+
+    def read_screen(self, image_path):
+        """ Called when the participant is shown an instruction or prompt screen
+
+        @param str image_path: The path of the image being shown
+        @rtype: None
+        """
+        match = re.search(r'prompts[/\\][a-z]+_(\d)-back', image_path)
+        if match:
+            # A new block is starting
+            self.n_back_type = int(match.group(1))
+            self.focal_history = []
+
+    def reading_time(self, image_path):
+        """ How long the participant takes to read an instruction screen before pressing a key
+
+        @param str image_path: The path of the image being shown
+        @return float: The time in seconds
+        """
+        return self.random.uniform(1, 4)
+
+    def respond_n_back(self, focal_image_id, prime_image_path):
+        """ Called when the participant is shown an n-back trial
+
+        @param int focal_image_id: The id of the focal image being shown
+        @param str prime_image_path: The path of the prime image being shown
+        @return float|None: How long after the images appeared the participant pressed 'a', or None if they did not
+        """
+        n = self.n_back_type
+        target = len(self.focal_history) >= n and self.focal_history[-n] == focal_image_id
+        self.focal_history.append(focal_image_id)
+        self.primes_seen.add(_image_name(prime_image_path))
+
+        chance = self.hit_rate[n] if target else self.false_alarm_rate[n]
+        if self.random.random() >= chance:
+            return None
+
+        mean, deviation = self.reaction_time[n]
+        return max(0.15, self.random.gauss(mean, deviation))
+
+    def respond_post_task(self, prime_image_path, difficulty):
+        """ Called when the participant is shown a post-task image at some level of detail
+
+        @param str prime_image_path: The path of the image being shown
+        @param int difficulty: The level of detail of the image, from 1 to 8
+        @return float|None: How long after the image appeared the participant pressed space, or None if they did not
+        """
+        name = _image_name(prime_image_path)
+        if name not in self.recognized_at:
+            mean, deviation = self.recognition_level
+            if name in self.primes_seen:
+                mean -= self.priming_effect
+            self.recognized_at[name] = self.random.gauss(mean, deviation)
+
+        if difficulty < self.recognized_at[name]:
+            return None
+        return max(0.2, self.random.gauss(0.8, 0.2))
+
+    def type_answer(self, prompt, last_image_path):
+        """ Called when the participant is asked to type in what they saw
+
+        @param str|None prompt: The prompt shown to the participant
+        @param str|None last_image_path: The path of the last image the participant was shown
+        @return str: What the participant typed
+        """
+        if last_image_path is None:
+            return ''
+        return _image_name(last_image_path)
+
+    def typing_times(self, answer):
+        """ How long after the text prompt appeared the participant pressed each key of their answer, and then the
+        submit key. Takes a second to start typing, and a fifth of a second for each key after that
+
+        @param str answer: What the participant typed
+        @return lst(float): The times in seconds, one for each character and one for the submit key
+        """
+        return [1.0 + 0.2 * key for key in range(len(answer) + 1)]
+
+    def choose(self, prompt, choices):
+        """ Called when the participant is asked to pick one of a few choices
+
+        @param str prompt: The prompt shown to the participant
+        @param lst(str) choices: The choices
+        @return str: The choice that was picked
+        """
+        return self.random.choice(choices)
+
+
+def _image_name(image_path):
+    """ Gets the name of the object in a prime image, from a path like '.../{name}/{name}_{level}.png'
+
+    @param str image_path: The path of the prime image
+    @return str: The name of the object
+    """
+    return re.split('[/\\\\]', image_path)[-2]
+
+
+class Backend:
+    """ Used in place of the visual module to run an experiment without a display. Answers the participant info
+    dialogue with the given values, and makes windows that are answered by the given simulated participant.
+    """
+
+    def __init__(self, participant, age_group, simulated_participant=None, time_scale=0):
+        """ Creates a headless backend
+
+        @param str participant: The participant id to give when asked
+        @param str age_group: The age group to give when asked
+        @param SimulatedParticipant|None simulated_participant: Optional. Who answers the prompts
+        @param float time_scale: How fast time passes compared to a real session. 0 does not wait at all, 1 takes
+        as long as a real session
+        """
+        self.participant = participant
+        self.age_group = age_group
+        self.simulated_participant = simulated_participant
+        if self.simulated_participant is None:
+            self.simulated_participant = SimulatedParticipant()
+        self.time_scale = time_scale
+
+    def ask_user_info(self, title):
+        """ Used in place of visual.ask_user_info
+
+        @param str title: The title of the pop-up box
+        @return (str, str): A tuple with of (participant id, age group)
+        """
+        return self.participant, self.age_group
+
+    def Window(self, experiment):
+        """ Used in place of visual.Window
+
+        @param Experiment experiment: The experiment the window is for
+        @return Window: A window that shows nothing
+        """
+        return Window(experiment, self.simulated_participant, self.time_scale)
+
+
+class Window:
+    """ A window that shows nothing. Has the same methods as visual.Window, and gets its answers from a simulated
+    participant. Keeps a virtual clock of how long a real session would have taken.
+    """
+
+    def __init__(self, experiment, participant, time_scale=0):
+        """ Initializes the window class
+
+        @param Experiment experiment: The experiment the window is for
+        @param SimulatedParticipant participant: Who answers the prompts
+        @param float time_scale: How fast time passes compared to a real session
+        """
+        self.experiment = experiment
+        self.config = experiment.config
+        self.participant = participant
+        self.time_scale = time_scale
+
+        self.frame_period = 1.0 / 60
+        self.clock = 0.0
+        self._last_image_path = None
+
+    def __wait(self, duration):
+        """ Lets the given amount of virtual time pass. Should not use this outside of this file
+
+        @param float duration: The time in seconds
+        @rtype: None
+        """
+        self.clock += duration
+        if self.time_scale > 0:
+            time.sleep(duration * self.time_scale)
+
+    def frames_for(self, duration):
+        """ Finds the whole number of frames that is closest to the given duration. At least one frame is used.
+
+        @param float duration: The duration in seconds
+        @return int: The number of frames
+        """
+        return max(1, int(round(duration / self.frame_period)))
+
+    def default_wait_func(self, path):
+        """ The default function used for waiting during an image sequence
+
+        @param str path: The path of the image being displayed
+        @rtype None
+        """
+        if self.experiment.manifest.is_animated(path):
+            self.__wait(self.config.animation_time_between_frames)
+        else:
+            self.__wait(self.participant.reading_time(path))
+
+    def show_image_sequence(self, genre, subgenre='', task=None, extension='.png', wait_func=None):
+        """ Shows all the images which follow the pattern 'image/{task}/{genre}/{subgenre}/*{extension}' to the
+        participant, in ascending order.
+
+        @rtype: None
+        """
+        if task is None:
+            task = self.experiment.section
+        if wait_func is None:
+            wait_func = self.default_wait_func
+
+        image_paths = self.experiment.manifest.get_sequence(task, genre, subgenre, extension)
+
+        for image_path in image_paths:
+            self.participant.read_screen(image_path)
+            wait_func(image_path)
+
+    def preload_n_back_images(self, prime_image_paths):
+        """ Nothing needs to be loaded without a display
+
+        @rtype: None
+        """
+
+    def clear_image_cache(self):
+        """ Nothing needs to be loaded without a display
+
+        @rtype: None
+        """
+
+    def prefetch_image_sequence(self, genre, subgenre='', task=None, extension='.png'):
+        """ Nothing needs to be decoded without a display
+
+        @rtype: None
+        """
+
+    def prefetch_n_back_images(self, prime_image_paths):
+        """ Nothing needs to be decoded without a display
+
+        @rtype: None
+        """
+
+    def clear_prefetched(self):
+        """ Nothing needs to be decoded without a display
+
+        @rtype: None
+        """
+
+    def __present(self, duration, reaction_time, keys, stop_on_key=False):
+        """ Shows a screen for the whole number of frames closest to duration. Should not use this outside of this
+        file
+
+        @param float duration: How long to show the screen for, in seconds
+        @param float|None reaction_time: When the participant pressed a key, or None if they did not
+        @param str|lst(str)|None keys: The keys being watched for
+        @param bool stop_on_key: Whether to stop showing the screen as soon as a key is pressed
+        @return (str|None, float|None): The key that was pressed and the reaction time, or (None, None)
+        """
+        duration = self.frames_for(duration) * self.frame_period
+        if keys is None or reaction_time is None or reaction_time >= duration:
+            self.__wait(duration)
+            return None, None
+
+        self.__wait(reaction_time if stop_on_key else duration)
+        return (keys if isinstance(keys, str) else keys[0]), reaction_time
+
+    def n_back_show(self, n_back_image_id, prime_image_path, keys=None):
+        """ Shows the given n-back image and prime image to the participant for n_back_display_time
+
+        @return (str|None, float|None): The first key in keys that was pressed and the reaction time, or (None, None)
+        """
+        reaction_time = self.participant.respond_n_back(n_back_image_id, prime_image_path)
+        return self.__present(self.config.n_back_display_time, reaction_time, keys)
+
+    def post_task_show(self, prime_image_path, keys=None):
+        """ Shows the given prime image to the participant for prime_image_display_time, or until they press a key
+
+        @return (str|None, float|None): The key in keys that was pressed and the reaction time, or (None, None)
+        """
+        self._last_image_path = prime_image_path
+        difficulty = int(re.search(r'_(\d+)\.[a-z]+$', prime_image_path).group(1))
+        reaction_time = self.participant.respond_post_task(prime_image_path, difficulty)
+        return self.__present(self.config.prime_image_display_time, reaction_time, keys, stop_on_key=True)
+
+    def show_text(self, text, size=None):
+        """ Shows the text text to the participant"""
+
+    def wait_for_choice(self, prompt, choices, prompt_font_size=24, instruction_font_size=20, choice_font_size=20):
+        """ Asks the participant to pick one of the given choices, and returns it"""
+        return self.participant.choose(prompt, choices)
+
+    def wait_for_prompt(self, timer=None, keys='space'):
+        """ Waits until the participant presses a key in keys, and returns it
+
+        @rtype: str
+        """
+        return keys if isinstance(keys, str) else keys[0]
+
+    def get_input_text(self, prompt=None, prompt_font_size=24, input_font_size=20, submit_key='0'):
+        """ Asks the participant to type in what they saw, and returns it along with when each key was pressed
+
+        @return (str, lst(float)): The text, and when each key was pressed in seconds after the prompt appeared. The
+        last one is the submit key
+        """
+        answer = self.participant.type_answer(prompt, self._last_image_path)
+        key_times = self.participant.typing_times(answer)
+        self.__wait(key_times[-1])
+        return answer, key_times
+
+    def clear(self, time):
+        """ Clears the screen for the whole number of frames closest to the given amount of time"""
+        self.__wait(self.frames_for(time) * self.frame_period)
+
+    def close(self):
+        """ Closes this window"""
@@ -0,0 +1,88 @@
+""" Finds the images of every instruction and prompt sequence in /images once, when the experiment starts, so that
+showing a sequence does not have to search the file system.
+"""
+import os
+
+
+class ImageManifest:
+    """ The sorted image paths of the image sequences in /images, keyed by the task, genre and sub-genre they are
+    shown for, along with whether each image is part of an animation.
+    """
+
+    def __init__(self, images, sequences, directory="images", genres=('instructions', 'prompts')):
+        """ Creates a manifest of the given sequences
+
+        @param ImageFolder|StimulusArchive images: Where the images are, see archive.open_images
+        @param dict((str, str, str), lst(str)) sequences: The paths of the images in each (task, genre, subgenre)
+        folder, in the order they are shown
+        @param str directory: Where the images are
+        @param tuple(str) genres: The genres that were looked for. Sequences of other genres are searched for when
+        they are asked for
+        """
+        self.images = images
+        self.sequences = sequences
+        self.directory = directory
+        self.genres = genres
+
+        # Images that are marked with "animate" are shown for a set time, instead of until a key is pressed
+        self.animated = {}
+        for paths in sequences.values():
+            for path in paths:
+                self.animated[path] = 'animate' in os.path.basename(path)
+
+    @classmethod
+    def load(cls, images, directory="images", genres=('instructions', 'prompts')):
+        """ Finds every image sequence of the given genres in directory
+
+        @param ImageFolder|StimulusArchive images: Where the images are, see archive.open_images
+        @param str directory: Where the images are
+        @param tuple(str) genres: The genres of image sequences to find
+        @return ImageManifest: The manifest of the image sequences
+        """
+        sequences = {}
+        for task in images.listdir(directory):
+            for genre in genres:
+                genre_folder = os.path.join(directory, task, genre)
+                if not images.isdir(genre_folder):
+                    continue
+                for subgenre in [''] + images.listdir(genre_folder):
+                    folder = "{0}/{1}/{2}/{3}".format(directory, task, genre, subgenre)
+                    if not images.isdir(folder):
+                        continue
+                    # Named like glob names them, and without hidden files, which glob would skip
+                    names = [name for name in images.listdir(folder) if not name.startswith('.')]
+                    sequences[(task, genre, subgenre)] = [os.path.join(os.path.dirname(folder + "/*"), name)
+                                                          for name in names]
+        return cls(images, sequences, directory, genres)
+
+    def get_sequence(self, task, genre, subgenre='', extension='.png'):
+        """ Gets the images which follow the pattern '{directory}/{task}/{genre}/{subgenre}/*{extension}', in
+        ascending order. Sequences of genres that were not looked for when the manifest was made are searched for.
+
+        @param str task: The task the sequence is for
+        @param str genre: The genre of the sequence
+        @param str subgenre: The sub-genre of the sequence
+        @param str extension: The extension of the images
+        @return lst(str): The paths of the images, in the order they are shown
+        """
+        if genre not in self.genres:
+            return self.images.glob("{0}/{1}/{2}/{3}/*{4}".format(self.directory, task, genre, subgenre, extension))
+        return [path for path in self.sequences.get((task, genre, subgenre), []) if path.endswith(extension)]
+
+    def has_image(self, path):
+        """ Whether an image is part of one of the sequences that were found when the manifest was made
+
+        @param str path: The path of the image
+        @return bool: Whether it is in the manifest
+        """
+        return path in self.animated
+
+    def is_animated(self, path):
+        """ Whether an image is part of an animation, which is marked with "animate" in its name
+
+        @param str path: The path of the image
+        @return bool: Whether it is animated
+        """
+        if path in self.animated:
+            return self.animated[path]
+        return 'animate' in os.path.basename(path)
@@ -0,0 +1,331 @@
+""" Makes new n-back ordering files, so that new difficulty levels, longer blocks or more block variants do not have to
+be written by hand. The sequences are found by a backtracking search that only places a focal image when the rest of
+the sequence can still meet the constraints, and they are written in the same columns as the files in /ordering.
+
+For example, to write four new 2-back blocks with 6 targets and one 1-back lure each, like the ones in /ordering:
+
+    python ordering_generator.py 2 --blocks 4 --lures 1:1 --output new_ordering
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import math
+import os
+import random
+import time
+
+from orderings import find_targets_and_lures
+
+
+class OrderingGenerator:
+    """ Makes random sequences of focal image ids for n-back blocks that meet a set of constraints:
+
+    - The number of targets, from the target rate
+    - The exact number of lures of each kind. Kinds that are not given have no lures
+    - Optionally, no image straight after itself, except for the targets of a 1-back block
+    - Optionally, balanced image usage: every image is used the same number of times, give or take one
+
+    Targets and lures are counted the way find_targets_and_lures counts them, so they are what the experiment finds.
+    Like in the files in /ordering, a target is never also a lure.
+    """
+
+    def __init__(self, n_back_type, length=23, target_rate=0.26, lure_counts=None, image_ids=range(1, 9),
+                 no_immediate_repeats=False, balanced=True, seed=None):
+        """ Creates a generator for sequences that meet the given constraints. Raises a ValueError if they can
+        never be met.
+
+        @param int n_back_type: The n-back type of the blocks the sequences are for
+        @param int length: The number of trials in a sequence
+        @param float target_rate: The share of the trials that are targets. The number of targets is rounded
+        @param dict(int, int)|None lure_counts: The number of lures of each kind, by the i of the i-back lure
+        @param lst(int) image_ids: The focal image ids to use
+        @param bool no_immediate_repeats: Whether an image can not come straight after itself, unless it is a target
+        @param bool balanced: Whether every image must be used floor(length / images) or ceil(length / images) times
+        @param seed: Optional. The seed for the random choices
+        """
+        self.n_back_type = n_back_type
+        self.length = length
+        self.target_total = int(round(target_rate * length))
+        self.lure_counts = dict(lure_counts) if lure_counts is not None else {}
+        self.image_ids = list(image_ids)
+        self.no_immediate_repeats = no_immediate_repeats
+        self.random = random.Random(seed)
+
+        if balanced:
+            self.min_uses = length // len(self.image_ids)
+            self.max_uses = int(math.ceil(float(length) / len(self.image_ids)))
+        else:
+            self.min_uses = 0
+            self.max_uses = length
+
+        # How many steps a search can take before starting again with new targets and lures
+        self.max_steps = 2 * length * len(self.image_ids)
+
+        if length <= n_back_type:
+            raise ValueError("A {0}-back sequence needs more than {1} trials".format(n_back_type, length))
+        if self.target_total > length - n_back_type:
+            raise ValueError("A {0}-back sequence of {1} trials can not have {2} targets".format(
+                n_back_type, length, self.target_total))
+        for lure_kind, lure_total in self.lure_counts.items():
+            if lure_kind not in (1, 2, 3) or lure_kind == n_back_type:
+                raise ValueError("A {0}-back sequence can not have {1}-back lures".format(n_back_type, lure_kind))
+            if lure_total < 0 or lure_total > length - lure_kind:
+                raise ValueError("A sequence of {0} trials can not have {1} {2}-back lures".format(
+                    length, lure_total, lure_kind))
+        if no_immediate_repeats and n_back_type != 1 and self.lure_counts.get(1, 0) > 0:
+            raise ValueError("1-back lures are immediate repeats, so they can not be used with no_immediate_repeats")
+        if len(self.image_ids) * self.max_uses < length:
+            raise ValueError("There are not enough images for {} trials".format(length))
+        # Each target and lure is an image that was already used, which leaves fewer trials to use every image on
+        if self.min_uses > 0 and self.target_total + sum(self.lure_counts.values()) > length - len(self.image_ids):
+            raise ValueError("A balanced sequence of {0} trials can not have {1} targets and lures, as every image "
+                             "must be used".format(length, self.target_total + sum(self.lure_counts.values())))
+
+    def generate(self, tries=1000):
+        """ Makes a new random sequence that meets the constraints. Raises a ValueError if none is found.
+
+        First, the positions of the targets and of each kind of lure are picked at random, so every position is as
+        likely to get one. Then the images are placed by __search.
+
+        @param int tries: How many times to start again with new positions when the search takes too long
+        @return lst(int): The focal image ids, in the order they are shown
+        """
+        for _ in range(tries):
+            roles = self.__pick_roles()
+            if roles is None:
+                continue
+            sequence = self.__search(roles)
+            if sequence is not None:
+                return sequence
+        raise ValueError("No sequence meets the constraints after {} tries".format(tries))
+
+    def __pick_roles(self):
+        """ Picks at random which positions are targets and which are lures. Should not use this outside of this class
+
+        @return lst(int)|None: For each position, 0 if it is neither, the n-back type if it is a target, or the i of
+        the i-back lure. None if the targets and lures picked can not all be what they should be
+        """
+        n = self.n_back_type
+        roles = [0] * self.length
+        free_positions = list(range(n, self.length))
+        self.random.shuffle(free_positions)
+        for position in free_positions[:self.target_total]:
+            roles[position] = n
+        free_positions = free_positions[self.target_total:]
+
+        for lure_kind in sorted(self.lure_counts):
+            allowed = [position for position in free_positions if position >= lure_kind]
+            if len(allowed) < self.lure_counts[lure_kind]:
+                return None
+            for position in allowed[:self.lure_counts[lure_kind]]:
+                roles[position] = lure_kind
+            free_positions = [position for position in free_positions if roles[position] == 0]
+
+        # A target or lure is the same image as an earlier trial, which can make it the same image as other earlier
+        # trials too. Make sure that never turns it into a different kind of target or lure
+        same_as = list(range(self.length))
+        uses = {}
+        for position in range(self.length):
+            if roles[position] != 0:
+                same_as[position] = same_as[position - roles[position]]
+            uses[same_as[position]] = uses.get(same_as[position], 0) + 1
+
+            same = [i for i in (1, 2, 3, n) if position >= i and same_as[position - i] == same_as[position]]
+            if roles[position] == n:
+                if any(i != n for i in same):
+                    return None
+            elif roles[position] != 0:
+                if n in same or min(same) != roles[position]:
+                    return None
+        if max(uses.values()) > self.max_uses:
+            return None
+        return roles
+
+    def __search(self, roles):
+        """ Does one backtracking search, placing a focal image at each position in turn. Targets and lures are the
+        image they have to be, and every other position tries the images in a random order. A step is only taken if
+        the image is the target or lure it should be, and the rest of the sequence can still use every image often
+        enough. Should not use this outside of this class
+
+        @param lst(int) roles: For each position, what it should be, see __pick_roles
+        @return lst(int)|None: The sequence, or None if the search took too long
+        """
+        n = self.n_back_type
+        length = self.length
+        sequence = []
+        uses = dict((image_id, 0) for image_id in self.image_ids)
+        state = {'missing_uses': self.min_uses * len(self.image_ids), 'steps': 0}
+
+        def is_what_it_should_be(position, image_id):
+            """ Whether the image would be the target or lure the position should be, and nothing else"""
+            if position >= n and (sequence[position - n] == image_id) != (roles[position] == n):
+                return False
+            for i in (1, 2, 3):
+                if i != n and position >= i and sequence[position - i] == image_id:
+                    return roles[position] == i
+            return roles[position] in (0, n)
+
+        def place(position):
+            """ Fills in the sequence from the position onwards. Returns whether it could"""
+            if position == length:
+                return True
+
+            if roles[position] != 0:
+                candidates = [sequence[position - roles[position]]]
+            else:
+                candidates = self.random.sample(self.image_ids, len(self.image_ids))
+
+            positions_left = length - position - 1
+            for image_id in candidates:
+                state['steps'] += 1
+                if state['steps'] > self.max_steps:
+                    return False
+
+                if uses[image_id] >= self.max_uses or not is_what_it_should_be(position, image_id):
+                    continue
+                if self.no_immediate_repeats and position > 0 and sequence[position - 1] == image_id and \
+                        not (n == 1 and roles[position] == n):
+                    continue
+                missing_uses = state['missing_uses'] - (uses[image_id] < self.min_uses)
+                if missing_uses > positions_left:
+                    continue
+
+                sequence.append(image_id)
+                uses[image_id] += 1
+                state['missing_uses'] = missing_uses
+                if place(position + 1):
+                    return True
+
+                # Undo the step, and try the next image
+                sequence.pop()
+                uses[image_id] -= 1
+                state['missing_uses'] += uses[image_id] < self.min_uses
+            return False
+
+        if place(0):
+            return sequence
+        return None
+
+    def find_problems(self, sequence):
+        """ Checks a sequence against the constraints, using find_targets_and_lures like the experiment does
+
+        @param lst(int) sequence: The focal image ids, in the order they are shown
+        @return lst(str): A description of each constraint that is not met
+        """
+        problems = []
+        if len(sequence) != self.length:
+            problems.append("it has {0} trials instead of {1}".format(len(sequence), self.length))
+
+        found = find_targets_and_lures(sequence, self.n_back_type)
+        target_total = int(found['expected_response'].sum())
+        if target_total != self.target_total:
+            problems.append("it has {0} targets instead of {1}".format(target_total, self.target_total))
+        for lure_kind in (1, 2, 3):
+            if lure_kind == self.n_back_type:
+                continue
+            lure_total = int((found['lure_kind'] == lure_kind).sum())
+            if lure_total != self.lure_counts.get(lure_kind, 0):
+                problems.append("it has {0} {1}-back lures instead of {2}".format(
+                    lure_total, lure_kind, self.lure_counts.get(lure_kind, 0)))
+
+        for image_id in self.image_ids:
+            image_uses = list(sequence).count(image_id)
+            if not self.min_uses <= image_uses <= self.max_uses:
+                problems.append("it uses image {0} {1} times".format(image_id, image_uses))
+        if self.no_immediate_repeats:
+            for position in range(1, len(sequence)):
+                if sequence[position] == sequence[position - 1] and \
+                        not (self.n_back_type == 1 and found['expected_response'][position]):
+                    problems.append("image {0} comes straight after itself at trial {1}".format(
+                        sequence[position], position + 1))
+        return problems
+
+
+def write_ordering(path, sequence, n_back_type, order_set):
+    """ Writes a sequence to an ordering file, with the same columns as the files in /ordering. The response,
+    repeat_img, lure and lure_kind columns are filled in with find_targets_and_lures.
+
+    @param str path: Where to write the file
+    @param lst(int) sequence: The focal image ids, in the order they are shown
+    @param int n_back_type: The n-back type of the blocks the file is for
+    @param int|str order_set: The block number the file is for, or 'practice'
+    @rtype: None
+    """
+    found = find_targets_and_lures(sequence, n_back_type)
+
+    lines = [u"numb_back,order_set,img_numb,response,repeat_img,repeat_pos,lure,lure_kind"]
+    for position, image_id in enumerate(sequence):
+        is_target = bool(found['expected_response'][position])
+        lure_kind = int(found['lure_kind'][position])
+        lines.append(u"{0},{1},{2},{3},{4},{5},{6},{7}".format(
+            n_back_type, order_set, image_id, int(is_target), image_id if is_target else '', position + 1,
+            int(lure_kind != 0), "{}back".format(lure_kind) if lure_kind != 0 else '-'))
+
+    with io.open(path, 'w', encoding='utf-8') as ordering_file:
+        ordering_file.write(u"\n".join(lines) + u"\n")
+
+
+def _parse_lure_counts(values):
+    """ Reads lure counts given like '1:1 3:2' on the command line
+
+    @param lst(str) values: The counts, each like '{kind}:{count}'
+    @return dict(int, int): The number of lures of each kind
+    """
+    lure_counts = {}
+    for value in values:
+        try:
+            lure_kind, lure_total = value.split(':')
+            lure_counts[int(lure_kind)] = int(lure_total)
+        except ValueError:
+            raise ValueError("Lure counts are given like 1:2 for two 1-back lures, not ", value)
+    return lure_counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Make new n-back ordering files")
+    parser.add_argument('n_back_type', type=int, help="The n-back type of the blocks")
+    parser.add_argument('--blocks', type=int, default=4, help="How many block files to make")
+    parser.add_argument('--first-block', type=int, default=1, help="The block number of the first file")
+    parser.add_argument('--practice', action='store_true', help="Make the practice file instead of block files")
+    parser.add_argument('--length', type=int, default=23, help="The number of trials in each block")
+    parser.add_argument('--target-rate', type=float, default=0.26, help="The share of the trials that are targets")
+    parser.add_argument('--lures', nargs='*', default=[], help="The number of lures of each kind, like 1:1 3:2")
+    parser.add_argument('--no-immediate-repeats', action='store_true', help="Never show an image straight after "
+                                                                            "itself, unless it is a target")
+    parser.add_argument('--unbalanced', action='store_true', help="Do not make every image be used about as often")
+    parser.add_argument('--seed', type=int, default=None, help="The seed for the random choices")
+    parser.add_argument('--output', default='ordering', help="Where to write the files")
+    parser.add_argument('--overwrite', action='store_true', help="Replace files that already exist")
+    parser.add_argument('--speed', type=int, default=None, metavar='COUNT',
+                        help="Instead of writing files, time how long it takes to make COUNT sequences")
+    args = parser.parse_args()
+
+    generator = OrderingGenerator(args.n_back_type, args.length, args.target_rate, _parse_lure_counts(args.lures),
+                                  no_immediate_repeats=args.no_immediate_repeats, balanced=not args.unbalanced,
+                                  seed=args.seed)
+
+    if args.speed is not None:
+        start = time.time()
+        for _ in range(args.speed):
+            generator.generate()
+        elapsed = time.time() - start
+        print("Made {0} sequences in {1:.2f}s ({2:.0f} sequences/s)".format(args.speed, elapsed,
+                                                                           args.speed / max(elapsed, 1e-9)))
+    else:
+        if not os.path.exists(args.output):
+            os.makedirs(args.output)
+        order_sets = list(range(args.first_block, args.first_block + args.blocks))
+        if args.practice:
+            order_sets = ['practice']
+        for order_set in order_sets:
+            path = os.path.join(args.output, "{0}_{1}.csv".format(args.n_back_type, order_set))
+            if os.path.exists(path) and not args.overwrite:
+                raise ValueError("The ordering file ", path, "already exists. Use --overwrite to replace it")
+
+            sequence = generator.generate()
+            problems = generator.find_problems(sequence)
+            if len(problems) != 0:
+                raise ValueError("The sequence for ", path, "does not meet the constraints: " + "; ".join(problems))
+            write_ordering(path, sequence, args.n_back_type, order_set)
+            print("Wrote", path)
@@ -0,0 +1,261 @@
+""" Reads the n-back ordering files in /ordering once, checks them, and keeps the sequences of focal image ids they
+describe, so that blocks do not have to parse any files.
+
+Run it to check that the targets and lures written in the ordering files match the ones the experiment finds:
+
+    python orderings.py
+"""
+from __future__ import print_function
+
+import io
+import os
+import sys
+import warnings
+
+
+class OrderingIndex:
+    """ The focal image id sequences of all the ordering files, keyed by the file name (the order set)"""
+
+    def __init__(self, sequences, designs, config):
+        """ Creates an index of the given sequences, and works out which order sets each kind of block goes through
+
+        @param dict(str, numpy.ndarray) sequences: The focal image ids of each order set
+        @param dict(str, dict(str, lst(str))) designs: The response, lure and lure_kind columns of each order set, as
+        written in the file, if it has them
+        @param Configuration config: The configuration of the experiment
+        """
+        self.sequences = sequences
+        self.designs = designs
+
+        # The order sets the blocks of each n-back type go through, in both directions
+        self.block_order_sets = {}
+        for n_back_type in range(1, 4):
+            order_sets = ["{}_{}.csv".format(n_back_type, j + 1) for j in range(config.n_back_block_total)]
+            self.block_order_sets[(n_back_type, False)] = order_sets
+            self.block_order_sets[(n_back_type, True)] = order_sets[::-1]
+
+    @classmethod
+    def load(cls, config, directory="ordering", image_directory="images/n-back/task"):
+        """ Reads every ordering file in directory, and checks that the experiment has every order set it can need
+        and that they are all usable. Raises a ValueError if one is not.
+
+        The targets and lures written in the files are also checked against the ones the experiment finds in their
+        sequences. If they do not match, a warning is given, or a ValueError is raised if n_back_strict_orderings is
+        set.
+
+        @param Configuration config: The configuration of the experiment
+        @param str directory: Where the ordering files are
+        @param str image_directory: Where the focal images are
+        @return OrderingIndex: The index of the ordering files
+        """
+        focal_image_ids = set(int(os.path.splitext(name)[0]) for name in os.listdir(image_directory)
+                              if name.endswith('.gif'))
+
+        sequences = {}
+        designs = {}
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.endswith('.csv'):
+                sequences[file_name], designs[file_name] = read_ordering(os.path.join(directory, file_name),
+                                                                         focal_image_ids)
+
+        index = cls(sequences, designs, config)
+
+        # Make sure every block we could run has the right number of trials
+        for n_back_type in range(1, config.n_back_max_difficulty + 1):
+            for order_set in index.block_order_sets[(n_back_type, False)]:
+                index.check(order_set, n_back_type, config.n_back_trials_per_block)
+        for n_back_type in range(1, config.n_back_practice_max_difficulty + 1):
+            index.check("{}_practice.csv".format(n_back_type), n_back_type)
+
+        # Make sure the design written in the files is what participants will actually see
+        for error in index.find_design_errors():
+            if config.n_back_strict_orderings:
+                raise ValueError(error)
+            warnings.warn(error)
+
+        return index
+
+    def check(self, order_set, n_back_type, length=None):
+        """ Raises a ValueError if the order set does not exist, is too short for its n-back type, or does not have
+        the given length.
+
+        @param str order_set: The name of the ordering file
+        @param int n_back_type: The n-back type of the blocks it is used for
+        @param int|None length: Optional. The number of trials it must have
+        @rtype: None
+        """
+        if order_set not in self.sequences:
+            raise ValueError("The ordering file ", order_set, "is missing")
+
+        trial_total = len(self.sequences[order_set])
+        if trial_total <= n_back_type:
+            raise ValueError("The ordering file ", order_set, "is too short for a {}-back block".format(n_back_type))
+        if length is not None and trial_total != length:
+            raise ValueError("The ordering file ", order_set, "has {0} trials instead of {1}".format(trial_total,
+                                                                                                    length))
+
+    def find_design_errors(self):
+        """ Compares the targets and lures written in each ordering file with the ones found from its sequence by
+        find_targets_and_lures, which are what the experiment uses and saves.
+
+        @return lst(str): A description of each difference
+        """
+        errors = []
+        for order_set in sorted(self.sequences):
+            design = self.designs[order_set]
+            n_back_type = int(order_set.split('_')[0])
+            found = find_targets_and_lures(self.sequences[order_set], n_back_type)
+
+            for position in range(len(self.sequences[order_set])):
+                where = "{0} trial {1}".format(order_set, position + 1)
+
+                if 'response' in design:
+                    written = design['response'][position] == '1'
+                    if written != found['expected_response'][position]:
+                        errors.append("{0}: the file says it is {1}a target, but it is {2}".format(
+                            where, '' if written else 'not ', 'one' if found['expected_response'][position] else
+                            'not'))
+
+                if 'lure' in design:
+                    written_kind = None
+                    if design['lure'][position] == '1':
+                        written_kind = design['lure_kind'][position].replace('back', '-back')
+                    found_kind = _lure_kind_name(found['lure_kind'][position])
+                    if written_kind != found_kind:
+                        errors.append("{0}: the file says it is {1}, but it is {2}".format(
+                            where, _describe_lure(written_kind), _describe_lure(found_kind)))
+        return errors
+
+    def get(self, order_set):
+        """ Gets the focal image ids of an order set
+
+        @param str order_set: The name of the ordering file
+        @return numpy.ndarray: The focal image ids, in the order they are shown
+        """
+        return self.sequences[order_set]
+
+    def get_block_order_sets(self, n_back_type, reverse):
+        """ Gets the order sets that the blocks of an n-back type go through
+
+        @param int n_back_type: The n-back type of the blocks
+        @param bool reverse: Whether to go through them backwards
+        @return lst(str): The names of the ordering files, in the order they are used
+        """
+        return self.block_order_sets[(n_back_type, bool(reverse))]
+
+
+def find_targets_and_lures(sequence, n_back_type):
+    """ Finds, for every position of a sequence of focal images, the image that was n-back, whether it is a target,
+    and whether it is a lure. A lure happens when an i-back focal image is the same as the current focal image, and i
+    is not the n-back type. If there are many, the closest one is the kind of lure.
+
+    @param numpy.ndarray sequence: The focal image ids, in the order they are shown
+    @param int n_back_type: The n-back type of the block
+    @return dict(str, numpy.ndarray): 'n_back_image_id' (-1 where there is none), 'expected_response', 'lure' and
+    'lure_kind' (the i of the i-back lure, 0 where there is none), each with a value for every position
+    """
+    import numpy
+
+    sequence = numpy.asarray(sequence)
+    length = len(sequence)
+
+    n_back_image_ids = numpy.full(length, -1, dtype=sequence.dtype)
+    n_back_image_ids[n_back_type:] = sequence[:max(0, length - n_back_type)]
+
+    lure_kind = numpy.zeros(length, dtype=numpy.int64)
+    for i in range(3, 0, -1):
+        if i == n_back_type:
+            continue
+        # Going from the furthest back to the closest, so the closest one is kept
+        i_back_same = numpy.zeros(length, dtype=bool)
+        i_back_same[i:] = sequence[i:] == sequence[:max(0, length - i)]
+        lure_kind[i_back_same] = i
+
+    return {'n_back_image_id': n_back_image_ids,
+            'expected_response': (n_back_image_ids == sequence) & (n_back_image_ids != -1),
+            'lure': lure_kind != 0,
+            'lure_kind': lure_kind}
+
+
+def _lure_kind_name(lure_kind):
+    """ Gets the name of a kind of lure, as saved in the data
+
+    @param int lure_kind: The i of the i-back lure, or 0 if there is none
+    @return str|None: Like '2-back', or None if there is no lure
+    """
+    if lure_kind == 0:
+        return None
+    return "{}-back".format(lure_kind)
+
+
+def _describe_lure(lure_kind_name):
+    """ Describes a kind of lure in words
+
+    @param str|None lure_kind_name: Like '2-back', or None if there is no lure
+    @return str: The description
+    """
+    if lure_kind_name is None:
+        return "not a lure"
+    return "a {} lure".format(lure_kind_name)
+
+
+def read_ordering(path, focal_image_ids):
+    """ Reads the focal image ids in the img_numb column of an ordering file, along with the response, lure and
+    lure_kind columns if it has them. Raises a ValueError if the file is malformed or uses an id that has no focal
+    image.
+
+    @param str path: The path of the ordering file
+    @param set(int) focal_image_ids: The ids that have a focal image
+    @return (numpy.ndarray, dict(str, lst(str))): The focal image ids, in the order they are shown, and the values of
+    the other columns
+    """
+    import numpy
+
+    # The files can start with a byte order mark and use any line endings
+    with io.open(path, encoding='utf-8-sig') as ordering_file:
+        lines = [line for line in ordering_file.read().splitlines() if line.strip() != '']
+
+    if len(lines) == 0:
+        raise ValueError("The ordering file ", path, "is empty")
+
+    header = [column.strip() for column in lines[0].split(',')]
+    if 'img_numb' not in header:
+        raise ValueError("The ordering file ", path, "has no img_numb column")
+    column = header.index('img_numb')
+
+    design_columns = [name for name in ('response', 'lure', 'lure_kind') if name in header]
+    if 'lure' in design_columns and 'lure_kind' not in design_columns:
+        raise ValueError("The ordering file ", path, "has a lure column but no lure_kind column")
+    design = dict((name, []) for name in design_columns)
+
+    ids = []
+    for line_number, line in enumerate(lines[1:], 2):
+        values = [value.strip() for value in line.split(',')]
+        try:
+            ids.append(int(values[column]))
+        except (IndexError, ValueError):
+            raise ValueError("The ordering file ", path, "has no image id on line {}".format(line_number))
+        if ids[-1] not in focal_image_ids:
+            raise ValueError("The ordering file ", path, "uses image {0} on line {1}, which does not exist"
+                             .format(ids[-1], line_number))
+
+        for name in design_columns:
+            index = header.index(name)
+            design[name].append(values[index] if index < len(values) else '')
+
+    return numpy.array(ids, dtype=numpy.int64), design
+
+
+if __name__ == '__main__':
+    from config import Configuration
+
+    # Check every ordering file, as an older participant can get any of them
+    config = Configuration('0', '99')
+    config.n_back_strict_orderings = False
+    warnings.simplefilter('ignore')
+
+    design_errors = OrderingIndex.load(config).find_design_errors()
+    for design_error in design_errors:
+        print(design_error)
+    print("{} differences between the ordering files and the experiment".format(len(design_errors)))
+    sys.exit(1 if len(design_errors) != 0 else 0)
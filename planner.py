@@ -0,0 +1,263 @@
+""" Plans a whole session before its first screen, from one seed and the configuration: the counterbalancing, the order
+set of every n-back block at each n-back level the staircase can take it to, the order of the prime images in every
+block, and the order of the post-task images. The session only reads the plan while it runs, so its trials do no file
+system or random work, and the plan of any session can be made again from the seed saved with its data.
+
+The experiment saves the plan of each session next to its data, as "session_plan.json". To check that a saved plan
+can be made again exactly from its seed:
+
+    python planner.py check data/8/P13/session_plan.json
+
+Or to make the plan a participant would get with a given seed:
+
+    python planner.py make P13 8 --seed 123 --output plan.json
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import random
+import sys
+
+
+class SessionPlan:
+    """ Everything that is random or found on the file system in a session, worked out before it starts """
+
+    def __init__(self, seed, participant, age, counterbalancing, n_back_practice, n_back_test, focal_image_orders,
+                 post_task_practice, post_task_order):
+        """ Creates a plan
+
+        @param int seed: The seed the plan was made from
+        @param str participant: The participant id
+        @param int age: The age of the participant
+        @param dict counterbalancing: The condition, n_back_blocks_reversed and n_back_prime_list_name of the
+        participant
+        @param lst(dict) n_back_practice: The n_back_type, order_set and prime_image_order of each practice block
+        @param lst(dict) n_back_test: The order_sets (one for each n-back level, starting at 1) and prime_image_order
+        of each test block
+        @param dict(str, lst(int)) focal_image_orders: The focal image ids of every order set the plan uses
+        @param lst(str) post_task_practice: The folders of the post-task practice images, in the order they are shown
+        @param lst(str) post_task_order: The folders of the post-task images, in the order they are shown
+        """
+        self.seed = seed
+        self.participant = participant
+        self.age = age
+        self.counterbalancing = counterbalancing
+        self.n_back_practice = n_back_practice
+        self.n_back_test = n_back_test
+        self.focal_image_orders = focal_image_orders
+        self.post_task_practice = post_task_practice
+        self.post_task_order = post_task_order
+
+    @classmethod
+    def make(cls, config, orderings, images, seed=None):
+        """ Plans a session. The same seed, configuration, ordering files and images always give the same plan.
+
+        @param Configuration config: The configuration of the experiment
+        @param OrderingIndex orderings: The ordering files of the experiment
+        @param ImageFolder|StimulusArchive images: Where the images are, see archive.open_images
+        @param int|None seed: Optional. The seed to plan from. Defaults to the session_seed of the configuration
+        @return SessionPlan: The plan
+        """
+        seed = config.session_seed if seed is None else seed
+        rng = random.Random(seed)
+        used_order_sets = set()
+
+        n_back_practice = []
+        if config.n_back_task and config.practice_run:
+            for n_back_type in range(1, config.n_back_practice_max_difficulty + 1):
+                order_set = "{}_practice.csv".format(n_back_type)
+                used_order_sets.add(order_set)
+                prime_image_order = plan_prime_images(images, "images/prime/practice", len(orderings.get(order_set)),
+                                                      rng, loop=True)
+                n_back_practice.append({'n_back_type': n_back_type, 'order_set': order_set,
+                                        'prime_image_order': prime_image_order})
+
+        n_back_test = []
+        if config.n_back_task:
+            prime_folder = "images/prime/task/{}".format(config.n_back_prime_list_name)
+            for test_number in range(config.n_back_block_total):
+                # The staircase can take the block to any level, and the blocks of each level have their own order
+                order_sets = [orderings.get_block_order_sets(n_back_type, config.n_back_blocks_reversed)[test_number]
+                              for n_back_type in range(1, config.n_back_max_difficulty + 1)]
+                used_order_sets.update(order_sets)
+                prime_image_order = plan_prime_images(images, prime_folder, config.n_back_trials_per_block, rng,
+                                                      loop=False)
+                n_back_test.append({'order_sets': order_sets, 'prime_image_order': prime_image_order})
+
+        post_task_practice = []
+        post_task_order = []
+        if config.prime_task:
+            if config.practice_run:
+                post_task_practice = images.glob('images/prime/practice/*')
+            post_task_order = images.glob('images/prime/task/*/*')
+            rng.shuffle(post_task_order)
+
+        counterbalancing = {'condition': config.condition,
+                            'n_back_blocks_reversed': config.n_back_blocks_reversed,
+                            'n_back_prime_list_name': config.n_back_prime_list_name}
+        focal_image_orders = dict((order_set, [int(image_id) for image_id in orderings.get(order_set)])
+                                  for order_set in sorted(used_order_sets))
+
+        return cls(seed, config.participant, config.age, counterbalancing, n_back_practice, n_back_test,
+                   focal_image_orders, post_task_practice, post_task_order)
+
+    def get_test_order_set(self, test_number, n_back_type):
+        """ Gets the order set of a test block, at the n-back level the staircase took it to
+
+        @param int test_number: How many test blocks came before it
+        @param int n_back_type: The n-back level of the block
+        @return str: The name of the ordering file
+        """
+        return self.n_back_test[test_number]['order_sets'][n_back_type - 1]
+
+    def to_dict(self):
+        """ Gets the plan as values json can write
+
+        @return dict: The plan
+        """
+        return {'seed': self.seed,
+                'participant': self.participant,
+                'age': self.age,
+                'counterbalancing': self.counterbalancing,
+                'n_back_practice': self.n_back_practice,
+                'n_back_test': self.n_back_test,
+                'focal_image_orders': self.focal_image_orders,
+                'post_task_practice': self.post_task_practice,
+                'post_task_order': self.post_task_order}
+
+    @classmethod
+    def from_dict(cls, values):
+        """ Creates a plan from the values to_dict gave
+
+        @param dict values: The plan
+        @return SessionPlan: The plan
+        """
+        return cls(values['seed'], values['participant'], values['age'], values['counterbalancing'],
+                   values['n_back_practice'], values['n_back_test'], values['focal_image_orders'],
+                   values['post_task_practice'], values['post_task_order'])
+
+    def save(self, path):
+        """ Saves the plan as json
+
+        @param str path: Where to save it
+        @rtype: None
+        """
+        with open(path, 'w') as plan_file:
+            json.dump(self.to_dict(), plan_file, sort_keys=True, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        """ Reads a plan saved with save
+
+        @param str path: Where it was saved
+        @return SessionPlan: The plan
+        """
+        with open(path) as plan_file:
+            return cls.from_dict(json.load(plan_file))
+
+
+def plan_prime_images(images, prime_folder, trial_total, rng, loop):
+    """ Shuffles the prime images of a block, so there is one for each trial. If there are fewer prime images than
+    trials, they are shuffled again and again, without the same image twice in a row, if loop is set, or else a
+    ValueError is raised.
+
+    @param ImageFolder|StimulusArchive images: Where the images are, see archive.open_images
+    @param str prime_folder: The folder of the prime images, with a folder for each image
+    @param int trial_total: How many trials the block has
+    @param random.Random rng: Where the random choices come from
+    @param bool loop: Whether the prime images can be shown more than once in the block
+    @return lst(str): The paths of the prime images, in the order they are shown
+    """
+    paths = images.glob(prime_folder + '/*/*_8.png')
+    if len(paths) == 0 or (len(paths) < trial_total and not loop):
+        raise ValueError("There are {0} prime images in ".format(len(paths)), prime_folder,
+                         "for a block of {0} trials".format(trial_total))
+
+    order = shuffle_prime_images(paths, rng)
+    while len(order) < trial_total:
+        order.extend(shuffle_prime_images(paths, rng, do_not_start_with=order[-1]))
+    return order
+
+
+def shuffle_prime_images(paths, rng, do_not_start_with=None):
+    """ Return a shuffled copy of a list of paths to prime images. Optional argument do_not_start_with indicates a
+    path in the list that should not be the first one in the ordering
+
+    @param lst(str) paths: The paths of the prime images
+    @param random.Random rng: Where the random choices come from
+    @param str|None do_not_start_with: don't start the prime image path order with the given path
+    @return: lst(str)
+    """
+    paths = list(paths)
+    if do_not_start_with is not None and len(paths) > 1:
+        paths.remove(do_not_start_with)
+        first = rng.choice(paths)
+        paths.remove(first)
+        paths.append(do_not_start_with)
+        rng.shuffle(paths)
+        return [first] + paths
+
+    rng.shuffle(paths)
+    return paths
+
+
+def _make_plan(participant, age, seed, condition=None):
+    """ Plans the session of a participant like the experiment would
+
+    @param str participant: The participant id
+    @param int age: The age of the participant
+    @param int seed: The seed to plan from
+    @param int|None condition: Optional. The counterbalancing condition of the participant, like the coordinator hands
+    out. Defaults to the one config.Configuration gives the participant number
+    @return SessionPlan: The plan
+    """
+    from config import Configuration
+    from orderings import OrderingIndex
+    from archive import open_images
+
+    config = Configuration(participant, str(age), condition)
+    config.session_seed = seed
+    return SessionPlan.make(config, OrderingIndex.load(config), open_images(config.stimulus_archive))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Make session plans, or check saved ones")
+    subparsers = parser.add_subparsers(dest='command')
+    make_parser = subparsers.add_parser('make', help="Make the plan of a session")
+    make_parser.add_argument('participant', help="The participant id")
+    make_parser.add_argument('age', type=int, help="The age of the participant")
+    make_parser.add_argument('--seed', type=int, required=True, help="The seed to plan from")
+    make_parser.add_argument('--condition', type=int, default=None, help="The counterbalancing condition. Defaults "
+                                                                         "to the one the participant number gives")
+    make_parser.add_argument('--output', default=None, help="Where to save the plan. Prints it if not given")
+    check_parser = subparsers.add_parser('check', help="Check that saved plans are made again exactly from their "
+                                                       "seeds")
+    check_parser.add_argument('paths', nargs='+', help="The saved plans")
+    args = parser.parse_args()
+
+    if args.command == 'make':
+        plan = _make_plan(args.participant, args.age, args.seed, args.condition)
+        if args.output is not None:
+            plan.save(args.output)
+        else:
+            print(json.dumps(plan.to_dict(), sort_keys=True, indent=1))
+
+    elif args.command == 'check':
+        different = 0
+        for path in args.paths:
+            saved = SessionPlan.load(path)
+            # The condition may have come from the coordinator rather than the participant number
+            made = _make_plan(saved.participant, saved.age, saved.seed, saved.counterbalancing['condition'])
+            # Compared as json, like they were saved
+            same = json.dumps(made.to_dict(), sort_keys=True) == json.dumps(saved.to_dict(), sort_keys=True)
+            different += not same
+            print("{0}: {1}".format(path, "same" if same else "DIFFERENT"))
+        sys.exit(1 if different != 0 else 0)
+
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,3 @@
-from psychopy import core
-import glob
-import random
 import re
 
 
@@ -20,6 +17,11 @@ class Trial:
             self.user_response = None
             self.reaction_time = None
 
+            # When the participant typed their answer, in seconds after the text prompt appeared
+            self.time_to_first_key = None
+            self.time_to_submit = None
+            self.key_times = None
+
             self.__parent = config
 
     def __init__(self, image_folder_path, position, task):
@@ -31,27 +33,36 @@ class Trial:
 
     def run(self):
         """ Run the prime image identification task for the images in the folder folder_path """
-        timer = core.CountdownTimer(self.config.prime_image_display_time)
+        with self.experiment.span('post_task_trial', position=self.to_save.position):
+            self.__show_levels()
 
+    def __show_levels(self):
+        """ Show the prime image at each difficulty, until the user identifies it """
         for self.to_save.difficulty in range(1, 9):
             # Show the prime image for this difficulty
             folder_path = self.to_save.image_folder_path
             image_name = self.to_save.image_name
             prime_image_path = "{0}/{1}_{2}.png".format(folder_path, image_name, self.to_save.difficulty)
-            self.window.post_task_show(prime_image_path)
 
-            # Wait for an input by the user, or for a timeout
-            timer.reset()
-            if self.window.wait_for_prompt(timer, 'space'):
+            # Show it until the user gives an input, or for a timeout
+            key, reaction_time = self.window.post_task_show(prime_image_path, 'space')
+            if key is not None:
                 # Get the response time
-                self.to_save.reaction_time = self.config.prime_image_display_time - timer.getTime()
+                self.to_save.reaction_time = reaction_time
 
                 # User wants to input text, get input and return
-                self.to_save.user_response = self.window.get_input_text()
+                self.get_response()
                 return
 
         # The user did not react in in time. Get the to identify something
-        self.to_save.user_response = self.window.get_input_text()
+        self.get_response()
+
+    def get_response(self):
+        """ Asks the participant to type in what they saw, and saves it along with when each key was pressed """
+        self.to_save.user_response, key_times = self.window.get_input_text()
+        self.to_save.time_to_first_key = key_times[0]
+        self.to_save.time_to_submit = key_times[-1]
+        self.to_save.key_times = " ".join("{0:.4f}".format(key_time) for key_time in key_times)
 
 
 class Task:
@@ -62,40 +73,44 @@ class Task:
         self.config = experiment.config
 
     def run(self):
-        """ Run the prime task"""
+        """ Run the prime task, in the order of the session plan. A checkpoint is saved every prime_checkpoint_every
+        trials, and a resumed session picks up at the trial of its checkpoint, skipping the instructions and the
+        practice"""
         # Change the section info
-        self.experiment.new_section('prime')
+        progress = self.experiment.new_section('prime')
+        plan = self.experiment.plan
 
-        # Show the instructions for this task:
-        self.window.show_image_sequence('instructions', 'start')
+        if progress is None:
+            # Show the instructions for this task:
+            self.window.show_image_sequence('instructions', 'start')
 
-        # Go through the practice task
-        if self.config.practice_run:
-            self.window.show_image_sequence('instructions', 'practice')
-            practice_paths = glob.glob('images/prime/practice/*')
-            for practice_path in practice_paths:
-                trial = Trial(practice_path, -1, self)
-                trial.run()
+            # Go through the practice task
+            if self.config.practice_run:
+                self.window.show_image_sequence('instructions', 'practice')
+                for practice_path in plan.post_task_practice:
+                    trial = Trial(practice_path, -1, self)
+                    trial.run()
 
-        # Tell the user we are gonna start the real deal
-        self.window.show_image_sequence('instructions', 'test')
+            # Tell the user we are gonna start the real deal
+            self.window.show_image_sequence('instructions', 'test')
 
-        # Randomize how the prime image will be shown
-        prime_list = glob.glob('images/prime/task/*/*')
-        random.shuffle(prime_list)
+            first_position = 0
+        else:
+            first_position = progress['position']
 
-        # Show first half of prime images
-        for position in range(len(prime_list) // 2):
-            prime_image_path = prime_list[position]
-            trial = Trial(prime_image_path, position, self)
-            trial.run()
-            self.experiment.push_data(trial.to_save)
+        # The order the prime images are shown in was randomized when the session was planned
+        prime_list = plan.post_task_order
+
+        for position in range(first_position, len(prime_list)):
+            # 0 saves no checkpoints during the post-task
+            every = self.config.prime_checkpoint_every
+            if every > 0 and position % every == 0:
+                self.experiment.save_checkpoint(position=position)
 
-        # Take a break
-        self.window.show_image_sequence('instructions', 'halfway')
+            # Take a break after the first half of the prime images
+            if position == len(prime_list) // 2:
+                self.window.show_image_sequence('instructions', 'halfway')
 
-        # Show the second half
-        for position in range(len(prime_list) // 2, len(prime_list)):
             prime_image_path = prime_list[position]
             trial = Trial(prime_image_path, position, self)
             trial.run()
@@ -106,3 +121,4 @@ class Task:
 
         # Save the data we gathered
         self.experiment.save_data()
+        self.experiment.end_section()
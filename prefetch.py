@@ -0,0 +1,162 @@
+""" Decodes images on a worker thread, so the window only has to upload pixels that are ready when it shows them.
+
+Images are requested ahead of time, while the participant is reading an instruction screen, and are taken when they
+are needed:
+
+    prefetcher = Prefetcher()
+    prefetcher.request(paths)
+    ...
+    image = prefetcher.get(paths[0])
+"""
+import threading
+from timeit import default_timer
+
+try:
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+
+def decode_image(path):
+    """ Reads an image file and decodes its pixels, in a mode that can be uploaded as a texture without converting it
+
+    @param str path: The path of the image
+    @return PIL.Image.Image: The decoded image
+    """
+    from PIL import Image
+
+    with open(path, 'rb') as image_file:
+        image = Image.open(image_file)
+        image.load()
+    if image.mode == 'P' and 'transparency' not in image.info:
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA')
+    return image
+
+
+class _Failed:
+    """ Stands in for an image that could not be decoded, until it is asked for"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class Prefetcher:
+    """ Keeps the decoded images that were requested, and decodes new requests on a worker thread, in the order they
+    were requested. Images are kept until they are discarded or clear is called.
+    """
+
+    def __init__(self, load=decode_image, threaded=True):
+        """ Creates a prefetcher, and starts its worker thread
+
+        @param load: The function that decodes an image, given its path
+        @param bool threaded: Whether to decode images on a worker thread. If not, images are only decoded when they
+        are asked for
+        """
+        self.load = load
+        self.threaded = threaded
+
+        self._images = {}
+        self._pending = set()
+        self._condition = threading.Condition()
+        self._requests = queue.Queue()
+
+        # How long get had to wait for the worker, and how many images it had to decode itself, since the start
+        self.wait_time = 0.0
+        self.misses = 0
+
+        self._worker = None
+        if threaded:
+            self._worker = threading.Thread(target=self.__work, name="prefetch")
+            self._worker.daemon = True
+            self._worker.start()
+
+    def __work(self):
+        """ Decodes the requested images, until None is requested. Runs on the worker thread. Should not use this
+        outside of this class
+
+        @rtype: None
+        """
+        while True:
+            path = self._requests.get()
+            if path is None:
+                return
+
+            try:
+                image = self.load(path)
+            except Exception as error:
+                image = _Failed(error)
+
+            with self._condition:
+                self._images[path] = image
+                self._pending.discard(path)
+                self._condition.notify_all()
+
+    def request(self, paths):
+        """ Asks for the given images to be decoded on the worker thread, if they have not been already
+
+        @param lst(str) paths: The paths of the images
+        @rtype: None
+        """
+        if not self.threaded:
+            return
+
+        with self._condition:
+            for path in paths:
+                if path not in self._images and path not in self._pending:
+                    self._pending.add(path)
+                    self._requests.put(path)
+
+    def get(self, path):
+        """ Gets a decoded image. Waits for the worker if it is decoding it, and decodes it right away if it was never
+        requested. Raises the error the decoding raised, if it failed.
+
+        @param str path: The path of the image
+        @return: The decoded image
+        """
+        with self._condition:
+            if path in self._pending:
+                start = default_timer()
+                while path in self._pending:
+                    self._condition.wait()
+                self.wait_time += default_timer() - start
+            image = self._images.get(path)
+
+        if image is None:
+            image = self.load(path)
+            self.misses += 1
+            with self._condition:
+                self._images[path] = image
+
+        if isinstance(image, _Failed):
+            raise image.error
+        return image
+
+    def discard(self, path):
+        """ Forgets a decoded image, once it is not needed anymore
+
+        @param str path: The path of the image
+        @rtype: None
+        """
+        with self._condition:
+            self._images.pop(path, None)
+
+    def clear(self):
+        """ Forgets the images that were decoded. Images that are still being decoded are kept when they are done.
+
+        @rtype: None
+        """
+        with self._condition:
+            self._images = {}
+
+    def close(self):
+        """ Stops the worker thread, once it has decoded the images that were requested
+
+        @rtype: None
+        """
+        if self._worker is not None:
+            self._requests.put(None)
+            self._worker.join()
+            self._worker = None
@@ -1,21 +1,43 @@
 """ Code for running the Lantern experiment.
 """
+from timeit import default_timer
+
+# When the program started, so the time spent importing is part of the startup profile
+STARTED = default_timer()
+
+import argparse
+
 import task
 import post_task
 from experiment import Experiment
 
-# ---------------- SETUP --------------------
-experiment = Experiment()
 
-# ---------------- MAIN PROGRAM --------------------
-if experiment.config.n_back_task:
-    n_back = task.Task(experiment)
-    n_back.run()
+def run(experiment):
+    """ Runs the parts of the experiment that are turned on in its configuration and were not done before it was
+    resumed, then closes it
+
+    @param Experiment experiment: The experiment to run
+    @rtype: None
+    """
+    if experiment.config.n_back_task and not experiment.has_completed('n-back'):
+        n_back = task.Task(experiment)
+        n_back.run()
+
+    if experiment.config.prime_task and not experiment.has_completed('prime'):
+        prime = post_task.Task(experiment)
+        prime.run()
+
+    experiment.close()
 
-if experiment.config.prime_task:
-    prime = post_task.Task(experiment)
-    prime.run()
 
-experiment.close()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the Lantern experiment")
+    parser.add_argument('--resume', action='store_true', help="Carry on a session that was stopped, from its last "
+                                                               "checkpoint, for the participant typed in")
+    args = parser.parse_args()
 
+    # ---------------- SETUP --------------------
+    experiment = Experiment(started=STARTED, resume=args.resume)
 
+    # ---------------- MAIN PROGRAM --------------------
+    run(experiment)
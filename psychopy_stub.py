@@ -0,0 +1,225 @@
+""" A stand-in for the parts of psychopy the experiment uses, so that visual.Window, the tasks and their data can be run
+and timed without a display. Nothing is drawn, and time is virtual: a flip moves the clock to the next frame and
+core.wait moves it forward, without sleeping, so the time a session takes is only the time spent in our own code.
+
+Keys are pressed by a script, from a seeded random generator, so the same seed always gives the same session:
+
+    import psychopy_stub
+    psychopy_stub.install(seed=1)
+    import visual
+
+It has to be installed before visual is first imported.
+"""
+import random
+import sys
+import types
+
+import numpy
+
+
+class _Clock:
+    """ The virtual time, in seconds """
+
+    def __init__(self):
+        self.now = 0.0
+
+
+class _Script:
+    """ Which keys are pressed, and when """
+
+    def __init__(self, seed, press_chance, answer, submit_key):
+        """ Creates a script
+
+        @param seed: The seed for the random choices
+        @param float press_chance: The chance a watched key is pressed each time the keys are checked
+        @param str answer: What is typed into text boxes, before the submit key
+        @param str submit_key: The key that submits a text box
+        """
+        self.random = random.Random(seed)
+        self.press_chance = press_chance
+        self.typing = list(answer) + [submit_key]
+        self.typed = 0
+
+
+_clock = _Clock()
+_script = _Script(0, 0.02, "abc", '0')
+
+
+class Window:
+    """ A window that is never shown """
+
+    def __init__(self, fullscr=False, monitor=None, units='norm', color=0, size=(1920, 1080), frame_rate=60.0,
+                 **kwargs):
+        self.size = numpy.array(size)
+        self.monitor = monitor
+        self.units = units
+        self.monitorFramePeriod = 1.0 / frame_rate
+        self._frame_rate = frame_rate
+
+    def getActualFrameRate(self):
+        return self._frame_rate
+
+    def flip(self):
+        """ Moves the clock to the next frame
+
+        @return float: The time of the flip
+        """
+        frame = int(_clock.now * self._frame_rate + 1e-9) + 1
+        _clock.now = frame / self._frame_rate
+        return _clock.now
+
+    def close(self):
+        pass
+
+
+class _Stim:
+    """ A stimulus that is never drawn """
+
+    def __init__(self, win=None, pos=(0, 0), size=None, text='', **kwargs):
+        self.win = win
+        self.pos = pos
+        self.size = numpy.array(size if size is not None else (1.0, 1.0), dtype=float)
+        self.text = text
+        self.boundingBox = (100, 20)
+
+    def draw(self):
+        pass
+
+
+class ImageStim(_Stim):
+    """ An image stimulus. Setting its image copies the pixels, like uploading them to a texture would """
+
+    def __init__(self, win=None, image=None, **kwargs):
+        _Stim.__init__(self, win, **kwargs)
+        self._image = None
+        self._pixels = None
+        if image is not None:
+            self.image = image
+
+    @property
+    def image(self):
+        return self._image
+
+    @image.setter
+    def image(self, image):
+        if not hasattr(image, 'size'):
+            from PIL import Image
+
+            image = Image.open(image)
+        self._image = image
+        self._pixels = numpy.array(image)
+
+
+class TextStim(_Stim):
+    pass
+
+
+class Rect(_Stim):
+    pass
+
+
+class Mouse:
+    """ A mouse that always clicks on what it is asked about """
+
+    def __init__(self, win=None, **kwargs):
+        pass
+
+    def isPressedIn(self, shape, buttons=None):
+        return True
+
+
+class CountdownTimer:
+    def __init__(self, start=0):
+        self.end = _clock.now + start
+
+    def getTime(self):
+        return self.end - _clock.now
+
+    def reset(self, start=0):
+        self.end = _clock.now + start
+
+    def add(self, time):
+        self.end += time
+
+
+class DlgFromDict:
+    """ A dialog that is never shown. Its dictionary is left as it was given """
+
+    def __init__(self, dictionary, title='', **kwargs):
+        self.OK = True
+
+
+def getTime():
+    return _clock.now
+
+
+def wait(secs, hogCPUperiod=0.2):
+    _clock.now += secs
+
+
+def clearEvents(eventType=None):
+    _script.typed = 0
+
+
+def getKeys(keyList=None, timeStamped=False):
+    """ Gets the keys the script pressed since the last check. Escape is never pressed. When any key is watched for,
+    like in a text box, the next key of the answer is pressed. Otherwise the first watched key is pressed, sometimes.
+
+    @param lst(str)|None keyList: The keys to check for, or None for any key
+    @param bool timeStamped: Whether to give the time each key was pressed
+    @return lst(str)|lst((str, float)): The keys
+    """
+    if keyList is None:
+        key = _script.typing[_script.typed % len(_script.typing)]
+        _script.typed += 1
+    elif keyList != ['escape'] and _script.random.random() < _script.press_chance:
+        key = keyList[0]
+    else:
+        return []
+    return [(key, _clock.now)] if timeStamped else [key]
+
+
+def pix2cm(pixels, monitor):
+    return pixels / 40.0
+
+
+def cm2pix(cm, monitor):
+    return cm * 40.0
+
+
+def _module(name, **members):
+    """ Makes a module with the given members
+
+    @param str name: The name of the module
+    @return types.ModuleType: The module
+    """
+    module = types.ModuleType(name)
+    for key, value in members.items():
+        setattr(module, key, value)
+    return module
+
+
+def install(seed=0, press_chance=0.02, answer="abc", submit_key='0'):
+    """ Puts the stand-in modules in place of psychopy, and resets the clock and the script
+
+    @param seed: The seed for the keys the script presses
+    @param float press_chance: The chance a watched key is pressed each time the keys are checked
+    @param str answer: What is typed into text boxes, before the submit key
+    @param str submit_key: The key that submits a text box
+    @rtype: None
+    """
+    global _script
+    _clock.now = 0.0
+    _script = _Script(seed, press_chance, answer, submit_key)
+
+    visual = _module('psychopy.visual', Window=Window, ImageStim=ImageStim, TextStim=TextStim, Rect=Rect)
+    core = _module('psychopy.core', getTime=getTime, wait=wait, quit=sys.exit, CountdownTimer=CountdownTimer)
+    event = _module('psychopy.event', getKeys=getKeys, clearEvents=clearEvents, Mouse=Mouse)
+    gui = _module('psychopy.gui', DlgFromDict=DlgFromDict)
+    monitorunittools = _module('psychopy.tools.monitorunittools', pix2cm=pix2cm, cm2pix=cm2pix)
+    tools = _module('psychopy.tools', monitorunittools=monitorunittools)
+    psychopy = _module('psychopy', visual=visual, core=core, event=event, gui=gui, tools=tools)
+
+    sys.modules.update({'psychopy': psychopy, 'psychopy.visual': visual, 'psychopy.core': core,
+                        'psychopy.event': event, 'psychopy.gui': gui, 'psychopy.tools': tools,
+                        'psychopy.tools.monitorunittools': monitorunittools})
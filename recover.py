@@ -0,0 +1,165 @@
+""" Rebuilds the data of sections that were not saved, because the experiment crashed or was closed before the end of
+the section, from the journals written while the section was running.
+
+Example, recovering every journal in the data directory:
+
+    python recover.py data
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+from collections import OrderedDict
+
+from pandas import DataFrame
+
+from config import Configuration
+
+
+def find_journals(paths):
+    """ Finds all the journals in the given directories, or the given journal files
+
+    @param lst(str) paths: Directories to search, or journal files
+    @return lst(str): The paths of the journals
+    """
+    journals = []
+    for path in paths:
+        if os.path.isfile(path):
+            journals.append(path)
+            continue
+        for dir_path, dir_names, file_names in os.walk(path):
+            for file_name in file_names:
+                if file_name.endswith('.journal'):
+                    journals.append(os.path.join(dir_path, file_name))
+    journals.sort()
+    return journals
+
+
+def read_journal_groups(journal_loc):
+    """ Reads the groups of rows in a journal. If the last row was only partly written, it is left out.
+
+    A journal has one JSON value per line. A group of rows starts with a header that has the columns of the rows, the
+    constants that are joined to each of them and the columns that had booleans, followed by a list of values for each
+    row. Booleans are saved as 0 or 1 in the constants, and are still true or false in the rows.
+
+    @param str journal_loc: The path of the journal
+    @return lst((dict, lst(lst))): The header and the values of each row of each group
+    """
+    groups = []
+    with open(journal_loc) as journal:
+        for line in journal:
+            if not line.endswith('\n'):
+                # The experiment stopped while writing this row
+                break
+            value = json.loads(line, object_pairs_hook=OrderedDict)
+            if isinstance(value, dict):
+                groups.append((value, []))
+            else:
+                groups[-1][1].append(value)
+    return groups
+
+
+def read_journal(journal_loc):
+    """ Reads the rows in a journal, with booleans as 0 or 1 like Experiment.get_data, see read_journal_groups
+
+    @param str journal_loc: The path of the journal
+    @return lst(dict): The rows, with their columns in the order they were written
+    """
+    return _join_rows(read_journal_groups(journal_loc))
+
+
+def read_typed_journal(journal_loc):
+    """ Reads the rows in a journal, with a type for each column like Experiment.get_typed_data
+
+    @param str journal_loc: The path of the journal
+    @return DataFrame: One row for each data point
+    """
+    # Imported here, as importing experiment changes the working directory
+    from experiment import set_column_types
+
+    groups = read_journal_groups(journal_loc)
+    bool_columns = set()
+    constant_columns = set()
+    column_values = []
+    for header, values in groups:
+        bool_columns.update(header.get('bool_columns', []))
+        constant_columns.update(header['constants'])
+        for column, values_in_column in zip(header['columns'], zip(*values)):
+            if any(type(value) is bool for value in values_in_column):
+                bool_columns.add(column)
+            column_values.append((column, [_to_saved(value) for value in values_in_column]))
+    return set_column_types(DataFrame(_join_rows(groups)), bool_columns, constant_columns, column_values)
+
+
+def _join_rows(groups):
+    """ Joins the values of each row to the constants of its group, with booleans as 0 or 1
+
+    @param lst((dict, lst(lst))) groups: The header and the values of each row of each group, see read_journal_groups
+    @return lst(dict): The rows, with their columns in the order they were written
+    """
+    rows = []
+    for header, values in groups:
+        for row_values in values:
+            row = OrderedDict(zip(header['columns'], [_to_saved(value) for value in row_values]))
+            row.update(header['constants'])
+            rows.append(row)
+    return rows
+
+
+def _to_saved(value):
+    """ Converts a value read from a journal to how Experiment saves it. Booleans are saved as 0 or 1.
+
+    @param value: The value
+    @return: The value to save
+    """
+    return int(value) if type(value) is bool else value
+
+
+def recover(journal_loc, keep_journal=False, output_format='csv'):
+    """ Saves the rows in a journal to "{section}.csv" (or .parquet or .feather) next to it, like Experiment.save_data
+    would have. Like it, csv files have booleans as 0 or 1, and the other formats have a type for each column.
+
+    @param str journal_loc: The path of the journal, "{section}.journal"
+    @param bool keep_journal: Whether to keep the journal once the data is saved
+    @param str output_format: 'csv', 'parquet' or 'feather'
+    @return (str, int): The path of the saved file and the number of rows in it
+    """
+    # Imported here, as importing experiment changes the working directory
+    from experiment import save_frame
+
+    if output_format == 'csv':
+        df = DataFrame(read_journal(journal_loc))
+    else:
+        df = read_typed_journal(journal_loc)
+    file_loc = save_frame(df, journal_loc[:-len('.journal')], output_format)
+
+    if not keep_journal:
+        os.remove(journal_loc)
+    return file_loc, len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild unsaved sections from their journals")
+    parser.add_argument('paths', nargs='*', default=['data'], help="Directories to search for journals, or journal "
+                                                                   "files. Defaults to 'data'")
+    parser.add_argument('--keep', action='store_true', help="Keep the journals after recovering them")
+    parser.add_argument('--overwrite', action='store_true', help="Recover sections that already have a saved file")
+    parser.add_argument('--format', choices=['csv', 'parquet', 'feather'], default=None,
+                        help="The format to save the data in. Defaults to the output format in config.py")
+    args = parser.parse_args()
+
+    output_format = args.format
+    if output_format is None:
+        output_format = Configuration('0', '0').output_format
+
+    for journal_loc in find_journals([os.path.abspath(path) for path in args.paths]):
+        if os.path.exists(journal_loc[:-len('.journal')] + "." + output_format) and not args.overwrite:
+            print("Skipped {} as it already has a saved file".format(journal_loc))
+            continue
+        file_loc, row_total = recover(journal_loc, args.keep, output_format)
+        print("Recovered {0} rows to {1}".format(row_total, file_loc))
+
+
+if __name__ == '__main__':
+    main()
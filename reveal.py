@@ -0,0 +1,156 @@
+""" Stores each prime image as its last level plus a map of the level each pixel is revealed at, instead of one image
+per level. The levels of a prime image only differ in which of its pixels are shown, so every level can be composed
+from the two, without reading or decoding a file for each level.
+
+For a prime image folder images/prime/{set}/{name}, the map is written to {name}_reveal.png, next to {name}_8.png:
+
+    python reveal.py encode
+    python reveal.py encode --remove
+
+--remove deletes {name}_1.png to {name}_7.png once the map has been checked to compose them exactly. Only do that when
+prime_reveal is set in config.py, since the levels are then no longer on disk.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import re
+from glob import glob
+
+import numpy
+
+from prefetch import decode_image
+
+
+# The number of levels of each prime image
+LEVELS = 8
+
+# The value of the pixels that are not revealed yet
+HIDDEN_PIXEL = (252, 252, 252, 0)
+
+
+def get_level_path(folder, level):
+    """ Gets the path of a level of a prime image
+
+    @param str folder: The folder of the prime image, like images/prime/task/A/Aobj1
+    @param int level: The level
+    @return str: The path of the level, like images/prime/task/A/Aobj1/Aobj1_3.png
+    """
+    name = re.split('[/\\\\]', folder)[-1]
+    return "{0}/{1}_{2}.png".format(folder, name, level)
+
+
+def get_map_path(folder):
+    """ Gets the path of the reveal map of a prime image
+
+    @param str folder: The folder of the prime image, like images/prime/task/A/Aobj1
+    @return str: The path of the map, like images/prime/task/A/Aobj1/Aobj1_reveal.png
+    """
+    name = re.split('[/\\\\]', folder)[-1]
+    return "{0}/{1}_reveal.png".format(folder, name)
+
+
+def split_level_path(path):
+    """ Gets the folder and level of the path of a level of a prime image
+
+    @param str path: The path of the level, like images/prime/task/A/Aobj1/Aobj1_3.png
+    @return (str, int)|None: The folder and the level, or None if the path is not a level of a prime image
+    """
+    match = re.match(r'^(.*)[/\\]([^/\\]+)[/\\]\2_(\d+)\.png$', path)
+    if match is None:
+        return None
+    return "{0}/{1}".format(match.group(1), match.group(2)), int(match.group(3))
+
+
+def is_map_path(path):
+    """ Whether a path is the path of a reveal map
+
+    @param str path: The path
+    @return bool: Whether it is a reveal map
+    """
+    return path.endswith('_reveal.png')
+
+
+class RevealImage:
+    """ A prime image, as its last level and the level each pixel is revealed at """
+
+    def __init__(self, image, level_map):
+        """ Creates a prime image from its last level and its reveal map. The map is scaled to the image if they do
+        not have the same size, like when the image is a scaled copy from the asset cache
+
+        @param PIL.Image.Image image: The last level of the prime image
+        @param PIL.Image.Image level_map: The reveal map, where each pixel is the first level it is shown at
+        """
+        from PIL import Image
+
+        if level_map.size != image.size:
+            level_map = level_map.resize(image.size, Image.NEAREST)
+        self.pixels = numpy.asarray(image.convert('RGBA'))
+        self.levels = numpy.asarray(level_map.convert('L'))
+        self.hidden = numpy.array(HIDDEN_PIXEL, dtype=numpy.uint8)
+
+    def compose(self, level):
+        """ Composes a level of the prime image
+
+        @param int level: The level, from 1 to LEVELS
+        @return PIL.Image.Image: The level, in RGBA
+        """
+        from PIL import Image
+
+        shown = (self.levels <= level)[:, :, numpy.newaxis]
+        return Image.fromarray(numpy.where(shown, self.pixels, self.hidden), 'RGBA')
+
+
+def encode(folder):
+    """ Makes the reveal map of a prime image from its levels
+
+    @param str folder: The folder of the prime image
+    @return PIL.Image.Image: The reveal map
+    """
+    from PIL import Image
+
+    levels = [numpy.asarray(decode_image(get_level_path(folder, level)).convert('RGBA'))
+              for level in range(1, LEVELS + 1)]
+    last = levels[-1]
+
+    # The first level each pixel has its final value at. Pixels have to stay revealed once they are shown
+    level_map = numpy.full(last.shape[:2], LEVELS, dtype=numpy.uint8)
+    for level in range(LEVELS - 1, 0, -1):
+        shown = (levels[level - 1] == last).all(axis=2)
+        if (shown & (level_map > level + 1)).any():
+            raise ValueError("A pixel of ", folder, "is shown at level", level, "but not at a later level")
+        level_map[shown] = level
+
+    reveal_image = RevealImage(Image.fromarray(last, 'RGBA'), Image.fromarray(level_map, 'L'))
+    for level in range(1, LEVELS + 1):
+        if not numpy.array_equal(numpy.asarray(reveal_image.compose(level)), levels[level - 1]):
+            raise ValueError("Level", level, "of", folder, "has hidden pixels that are not", HIDDEN_PIXEL)
+    return Image.fromarray(level_map, 'L')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Make the reveal maps of the prime images")
+    parser.add_argument('command', choices=['encode'], help="encode makes the reveal map of every prime image")
+    parser.add_argument('--remove', action='store_true', help="Delete the levels that are composed from the map")
+    args = parser.parse_args()
+
+    size_before = 0
+    size_after = 0
+    for folder in sorted(glob('images/prime/*/*') + glob('images/prime/*/*/*')):
+        folder = folder.replace('\\', '/')
+        if not os.path.exists(get_level_path(folder, LEVELS)):
+            continue
+        level_paths = [get_level_path(folder, level) for level in range(1, LEVELS + 1)]
+        if not all(os.path.exists(path) for path in level_paths):
+            # Already encoded and removed
+            continue
+
+        encode(folder).save(get_map_path(folder), optimize=True)
+        size_before += sum(os.path.getsize(path) for path in level_paths)
+        size_after += os.path.getsize(level_paths[-1]) + os.path.getsize(get_map_path(folder))
+        if args.remove:
+            for path in level_paths[:-1]:
+                os.remove(path)
+        print("Encoded", folder)
+
+    print("{0:.0f} KB of levels are {1:.0f} KB as reveal maps".format(size_before / 1e3, size_after / 1e3))
@@ -1,8 +1,5 @@
-import random
-from psychopy import core
-import glob
 import re
-import pandas
+from orderings import find_targets_and_lures
 
 
 class Trial:
@@ -19,8 +16,8 @@ class Trial:
             self.prime_image_path = block.get_current_prime_image_path()
             self.prime_image_id = re.split('[/\\\\]', self.prime_image_path)[-1]
             self.n_back_image_id = block.get_n_back_image_id()
-            self.lure, self.lure_kind = self.get_lure_info(block)
-            self.expected_response = (self.focal_image_id == self.n_back_image_id)
+            self.lure, self.lure_kind = block.get_lure_info()
+            self.expected_response = block.get_expected_response()
 
             # The user has to fill these in
             self.user_response = False
@@ -29,25 +26,6 @@ class Trial:
 
             self.__parent = block.to_save
 
-        def get_lure_info(self, block):
-            """ Return if there is a lure, and information about the lure if it exists. A lure happens when an i-back
-            focal image is the same as the current focal image, and i is not the n-back difficulty for the block
-
-            @param Block block: the block that this DataPoint's trial belongs to
-            @return: (bool, str | None)
-            """
-            lure = False
-            lure_kind = None
-            for i in range(1, 4):
-                if i == block.to_save.n_back_type:
-                    continue
-                i_back = block.get_i_back_image_id(i)
-                if i_back is not None and i_back == self.focal_image_id:
-                    lure = True
-                    lure_kind = "{}-back".format(i)
-                    return lure, lure_kind
-            return lure, lure_kind
-
     def __init__(self, block):
         """ Creates an n-back trial for the given NBackBlock
         @param Block block: the block this trial is for
@@ -60,64 +38,56 @@ class Trial:
 
     def show_n_back(self):
         """ Show one screen of the n-back task for a certain amount of time and record the results"""
-        self.window.n_back_show(self.to_save.focal_image_id, self.to_save.prime_image_path)
-        timer = core.CountdownTimer(self.config.n_back_display_time)
         # Catch user input
-        if self.window.wait_for_prompt(timer, 'a'):
+        key, reaction_time = self.window.n_back_show(self.to_save.focal_image_id, self.to_save.prime_image_path, 'a')
+        if key is not None:
             # User pressed the key 'a'
-            self.to_save.reaction_time = self.config.n_back_display_time - timer.getTime()
+            self.to_save.reaction_time = reaction_time
             self.to_save.user_response = True
-            core.wait(timer.getTime())
 
         self.to_save.user_correct = (self.to_save.user_response == self.to_save.expected_response)
 
     def run(self):
         """ Run this n-back trial, along with pre and post trial tasks."""
-        self.show_n_back()
-        self.window.clear(self.config.n_back_interstimulus_interval)   # Wait for the ISI
+        with self.experiment.span('n_back_trial', position_in_block=self.to_save.position_in_block):
+            self.show_n_back()
+            self.window.clear(self.config.n_back_interstimulus_interval)   # Wait for the ISI
 
 
 class Block:
     """ Used to run and save the results of a block of n-back trials"""
     class Configuration:
         """ A class used to store the configuration info of a NBackBlock"""
-        def __init__(self, n_back_type, order_set, save, prime_folder, loop_prime):
+        def __init__(self, n_back_type, order_set, save, prime_folder, prime_image_order):
             """ Creates a configuration for a Block
 
             @param int n_back_type: The type of n-back in this block
             @param order_set: what order set to pull the ordering info from
             @param bool save: whether we should save data collected in this block or not
-            @param bool loop_prime: if there are less primes than the size of the block, should we
-            loop the images we do have or crash
+            @param str prime_folder: the folder the prime images are from
+            @param lst(str) prime_image_order: the paths of the prime images, one for each trial, from the session plan
             """
             self.n_back_type = n_back_type
             self.order_set = order_set
             self.prime_folder = prime_folder
-            self.loop_primes = loop_prime
+            self.prime_image_order = prime_image_order
             self.save = save
 
-        def get_focal_image_id_order(self):
-            df = pandas.read_csv("ordering/" + self.order_set)
-            return df['img_numb']
+        def get_focal_image_id_order(self, orderings):
+            """ Return the ids of the focal images in this block's order set, in the order they are shown
+
+            @param OrderingIndex orderings: The ordering files of the experiment
+            @return: numpy.ndarray
+            """
+            return orderings.get(self.order_set)
 
-        def get_prime_image_path_order(self, do_not_start_with=None):
-            """ Return a list of paths to prime images, from the folder self.prime_folder. Optional argument
-            do_not_start_with indicates a path in the directory that should not be the first one in the ordering
+        def get_prime_image_path_order(self):
+            """ Return a list of paths to prime images, from the folder self.prime_folder, in the order the session
+            plan shuffled them
 
-            @param str|None do_not_start_with: don't start the prime image path order with the given path
             @return: lst(str)
             """
-            paths = glob.glob(self.prime_folder + '/*/*_8.png')
-            if do_not_start_with is not None:
-                paths.remove(do_not_start_with)
-                first = random.choice(paths)
-                paths.remove(first)
-                paths.append(do_not_start_with)
-                random.shuffle(paths)
-                return [first] + paths
-
-            random.shuffle(paths)
-            return paths
+            return list(self.prime_image_order)
 
     class DataPoint:
         """ A class used to store data about a n-back block. Passed in to the experiment class to be saved"""
@@ -147,9 +117,13 @@ class Block:
         self.block_config = block_config
 
         # Internal variables, not to be saved
-        self.focal_image_order = block_config.get_focal_image_id_order()
+        self.focal_image_order = block_config.get_focal_image_id_order(self.experiment.orderings)
+        self.targets_and_lures = find_targets_and_lures(self.focal_image_order, block_config.n_back_type)
         self.prime_image_order = block_config.get_prime_image_path_order()
 
+        # Start decoding the images now, while the participant reads the instructions for this block
+        self.window.prefetch_n_back_images(self.prime_image_order)
+
         self.trial_number = None
         self.error_tally = None
 
@@ -171,19 +145,46 @@ class Block:
         where n is the n-back difficulty.
 
         @return: None|int"""
-        return self.get_i_back_image_id(self.to_save.n_back_type)
+        n_back_image_id = self.targets_and_lures['n_back_image_id'][self.trial_number]
+        if n_back_image_id == -1:
+            return None
+        return n_back_image_id
+
+    def get_expected_response(self):
+        """ Return if the current focal image is the same as the one n (or n_back_type) trials ago
+
+        @return: bool"""
+        return bool(self.targets_and_lures['expected_response'][self.trial_number])
+
+    def get_lure_info(self):
+        """ Return if the current trial is a lure, and the kind of lure if it is. A lure happens when an i-back
+        focal image is the same as the current focal image, and i is not the n-back difficulty for the block
+
+        @return: (bool, str | None)
+        """
+        lure_kind = self.targets_and_lures['lure_kind'][self.trial_number]
+        if lure_kind == 0:
+            return False, None
+        return True, "{}-back".format(lure_kind)
 
     def run(self):
         """ Runs before a single task in a block"""
+        # Load the images now so trials do not have to read them from disk
+        self.window.preload_n_back_images(self.prime_image_order)
+
         # Counter for wrong answers
         self.error_tally = 0
-        for self.trial_number in range(len(self.focal_image_order)):
-            trial = Trial(self)
-            trial.run()
-            if not trial.to_save.user_correct:
-                self.error_tally += 1
-            if self.block_config.save:
-                self.experiment.push_data(trial.to_save)
+        with self.experiment.span('n_back_block', block_number=self.to_save.block_number,
+                                  n_back_type=self.block_config.n_back_type):
+            for self.trial_number in range(len(self.focal_image_order)):
+                trial = Trial(self)
+                trial.run()
+                if not trial.to_save.user_correct:
+                    self.error_tally += 1
+                if self.block_config.save:
+                    self.experiment.push_data(trial.to_save)
+
+        self.window.clear_image_cache()
 
     def get_current_position(self):
         return self.trial_number
@@ -192,9 +193,6 @@ class Block:
         return self.focal_image_order[self.trial_number]
 
     def get_current_prime_image_path(self):
-        if self.block_config.loop_primes and self.trial_number >= len(self.prime_image_order):
-            last_path = self.prime_image_order[len(self.prime_image_order) - 1]
-            self.prime_image_order.extend(self.block_config.get_prime_image_path_order(do_not_start_with=last_path))
         return self.prime_image_order[self.trial_number]
 
 
@@ -206,57 +204,51 @@ class Task:
         self.config = experiment.config
 
     def run(self):
-        """ Run the n-back task"""
+        """ Run the n-back task. A checkpoint is saved before each block, and a resumed session picks up at the block
+        it was stopped in, skipping the instructions and the practice"""
         # Start the n-back section of the experiment
-        self.experiment.new_section('n-back')
-
-        # Show the user some instructions
-        self.window.show_image_sequence('instructions', 'start')
-
-        self.window.show_image_sequence('instructions', 'start_{}'.format(self.config.difficulty_category))
-
-        if self.config.practice_run:
-            # Show practice instructions
-            self.window.show_image_sequence('instructions', 'practice')
-
-            for diff in range(1, self.config.n_back_practice_max_difficulty + 1):
-                prac_config = Block.Configuration(n_back_type=diff, order_set="{}_practice.csv".format(diff),
-                                                  prime_folder="images/prime/practice", save=False, loop_prime=True)
-                # Get the file with the data for the image ordering
-                block = Block(task=self, block_number=-1, block_config=prac_config)
-
-                # Draw the instruction screen for this type of block
-                self.window.show_image_sequence('prompts', '{0}_{1}-back'.format(self.config.difficulty_category, diff))
-
-                # Go through this block without saving the data
-                block.run()
-
-        # Show instructions before actual test
-        self.window.show_image_sequence("instructions", "test")
-
-        # Load the blocks, in the order we'll run them.
-        blocks = [[], [], []]
-        for difficulty in range(self.config.n_back_max_difficulty):
-            for j in range(self.config.n_back_block_total):
-                blocks[difficulty].append("{}_{}.csv".format(difficulty + 1, j + 1))
-
-            # Reverse the blocks half of the time
-            if self.config.n_back_blocks_reversed:
-                blocks[difficulty].reverse()
-
-        # Se the starting n_back difficulty
-        num_back = self.config.n_back_start_difficulty
+        progress = self.experiment.new_section('n-back')
+
+        # Decode the instruction screens on a worker thread, in the order they can be shown, so each is ready by the
+        # time the participant gets to it
+        if progress is None:
+            self.window.prefetch_image_sequence('instructions', 'start')
+            self.window.prefetch_image_sequence('instructions', 'start_{}'.format(self.config.difficulty_category))
+            if self.config.practice_run:
+                self.window.prefetch_image_sequence('instructions', 'practice')
+        for diff in range(1, max(self.config.n_back_max_difficulty, self.config.n_back_practice_max_difficulty) + 1):
+            self.window.prefetch_image_sequence('prompts', '{0}_{1}-back'.format(self.config.difficulty_category, diff))
+        if progress is None:
+            self.window.prefetch_image_sequence('instructions', 'test')
+        self.window.prefetch_image_sequence('instructions', 'end')
+
+        if progress is None:
+            self.run_introduction()
+
+            # Se the starting n_back difficulty
+            first_block = 0
+            num_back = self.config.n_back_start_difficulty
+        else:
+            first_block = progress['next_block']
+            num_back = progress['num_back']
+
+        # The blocks were planned in the order we'll run them, for every n-back level. They are reversed half of the
+        # time
+        plan = self.experiment.plan
 
         # Start tests
-        for test_number in range(self.config.n_back_block_total):
+        for test_number in range(first_block, self.config.n_back_block_total):
+            self.experiment.save_checkpoint(next_block=test_number, num_back=num_back)
 
-            order_set = blocks[num_back - 1][test_number]
+            order_set = plan.get_test_order_set(test_number, num_back)
 
             config = Block.Configuration(n_back_type=num_back, order_set=order_set,
                                          prime_folder="images/prime/task/{}".format(self.config.n_back_prime_list_name),
-                                         save=True, loop_prime=False)
+                                         save=True,
+                                         prime_image_order=plan.n_back_test[test_number]['prime_image_order'])
 
-            block = Block(task=self, block_number=test_number, block_config=config)
+            with self.experiment.span('n_back_block_setup', block_number=test_number):
+                block = Block(task=self, block_number=test_number, block_config=config)
 
             # Draw the instruction screen for this type of block
             self.window.show_image_sequence('prompts', '{}_{}-back'.format(self.config.difficulty_category, num_back))
@@ -275,6 +267,35 @@ class Task:
 
         # Store the data we gathered in experiment_info['data']
         self.experiment.save_data()
+        self.experiment.end_section()
 
         # Put up the end of experiment screen
         self.window.show_image_sequence('instructions', 'end')
+
+    def run_introduction(self):
+        """ Show the instructions and run the practice blocks, up to the instructions before the actual test"""
+        # Show the user some instructions
+        self.window.show_image_sequence('instructions', 'start')
+
+        self.window.show_image_sequence('instructions', 'start_{}'.format(self.config.difficulty_category))
+
+        if self.config.practice_run:
+            # Show practice instructions
+            self.window.show_image_sequence('instructions', 'practice')
+
+            for practice in self.experiment.plan.n_back_practice:
+                diff = practice['n_back_type']
+                prac_config = Block.Configuration(n_back_type=diff, order_set=practice['order_set'],
+                                                  prime_folder="images/prime/practice", save=False,
+                                                  prime_image_order=practice['prime_image_order'])
+                # Get the file with the data for the image ordering
+                block = Block(task=self, block_number=-1, block_config=prac_config)
+
+                # Draw the instruction screen for this type of block
+                self.window.show_image_sequence('prompts', '{0}_{1}-back'.format(self.config.difficulty_category, diff))
+
+                # Go through this block without saving the data
+                block.run()
+
+        # Show instructions before actual test
+        self.window.show_image_sequence("instructions", "test")
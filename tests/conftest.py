@@ -0,0 +1,5 @@
+""" Lets the tests import the modules of the experiment, which are at the top of the repository """
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
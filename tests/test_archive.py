@@ -0,0 +1,60 @@
+""" Tests for archive.py """
+import os
+import warnings
+
+import pytest
+
+from archive import ImageFolder, StimulusArchive, open_images, pack
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def images(tmpdir, monkeypatch):
+    """ A folder of images, packed into an archive, as the working directory """
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join("images", "prime").ensure(dir=True)
+    for name, color in [('red', (255, 0, 0)), ('blue', (0, 0, 255))]:
+        Image.new('RGB', (4, 3), color).save(os.path.join("images", "prime", name + ".png"))
+    pack("images.pack")
+    return tmpdir
+
+
+def _open(archive_loc):
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        images = open_images(archive_loc)
+    return images, [str(warning.message) for warning in caught]
+
+
+def test_opens_an_archive_that_is_up_to_date(images):
+    opened, caught = _open("images.pack")
+    assert isinstance(opened, StimulusArchive)
+    assert caught == []
+    assert opened.load("images/prime/red.png").getpixel((0, 0)) == (255, 0, 0)
+
+
+def test_uses_the_files_when_an_image_changed(images):
+    path = os.path.join("images", "prime", "red.png")
+    Image.new('RGB', (4, 3), (0, 255, 0)).save(path)
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+    opened, caught = _open("images.pack")
+    assert isinstance(opened, ImageFolder)
+    assert len(caught) == 1 and "images/prime/red.png" in caught[0]
+    assert opened.load(path).getpixel((0, 0)) == (0, 255, 0)
+
+
+def test_uses_the_files_when_an_image_was_added(images):
+    Image.new('RGB', (4, 3)).save(os.path.join("images", "prime", "green.png"))
+
+    opened, caught = _open("images.pack")
+    assert isinstance(opened, ImageFolder)
+    assert len(caught) == 1 and "images/prime/green.png" in caught[0]
+
+
+def test_uses_the_files_without_an_archive(images):
+    opened, caught = _open(None)
+    assert isinstance(opened, ImageFolder)
+    assert caught == []
@@ -0,0 +1,115 @@
+""" Tests for orderings.py, against the ordering files in /ordering """
+import os
+import random
+import warnings
+
+from config import Configuration
+from orderings import OrderingIndex, find_targets_and_lures, read_ordering
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ORDERING_DIR = os.path.join(REPO_DIR, "ordering")
+IMAGE_DIR = os.path.join(REPO_DIR, "images", "n-back", "task")
+
+# Where the targets and lures written in the files are not the ones the experiment finds, as (file, trial, column)
+KNOWN_DESIGN_ERRORS = {('1_2.csv', 13, 'lure'), ('2_practice.csv', 6, 'response'), ('3_2.csv', 9, 'lure')}
+
+
+def _read_orderings():
+    """ Reads every ordering file
+
+    @return lst((str, int, numpy.ndarray, dict(str, lst(str)))): The name, n-back type, focal image ids and design
+    columns of each file
+    """
+    focal_image_ids = set(int(os.path.splitext(name)[0]) for name in os.listdir(IMAGE_DIR) if name.endswith('.gif'))
+    orderings = []
+    for file_name in sorted(os.listdir(ORDERING_DIR)):
+        if file_name.endswith('.csv'):
+            sequence, design = read_ordering(os.path.join(ORDERING_DIR, file_name), focal_image_ids)
+            orderings.append((file_name, int(file_name.split('_')[0]), sequence, design))
+    return orderings
+
+
+def _find_by_trial(sequence, n_back_type):
+    """ Finds the targets and lures one trial at a time, like the blocks did before find_targets_and_lures """
+    found = {'n_back_image_id': [], 'expected_response': [], 'lure': [], 'lure_kind': []}
+    for position, focal_image_id in enumerate(sequence):
+        n_back_image_id = sequence[position - n_back_type] if position >= n_back_type else None
+        lure_kind = None
+        for i in range(1, 4):
+            if i != n_back_type and position >= i and sequence[position - i] == focal_image_id:
+                lure_kind = i
+                break
+        found['n_back_image_id'].append(-1 if n_back_image_id is None else n_back_image_id)
+        found['expected_response'].append(focal_image_id == n_back_image_id)
+        found['lure'].append(lure_kind is not None)
+        found['lure_kind'].append(0 if lure_kind is None else lure_kind)
+    return found
+
+
+def test_matches_the_ordering_files():
+    differences = set()
+    for file_name, n_back_type, sequence, design in _read_orderings():
+        found = find_targets_and_lures(sequence, n_back_type)
+        assert len(found['expected_response']) == len(sequence)
+        for position in range(len(sequence)):
+            if 'response' in design and (design['response'][position] == '1') != found['expected_response'][position]:
+                differences.add((file_name, position + 1, 'response'))
+            if 'lure' in design:
+                written_kind = 0
+                if design['lure'][position] == '1':
+                    written_kind = int(design['lure_kind'][position].replace('back', ''))
+                if written_kind != found['lure_kind'][position] or \
+                        (written_kind != 0) != found['lure'][position]:
+                    differences.add((file_name, position + 1, 'lure'))
+
+    assert differences == KNOWN_DESIGN_ERRORS
+
+
+def test_known_design_errors():
+    orderings = dict((file_name, (n_back_type, sequence)) for file_name, n_back_type, sequence, _ in _read_orderings())
+
+    n_back_type, sequence = orderings['1_2.csv']
+    assert find_targets_and_lures(sequence, n_back_type)['lure_kind'][12] == 3
+    n_back_type, sequence = orderings['2_practice.csv']
+    assert not find_targets_and_lures(sequence, n_back_type)['expected_response'][5]
+    n_back_type, sequence = orderings['3_2.csv']
+    assert find_targets_and_lures(sequence, n_back_type)['lure_kind'][8] == 2
+
+    config = Configuration('0', '0')
+    config.n_back_strict_orderings = False
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        index = OrderingIndex.load(config, ORDERING_DIR, IMAGE_DIR)
+    assert index.find_design_errors() == [
+        "1_2.csv trial 13: the file says it is not a lure, but it is a 3-back lure",
+        "2_practice.csv trial 6: the file says it is a target, but it is not",
+        "3_2.csv trial 9: the file says it is not a lure, but it is a 2-back lure"]
+    assert [str(warning.message) for warning in caught] == index.find_design_errors()
+
+
+def test_matches_finding_them_trial_by_trial():
+    rng = random.Random(3)
+    sequences = [sequence for _, _, sequence, _ in _read_orderings()]
+    sequences += [[rng.randint(1, 3) for _ in range(rng.randint(0, 30))] for _ in range(200)]
+    for sequence in sequences:
+        for n_back_type in range(1, 4):
+            found = find_targets_and_lures(sequence, n_back_type)
+            expected = _find_by_trial(list(sequence), n_back_type)
+            for key in expected:
+                assert [value.item() for value in found[key]] == expected[key], (key, sequence, n_back_type)
+
+
+def test_closest_lure_wins():
+    # Every earlier image is the same, so every position has a lure of each kind it can have
+    found = find_targets_and_lures([4, 4, 4, 4, 4], 2)
+    assert list(found['n_back_image_id']) == [-1, -1, 4, 4, 4]
+    assert list(found['expected_response']) == [False, False, True, True, True]
+    assert list(found['lure']) == [False, True, True, True, True]
+    assert list(found['lure_kind']) == [0, 1, 1, 1, 1]
+
+    # The 2-back and 3-back images are the same as the last one, but the 1-back one is not
+    found = find_targets_and_lures([7, 7, 5, 7], 1)
+    assert list(found['lure_kind']) == [0, 0, 0, 2]
+    found = find_targets_and_lures([7, 7, 5, 7], 3)
+    assert list(found['lure_kind']) == [0, 1, 0, 2]
+    assert list(found['expected_response']) == [False, False, False, True]
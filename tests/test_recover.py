@@ -0,0 +1,103 @@
+""" Tests for recovering the data of a session that crashed, see recover.py """
+import os
+import shutil
+
+import numpy
+import pytest
+
+from experiment import Experiment
+import headless
+import recover
+
+# The ordering files have design errors that are warned about, see test_orderings.py
+pytestmark = pytest.mark.filterwarnings('ignore:.*the file says')
+
+
+class Block:
+    """ The parent of some data points, like task.Block.DataPoint """
+
+    def __init__(self, block_number, reversed_order):
+        self.block_number = block_number
+        self.reversed_order = reversed_order
+        self.n_back_type = numpy.int64(2)
+        self.order_set = "2_{}.csv".format(block_number + 1)
+
+
+class DataPoint:
+    """ A data point with a parent, like task.Trial.DataPoint """
+
+    def __init__(self, parent, position, response, reaction_time, note, errors):
+        self.__parent = parent
+        self.position = position
+        self.response = response
+        self.reaction_time = reaction_time
+        self.note = note
+        self.errors = errors
+
+
+@pytest.fixture
+def session(tmpdir):
+    """ A headless session that saves its data in a temporary directory. The repository does not have the prime
+    images the tasks need, so they are turned off, but the ordering files are still read and the session is planned.
+    """
+    settings = {'output_location': str(tmpdir.join("data")), 'n_back_task': False, 'prime_task': False}
+    return Experiment(headless.Backend('P1', '8'), settings=settings)
+
+
+def _push_section(session):
+    session.new_section('n-back')
+    for block_number in range(3):
+        block = Block(block_number, block_number % 2 == 0)
+        for position in range(4):
+            # The first block has a missing response before its first boolean one
+            response = None if block_number == 0 and position == 0 else numpy.bool_(position % 2 == 0)
+            session.push_data(DataPoint(block, numpy.int64(position), response,
+                                        None if position == 3 else 0.25 * position + 0.001, "trial, \"quoted\"",
+                                        None if position == 2 else position * 10))
+
+
+def test_recovered_data_matches_saved_data(session, tmpdir):
+    _push_section(session)
+    journal_loc = session.get_data_dir() + "n-back.journal"
+    assert os.path.exists(journal_loc)
+
+    # The session crashes before save_data, leaving its journal, with the last row partly written
+    crashed_dir = tmpdir.join("crashed")
+    crashed_dir.ensure(dir=True)
+    crashed_journal_loc = str(crashed_dir.join("n-back.journal"))
+    shutil.copy(journal_loc, crashed_journal_loc)
+    with open(crashed_journal_loc, 'a') as journal:
+        journal.write("[4,")
+
+    file_loc, row_total = recover.recover(crashed_journal_loc)
+    assert file_loc == str(crashed_dir.join("n-back.csv"))
+    assert row_total == 12
+    assert not os.path.exists(crashed_journal_loc)
+
+    session.save_data()
+    assert not os.path.exists(journal_loc)
+    with open(session.get_data_dir() + "n-back.csv") as saved, open(file_loc) as recovered:
+        assert recovered.read() == saved.read()
+
+
+def test_recover_in_output_format(session, tmpdir):
+    pandas = pytest.importorskip('pandas')
+    pytest.importorskip('pyarrow')
+    _push_section(session)
+
+    crashed_journal_loc = str(tmpdir.join("n-back.journal"))
+    shutil.copy(session.get_data_dir() + "n-back.journal", crashed_journal_loc)
+    pandas.testing.assert_frame_equal(recover.read_typed_journal(crashed_journal_loc), session.get_typed_data())
+
+    file_loc, row_total = recover.recover(crashed_journal_loc, output_format='parquet')
+    assert file_loc == str(tmpdir.join("n-back.parquet"))
+    assert row_total == 12
+
+    session.config.output_format = 'parquet'
+    session.save_data()
+    saved = pandas.read_parquet(session.get_data_dir() + "n-back.parquet")
+    assert saved['response'].dtype == 'boolean'
+    assert saved['errors'].dtype == 'Int64'
+    assert saved['reversed_order'].dtype == 'boolean'
+    assert saved['order_set'].dtype == 'category'
+    pandas.testing.assert_frame_equal(pandas.read_parquet(file_loc), saved)
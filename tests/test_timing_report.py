@@ -0,0 +1,50 @@
+""" Tests for timing_report.py """
+import pandas
+
+from timing_report import report, summarize
+
+
+def _write_session(data_dir, timing):
+    session_dir = data_dir.join("8").join("P1")
+    session_dir.ensure(dir=True)
+    timing.to_csv(str(session_dir.join("session_timing.csv")), index=False)
+
+
+def test_summarize_counts_deviating_screens():
+    timing = pandas.DataFrame({'section': ['n-back', 'n-back', 'n-back'],
+                               'event': ['screen', 'screen', 'n_back_trial'],
+                               'duration': [0.5, 0.55, 1.2],
+                               'configured_duration': [0.5, 0.5, None],
+                               'intended_duration': [0.5, 0.5, None],
+                               'frames': [30, 30, None],
+                               'dropped_frames': [0, 3, None],
+                               'stopped_early': [False, False, None]})
+    summary = summarize(timing)
+    assert summary['screens'] == 2
+    assert summary['deviating'] == 1
+    assert abs(summary['worst_deviation'] - 0.05) < 1e-9
+    assert summary['dropped_frames'] == 3
+    assert summary['mean_n_back_trial'] == 1.2
+    assert summary['flagged']
+
+
+def test_summarize_without_scheduled_screens():
+    # Like a headless session, or one stopped during the instructions
+    timing = pandas.DataFrame({'section': ['setup', 'n-back', 'n-back'],
+                               'event': ['startup', 'push_data', 'save_data'],
+                               'duration': [0.01, 0.002, 0.03]})
+    summary = summarize(timing)
+    assert summary['screens'] == 0
+    assert summary['deviating'] == 0
+    assert summary['worst_deviation'] is None
+    assert summary['dropped_frames'] == 0
+    assert summary['mean_push_data'] == 0.002
+    assert not summary['flagged']
+
+
+def test_report_without_scheduled_screens(tmpdir):
+    _write_session(tmpdir, pandas.DataFrame({'section': ['setup'], 'event': ['startup'], 'duration': [0.01]}))
+    sessions = report(str(tmpdir))
+    assert list(sessions['participant']) == ['P1']
+    assert list(sessions['screens']) == [0]
+    assert not sessions['flagged'].any()
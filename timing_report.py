@@ -0,0 +1,119 @@
+""" Summarizes the timing of every session saved in the data directory, from the "session_timing.csv" that
+Experiment.save_data writes next to its data, and flags the sessions where screens were not shown for as long as
+config.py asked for.
+
+A screen deviates when it was up for more than --tolerance frames longer or shorter than its configured duration, like
+n_back_display_time, n_back_interstimulus_interval or prime_image_display_time. Screens that were ended early by a key
+press, like post-task images, are not counted. A session is flagged when more than --max-deviating of its screens
+deviate.
+
+Example:
+
+    python timing_report.py data --output timing_report.csv
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+
+import pandas
+
+
+def find_session_timing(data_dir):
+    """ Finds the session timing files in a data directory laid out like Experiment.save_data does,
+    "{age group}/{participant}/session_timing.csv"
+
+    @param str data_dir: The data directory
+    @return lst((str, str, str)): The age group, participant and path of each file
+    """
+    timing_files = []
+    for age_group in sorted(os.listdir(data_dir)):
+        age_dir = os.path.join(data_dir, age_group)
+        if not os.path.isdir(age_dir):
+            continue
+        for participant in sorted(os.listdir(age_dir)):
+            path = os.path.join(data_dir, age_group, participant, "session_timing.csv")
+            if os.path.isfile(path):
+                timing_files.append((age_group, participant, path))
+    return timing_files
+
+
+def summarize(timing, tolerance=1.0, max_deviating=0):
+    """ Summarizes the timing log of a session
+
+    @param DataFrame timing: The timing log, as saved in session_timing.csv
+    @param float tolerance: How many frames a screen can be up for longer or shorter than configured
+    @param int max_deviating: How many screens of the session can deviate before it is flagged
+    @return dict: The number of screens and how many of them deviated, the largest deviation in seconds, the number of
+    dropped frames, the mean time of each span and whether the session is flagged
+    """
+    summary = {'screens': 0, 'deviating': 0, 'worst_deviation': None, 'dropped_frames': 0}
+    # Sessions that were run headless, or stopped during the instructions, have no scheduled screens
+    if 'configured_duration' in timing.columns:
+        stopped_early = timing['stopped_early'].astype(str) == 'True'
+        screens = timing[timing['configured_duration'].notnull() & ~stopped_early]
+        if len(screens) != 0:
+            deviation = screens['duration'] - screens['configured_duration']
+            frame_period = screens['intended_duration'] / screens['frames']
+            summary = {'screens': len(screens),
+                       'deviating': int((deviation.abs() > tolerance * frame_period).sum()),
+                       'worst_deviation': deviation.abs().max(),
+                       'dropped_frames': int(screens['dropped_frames'].sum())}
+
+    for event in ['n_back_trial', 'n_back_load', 'post_task_trial', 'post_task_load', 'push_data', 'journal_sync',
+                  'save_data', 'checkpoint']:
+        durations = timing.loc[timing['event'] == event, 'duration']
+        summary['mean_' + event] = durations.mean() if len(durations) != 0 else None
+    summary['flagged'] = summary['deviating'] > max_deviating
+    return summary
+
+
+def report(data_dir, tolerance=1.0, max_deviating=0):
+    """ Summarizes the timing of every session in a data directory, see summarize
+
+    @param str data_dir: The data directory
+    @param float tolerance: How many frames a screen can be up for longer or shorter than configured
+    @param int max_deviating: How many screens of a session can deviate before it is flagged
+    @return DataFrame: One row for each session
+    """
+    rows = []
+    for age_group, participant, path in find_session_timing(data_dir):
+        row = {'age_group': age_group, 'participant': participant}
+        row.update(summarize(pandas.read_csv(path), tolerance, max_deviating))
+        rows.append(row)
+
+    sessions = pandas.DataFrame(rows)
+    if len(rows) != 0:
+        keys = ['age_group', 'participant', 'flagged', 'screens', 'deviating', 'worst_deviation', 'dropped_frames']
+        sessions = sessions[keys + [column for column in sessions.columns if column not in keys]]
+    return sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag the sessions whose screens were not shown for as long as "
+                                                 "configured")
+    parser.add_argument('data_dir', nargs='?', default='data', help="The data directory. Defaults to 'data'")
+    parser.add_argument('--tolerance', type=float, default=1.0, help="How many frames a screen can be up for "
+                                                                     "longer or shorter than configured")
+    parser.add_argument('--max-deviating', type=int, default=0, help="How many screens of a session can deviate "
+                                                                     "before it is flagged")
+    parser.add_argument('--output', default=None, help="Where to save the report as a csv file")
+    args = parser.parse_args()
+
+    sessions = report(args.data_dir, args.tolerance, args.max_deviating)
+    if len(sessions) == 0:
+        print("No session timing files in", args.data_dir)
+        return
+
+    if args.output is not None:
+        sessions.to_csv(args.output, index=False)
+    print(sessions[['age_group', 'participant', 'flagged', 'screens', 'deviating', 'worst_deviation',
+                    'dropped_frames']].to_string(index=False))
+    flagged = int(sessions['flagged'].sum())
+    print("{0} of {1} sessions flagged".format(flagged, len(sessions)))
+    sys.exit(1 if flagged != 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
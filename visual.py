@@ -1,30 +1,26 @@
 """ A package that focuses on the user interaction"""
 
-from psychopy import visual, event, gui, core
+from psychopy import visual, event, core
 import psychopy.tools.monitorunittools
 
+try:
+    from psychopy.hardware import keyboard
+except ImportError:
+    # Older versions of psychopy do not have a hardware keyboard
+    keyboard = None
+
 import sys
-from glob import glob
+from collections import OrderedDict
 import os
 
-def ask_user_info(title):
-    """ A method used to ask the user for their participant id and their age group.
-        Will quit if the user presses 'cancel'
-
-        @param str title: The title of the pop-up box
-        @return (str, str): A tuple with of (participant id, age group)
-    """
-    info = {'Participant': '', 'Age group': ''}
-
-    # Store info about the experiment session
-    dialogue = gui.DlgFromDict(dictionary=info, title=title)
+import reveal
+from assets import AssetCache
+from dialog import ask_user_info
+from prefetch import Prefetcher
 
-    # User pressed cancel, so quit!
-    if dialogue.OK is False:
-        sys.exit()
 
-    # Return the results
-    return info['Participant'], info['Age group']
+# The characters typed by keys with a name, see get_input_text
+_TYPED_KEYS = {'space': ' ', 'return': '\n', 'comma': ',', 'period': '.'}
 
 
 def pt_to_cm(pt):
@@ -46,6 +42,55 @@ class Window:
         # Create the window
         self._window = visual.Window(fullscr=True, monitor="testMonitor", units='norm', color=1)
 
+        # The time between two screen refreshes. Stimuli are shown for a whole number of these
+        frame_rate = self._window.getActualFrameRate()
+        self.frame_period = 1.0 / frame_rate if frame_rate else self._window.monitorFramePeriod
+
+        # Use a keyboard that time stamps key presses when they happen, instead of when we check for them
+        self._keyboard = None
+        if self.config.input_hardware_timestamps and keyboard is not None and getattr(keyboard, 'havePTB', False):
+            self._keyboard = keyboard.Keyboard()
+
+        # The screen that is currently up and should be replaced on a certain frame, see __flip
+        self._scheduled = None
+
+        # Sized n-back stimuli that were loaded ahead of time, see preload_n_back_images
+        self._focal_images = {}
+        self._prime_images = {}
+
+        # The folder and reveal image of the prime image whose levels are being shown, see __load_prime_pixels
+        self._reveal_image = None
+
+        # Copies of the images, scaled to the pixels they cover on this screen. Make the ones for the stimuli now, so
+        # only the first session on a new screen or with new sizes has to wait for them
+        images = self.experiment.images
+        self._assets = None
+        load_image = images.load
+        if self.config.asset_cache:
+            start = core.getTime()
+            self._asset_sizes = self.__get_asset_sizes()
+            self._assets = AssetCache(self.config.asset_cache_location, self._asset_sizes, self.__get_asset_size,
+                                      images)
+            stimulus_paths = (images.glob("images/n-back/task/*.gif") + images.glob("images/prime/practice/*/*.png") +
+                              images.glob("images/prime/task/*/*/*.png"))
+            # Reveal maps can not be resampled like images, they are scaled when they are used
+            stimulus_paths = [path for path in stimulus_paths if not reveal.is_map_path(path)]
+            self._assets.build(stimulus_paths)
+            self.experiment.log_timing('build_assets', core.getTime() - start, images=len(stimulus_paths),
+                                       built=self._assets.built)
+            load_image = self._assets.load
+
+        # Decodes the images that will be shown next on a worker thread, see prefetch_image_sequence
+        self._prefetcher = Prefetcher(load=load_image, threaded=self.config.prefetch_images)
+
+        # Full-screen images of image sequences that were shown, with the bytes they use, least recently shown first.
+        # See __get_screen_image
+        self._screen_images = OrderedDict()
+        self._screen_images_size = 0
+
+        # The textboxes of get_input_text, for each prompt and font sizes
+        self._input_stims = {}
+
     def norm_to_cm(self, point):
         x = psychopy.tools.monitorunittools.pix2cm(point[0] * self._window.size[0] / 2.0, self._window.monitor)
         y = psychopy.tools.monitorunittools.pix2cm(point[1] * self._window.size[1] / 2.0, self._window.monitor)
@@ -67,14 +112,48 @@ class Window:
     def scalar_px_to_cm(self, scalar):
         return self.px_to_cm((scalar, 0))[0]
 
+    def __get_asset_sizes(self):
+        """ Gets the sizes, in pixels, that images are shown at on this screen, which are what the asset cache
+        depends on. Should not use this outside of this file
+
+        @return dict: The size of the screen, the height of the focal images and the size of the prime images
+        """
+        monitor = self._window.monitor
+
+        # Prime images are sized before their image is set, see __load_prime_image, so they all have the same size
+        prime_size = visual.ImageStim(win=self._window, units='cm').size
+        prime_size = prime_size * self.config.n_back_focal_image_height / prime_size[1]
+
+        return {
+            'screen_size': [int(self._window.size[0]), int(self._window.size[1])],
+            'focal_image_height': float(psychopy.tools.monitorunittools.cm2pix(self.config.n_back_focal_image_height,
+                                                                               monitor)),
+            'prime_image_size': [int(round(psychopy.tools.monitorunittools.cm2pix(prime_size[0], monitor))),
+                                 int(round(psychopy.tools.monitorunittools.cm2pix(prime_size[1], monitor)))]}
+
+    def __get_asset_size(self, path, size):
+        """ Gets the size, in pixels, that an image is shown at on this screen. Should not use this outside of this
+        file
+
+        @param str path: The path of the image
+        @param (int, int) size: The size of the image file, in pixels
+        @return (int, int): The size it is shown at, in pixels
+        """
+        if self.experiment.manifest.has_image(path):
+            # Instruction screens cover the whole screen
+            return tuple(self._asset_sizes['screen_size'])
+        if path.replace('\\', '/').startswith("images/n-back/task/"):
+            height = self._asset_sizes['focal_image_height']
+            return int(round(size[0] * height / size[1])), int(round(height))
+        return tuple(self._asset_sizes['prime_image_size'])
+
     def default_wait_func(self, path):
         """ The default function used for waiting during an image sequence
 
         @param str path: The path of the image being displayed
         @rtype None
         """
-        name = os.path.basename(path)
-        if 'animate' in name:
+        if self.experiment.manifest.is_animated(path):
             core.wait(self.config.animation_time_between_frames, hogCPUperiod=0)
         else:
             self.wait_for_prompt()
@@ -91,37 +170,101 @@ class Window:
         @param wait_func: The function to call after displaying each image.
         @rtype: None
         """
-        if task is None:
-            task = self.experiment.section
         if wait_func is None:
             wait_func = self.default_wait_func
 
-        image_paths = glob("images/{0}/{1}/{2}/*{3}".format(task, genre, subgenre, extension))
-        image_paths.sort()
+        image_paths = self.__find_image_sequence(genre, subgenre, task, extension)
 
-        # Create an image to show full-screen images
-        image = visual.ImageStim(win=self._window, units='norm', size=(2, 2))
+        # Decode the rest of the images while the participant looks at the first ones
+        self.__prefetch_screen_images(image_paths)
 
         for image_path in image_paths:
-            image.image = image_path
-            image.draw()
-            self._window.flip()
+            self.__get_screen_image(image_path).draw()
+            self.__flip()
             wait_func(image_path)
 
-    def __get_n_back_image(self, n_back_image_id):
-        """ Gets a image object with the proper configuration for the current experiment. Should not use this outside
+    def __find_image_sequence(self, genre, subgenre='', task=None, extension='.png'):
+        """ Finds the images of an image sequence in the experiment's manifest, see show_image_sequence. Should not
+        use this outside of this file
+
+        @return lst(str): The paths of the images, in the order they are shown
+        """
+        if task is None:
+            task = self.experiment.section
+        return self.experiment.manifest.get_sequence(task, genre, subgenre, extension)
+
+    def __prefetch_screen_images(self, image_paths):
+        """ Starts decoding the given full-screen images, unless they are still in the screen image cache. Should
+        not use this outside of this file
+
+        @param lst(str) image_paths: The paths of the images
+        @rtype: None
+        """
+        self._prefetcher.request([path for path in image_paths if path not in self._screen_images])
+
+    def __get_screen_image(self, image_path):
+        """ Gets a full-screen image object for the given path. The images that were shown most recently are kept,
+        along with their textures, for as long as they fit in image_cache_size megabytes, so a sequence that is shown
+        again does not have to be decoded again. Should not use this outside of this file
+
+        @param str image_path: The path of the image
+        @return visual.ImageStim: The image object
+        """
+        if image_path in self._screen_images:
+            image, size = self._screen_images.pop(image_path)
+            self._screen_images[image_path] = (image, size)
+            return image
+
+        pixels = self._prefetcher.get(image_path)
+        image = visual.ImageStim(win=self._window, units='norm', size=(2, 2), image=pixels)
+        self._prefetcher.discard(image_path)
+
+        # The texture has 4 bytes per pixel
+        size = pixels.size[0] * pixels.size[1] * 4
+        self._screen_images[image_path] = (image, size)
+        self._screen_images_size += size
+
+        # Forget the least recently shown images until the rest fit, but always keep this one
+        while self._screen_images_size > self.config.image_cache_size * 1024 * 1024 and len(self._screen_images) > 1:
+            _, (_, forgotten_size) = self._screen_images.popitem(last=False)
+            self._screen_images_size -= forgotten_size
+        return image
+
+    def prefetch_image_sequence(self, genre, subgenre='', task=None, extension='.png'):
+        """ Starts decoding the images of an image sequence on a worker thread, so they are ready when
+        show_image_sequence is called with the same arguments. Sequences are decoded in the order they are asked for.
+
+        @rtype: None
+        """
+        self.__prefetch_screen_images(self.__find_image_sequence(genre, subgenre, task, extension))
+
+    def prefetch_n_back_images(self, prime_image_paths):
+        """ Starts decoding every n-back focal image and the given prime images on a worker thread, so that
+        preload_n_back_images only has to upload them.
+
+        @param lst(str) prime_image_paths: The paths of the prime images that will be shown
+        @rtype: None
+        """
+        focal_image_paths = []
+        for path in self.experiment.images.glob("images/n-back/task/*.gif"):
+            n_back_image_id = int(os.path.splitext(os.path.basename(path))[0])
+            focal_image_paths.append("images/n-back/task/{}.gif".format(n_back_image_id))
+        self._prefetcher.request(focal_image_paths + list(prime_image_paths))
+
+    def __load_n_back_image(self, n_back_image_id):
+        """ Loads a image object with the proper configuration for the current experiment. Should not use this outside
         of this file
 
         @param n_back_image_id: The id of the n back image
         @return visual.ImageStim: The n back image object for this experiment and the given path
         """
         path = "images/n-back/task/{}.gif".format(n_back_image_id)
-        image = visual.ImageStim(win=self._window, units='cm', image=path)
+        image = visual.ImageStim(win=self._window, units='cm', image=self._prefetcher.get(path))
         image.size *= self.config.n_back_focal_image_height / image.size[1]
         return image
 
-    def __get_prime_image(self, prime_image_path):
-        """ Gets a image object with the proper configuration for the current experiment. Should not use this outside
+    def __load_prime_image(self, prime_image_path):
+        """ Loads a image object with the proper configuration for the current experiment. Should not use this outside
         of this file
 
         @param prime_image_path: The path to the prime image
@@ -129,14 +272,228 @@ class Window:
         """
         prime_image = visual.ImageStim(win=self._window, units='cm')
         prime_image.size *= self.config.n_back_focal_image_height / prime_image.size[1]
-        prime_image.image = prime_image_path
+        prime_image.image = self.__load_prime_pixels(prime_image_path)
         return prime_image
 
-    def n_back_show(self, n_back_image_id, prime_image_path):
-        """ Draws the given n-back image and prime image """
-        n_back_image = self.__get_n_back_image(n_back_image_id)
+    def __load_prime_pixels(self, prime_image_path):
+        """ Gets the decoded pixels of a prime image. If prime_reveal is set, levels below the last one are composed
+        from the last level and the reveal map of the prime image, which are only loaded once for all its levels.
+        Should not use this outside of this file
+
+        @param prime_image_path: The path to the prime image
+        @return PIL.Image.Image: The pixels of the prime image
+        """
+        level_path = reveal.split_level_path(prime_image_path) if self.config.prime_reveal else None
+        if level_path is None or level_path[1] == reveal.LEVELS:
+            return self._prefetcher.get(prime_image_path)
+
+        folder, level = level_path
+        if self._reveal_image is None or self._reveal_image[0] != folder:
+            image = self._prefetcher.get(reveal.get_level_path(folder, reveal.LEVELS))
+            level_map = self.experiment.images.load(reveal.get_map_path(folder))
+            self._reveal_image = (folder, reveal.RevealImage(image, level_map))
+        return self._reveal_image[1].compose(level)
+
+    def __get_n_back_image(self, n_back_image_id):
+        """ Gets the n back image object for the given id, from the preloaded images if possible. Should not use this
+        outside of this file
+
+        @param n_back_image_id: The id of the n back image
+        @return visual.ImageStim: The n back image object for this experiment and the given path
+        """
+        if n_back_image_id in self._focal_images:
+            return self._focal_images[n_back_image_id]
+        return self.__load_n_back_image(n_back_image_id)
+
+    def __get_prime_image(self, prime_image_path):
+        """ Gets the prime image object for the given path, from the preloaded images if possible. Should not use this
+        outside of this file
 
-        prime_image = self.__get_prime_image(prime_image_path)
+        @param prime_image_path: The path to the prime image
+        @return visual.ImageStim: The prime image object for this experiment and the given path
+        """
+        if prime_image_path in self._prime_images:
+            return self._prime_images[prime_image_path]
+        return self.__load_prime_image(prime_image_path)
+
+    def preload_n_back_images(self, prime_image_paths):
+        """ Loads every n-back focal image and the given prime images, so that they do not have to be read from disk
+        while a trial is being shown. Images that were prefetched only have to be uploaded. How long this took, how
+        long of it was spent waiting for the prefetch worker, and how many images were not prefetched are added to
+        the experiment's timing log.
+
+        @param lst(str) prime_image_paths: The paths of the prime images that will be shown
+        @rtype: None
+        """
+        start = core.getTime()
+        start_wait_time = self._prefetcher.wait_time
+        start_misses = self._prefetcher.misses
+
+        for path in self.experiment.images.glob("images/n-back/task/*.gif"):
+            n_back_image_id = int(os.path.splitext(os.path.basename(path))[0])
+            if n_back_image_id not in self._focal_images:
+                self._focal_images[n_back_image_id] = self.__load_n_back_image(n_back_image_id)
+
+        for prime_image_path in prime_image_paths:
+            if prime_image_path not in self._prime_images:
+                self._prime_images[prime_image_path] = self.__load_prime_image(prime_image_path)
+
+        self.experiment.log_timing('preload_n_back_images', core.getTime() - start,
+                                   images=len(self._focal_images) + len(self._prime_images),
+                                   prefetch_wait=self._prefetcher.wait_time - start_wait_time,
+                                   prefetch_misses=self._prefetcher.misses - start_misses)
+
+    def clear_image_cache(self):
+        """ Forgets all the preloaded images, freeing their textures
+
+        @rtype: None
+        """
+        self._focal_images = {}
+        self._prime_images = {}
+        self._reveal_image = None
+
+    def clear_prefetched(self):
+        """ Forgets the images that were decoded by prefetch_image_sequence and prefetch_n_back_images
+
+        @rtype: None
+        """
+        self._prefetcher.clear()
+
+    def frames_for(self, duration):
+        """ Finds the whole number of frames that is closest to the given duration. At least one frame is used.
+
+        @param float duration: The duration in seconds
+        @return int: The number of frames
+        """
+        return max(1, int(round(duration / self.frame_period)))
+
+    def __flip(self, label=None, duration=None):
+        """ Flips the window. If label is given, the new screen is scheduled to stay up for the whole number of frames
+        closest to duration, starting from when the previous scheduled screen was meant to end. When the next flip
+        replaces it, its intended and actual flip times are added to the experiment's timing log. Should not use this
+        outside of this file
+
+        @param str|None label: The name of the new screen in the timing log, or None if it is not scheduled
+        @param float|None duration: How long the new screen should stay up for, in seconds
+        @return float: The time of the flip
+        """
+        flip_time = self._window.flip()
+        intended_onset = flip_time
+
+        # This flip ends the previous scheduled screen
+        if self._scheduled is not None:
+            previous = self._scheduled
+            intended_offset = previous['intended_onset'] + previous['frames'] * self.frame_period
+            self.experiment.log_timing(previous['label'], flip_time - previous['onset'],
+                                       intended_duration=previous['frames'] * self.frame_period,
+                                       frames=previous['frames'], dropped_frames=previous['dropped_frames'],
+                                       intended_onset=previous['intended_onset'], onset=previous['onset'],
+                                       intended_offset=intended_offset, offset=flip_time,
+                                       configured_duration=previous['configured_duration'],
+                                       stopped_early=previous['stopped_early'])
+
+            # Keep to the schedule, unless we are more than half a frame away from it
+            if abs(flip_time - intended_offset) < self.frame_period / 2:
+                intended_onset = intended_offset
+
+        self._scheduled = None
+        if label is not None:
+            self._scheduled = {'label': label, 'frames': self.frames_for(duration), 'dropped_frames': 0,
+                               'intended_onset': intended_onset, 'onset': flip_time, 'configured_duration': duration,
+                               'stopped_early': False}
+        return flip_time
+
+    def __hold(self, stimuli, keys=None, stop_on_key=False):
+        """ Keeps the scheduled screen up, redrawing stimuli on every frame, until the flip that ends it is due.
+        Should not use this outside of this file
+
+        @param lst stimuli: The stimuli on the scheduled screen
+        @param lst(str)|None keys: The keys to watch for while the screen is up
+        @param bool stop_on_key: Whether to stop holding the screen as soon as one of keys is pressed
+        @return (str|None, float|None): The first key in keys that was pressed and how long after the screen came up
+        it was pressed, or (None, None)
+        """
+        scheduled = self._scheduled
+        intended_offset = scheduled['intended_onset'] + scheduled['frames'] * self.frame_period
+
+        if keys is not None:
+            keys = [k.lower() for k in keys] + [k.upper() for k in keys]
+
+        # Clear the key's buffer:
+        self.__clear_keys()
+
+        key, reaction_time = None, None
+        flip_time = scheduled['onset']
+        while True:
+            if keys is not None and key is None:
+                keys_pressed = self.__get_keys(keys)
+                if len(keys_pressed) != 0:
+                    key, key_time = keys_pressed[0]
+                    reaction_time = key_time - scheduled['onset']
+                    if stop_on_key:
+                        scheduled['stopped_early'] = True
+                        break
+
+            if len(event.getKeys(keyList=["escape"])) != 0:
+                self.experiment.save_data()
+                sys.exit()
+
+            # Stop once the next flip would land on the flip that ends this screen
+            if flip_time + 1.5 * self.frame_period >= intended_offset:
+                break
+
+            for stimulus in stimuli:
+                stimulus.draw()
+            last_flip_time, flip_time = flip_time, self._window.flip()
+            if flip_time - last_flip_time > 1.5 * self.frame_period:
+                scheduled['dropped_frames'] += 1
+
+        # The last frame is still up, so keep checking for keys while it is, leaving the next screen half a frame to
+        # be drawn in before the flip that ends this one
+        last_check = intended_offset - 0.5 * self.frame_period
+        while keys is not None and key is None:
+            keys_pressed = self.__get_keys(keys)
+            if len(keys_pressed) != 0:
+                key, key_time = keys_pressed[0]
+                reaction_time = key_time - scheduled['onset']
+                break
+
+            now = core.getTime()
+            if now >= last_check:
+                break
+            core.wait(min(self.config.input_poll_interval, last_check - now), hogCPUperiod=0)
+
+        return key, reaction_time
+
+    def __present(self, stimuli, label, duration, keys=None, stop_on_key=False):
+        """ Shows the given stimuli on the next frame, for the whole number of frames closest to duration. Should not
+        use this outside of this file
+
+        @param lst stimuli: The stimuli to show
+        @param str label: The name of this screen in the timing log
+        @param float duration: How long to show the stimuli for, in seconds
+        @param str|lst(str)|None keys: The keys to watch for while the stimuli are shown
+        @param bool stop_on_key: Whether to stop showing the stimuli as soon as one of keys is pressed
+        @return (str|None, float|None): The first key in keys that was pressed and how long after the stimuli
+        appeared it was pressed, or (None, None)
+        """
+        if isinstance(keys, str):
+            keys = [keys]
+
+        for stimulus in stimuli:
+            stimulus.draw()
+        self.__flip(label, duration)
+        return self.__hold(stimuli, keys, stop_on_key)
+
+    def n_back_show(self, n_back_image_id, prime_image_path, keys=None):
+        """ Shows the given n-back image and prime image for n_back_display_time, and watches for the given keys
+        while they are up.
+
+        @return (str|None, float|None): The first key in keys that was pressed and the reaction time, or (None, None)
+        """
+        with self.experiment.span('n_back_load'):
+            n_back_image = self.__get_n_back_image(n_back_image_id)
+            prime_image = self.__get_prime_image(prime_image_path)
 
         if self.config.n_back_image_overlap:
             n_back_image.pos = (0, 0)
@@ -145,25 +502,27 @@ class Window:
             n_back_image.pos = (0, self.config.n_back_focal_image_height / 2)
             prime_image.pos = (0, -self.config.n_back_focal_image_height / 2)
 
-        n_back_image.draw()
-        prime_image.draw()
-        self._window.flip()
+        return self.__present([n_back_image, prime_image], 'n_back_display', self.config.n_back_display_time, keys)
 
-    def post_task_show(self, prime_image_path):
-        """ Draws the given prime image """
+    def post_task_show(self, prime_image_path, keys=None):
+        """ Shows the given prime image for prime_image_display_time, or until one of the given keys is pressed.
+
+        @return (str|None, float|None): The key in keys that was pressed and the reaction time, or (None, None)
+        """
         # Get the prime image
-        prime_image = self.__get_prime_image(prime_image_path)
+        with self.experiment.span('post_task_load'):
+            prime_image = self.__get_prime_image(prime_image_path)
 
         prime_image.pos = (0, 0)
-        prime_image.draw()
-        self._window.flip()
+        return self.__present([prime_image], 'post_task_display', self.config.prime_image_display_time, keys,
+                              stop_on_key=True)
 
     def show_text(self, text, size=None):
         """ Shows the text text on the main screen"""
         text_element = visual.TextStim(self._window, text=text, wrapWidth=None,
                                        color=-1, font='Times New Roman', height=size)
         text_element.draw()
-        self._window.flip()
+        self.__flip()
 
     def wait_for_choice(self, prompt, choices, prompt_font_size=24, instruction_font_size=20, choice_font_size=20):
         """ Displays the given choices in lst choices with the given str prompt,
@@ -228,7 +587,7 @@ class Window:
                                units='cm', height=instruction_font_size)
         text.draw()
 
-        self._window.flip()
+        self.__flip()
 
         mouse = event.Mouse(win=self._window)
         # Wait for the user to click on one of them
@@ -243,37 +602,86 @@ class Window:
 
             core.wait(0.01, hogCPUperiod=0)
 
+    def __clear_keys(self):
+        """ Clears the key's buffer. Should not use this outside of this file
+
+        @rtype: None
+        """
+        event.clearEvents()
+        if self._keyboard is not None:
+            self._keyboard.clearEvents()
+
+    def __get_keys(self, keys):
+        """ Gets the keys in keys that were pressed since they were last checked for, along with the time they were
+        pressed. The times are from the same clock as core.getTime and the window's flips. Should not use this outside
+        of this file
+
+        @param lst(str) keys: The keys to check for
+        @return lst((str, float)): The keys that were pressed and when, oldest first
+        """
+        if self._keyboard is not None:
+            return [(press.name, press.tDown) for press in self._keyboard.getKeys(keyList=keys, waitRelease=False)]
+        return event.getKeys(keyList=keys, timeStamped=True)
+
     def wait_for_prompt(self, timer=None, keys='space'):
         """ Waits indefinitely until a key in keys is pressed. Return the key that was pressed.
 
             If a timer is provided, will wait for prompt until the timer runs out. If the timer runs out,
             None will be returned.
 
+            Sleeps for input_poll_interval between checks for input, except for the last input_hog_period before
+            the timer runs out, where it checks without sleeping. How long it waited, the CPU time it used and how
+            long after the key press it noticed it are added to the timing log.
+
             @rtype: str|None
         """
         # Clear the key's buffer:
-        event.clearEvents()
+        self.__clear_keys()
 
         if isinstance(keys, str):
             keys = [keys]
 
         keys = [k.lower() for k in keys] + [k.upper() for k in keys]
 
+        start_time = core.getTime()
+        start_cpu_time = sum(os.times()[:2])
+        key_pressed = None
+
         # Wait for input
         while timer is None or timer.getTime() >= 0:
             # Get the keys that were pressed that we are watching
-            keys_pressed = event.getKeys(keyList=keys)
+            keys_pressed = self.__get_keys(keys)
             if len(keys_pressed) != 0:
-                return keys_pressed[0]
+                key_pressed = keys_pressed[0]
+                break
 
             if len(event.getKeys(keyList=["escape"])) != 0:
                 self.experiment.save_data()
                 sys.exit()
 
-        return None
+            # Sleep until the next check, unless the timer is about to run out
+            sleep_time = self.config.input_poll_interval
+            if timer is not None:
+                sleep_time = min(sleep_time, timer.getTime() - self.config.input_hog_period)
+            if sleep_time > 0:
+                core.wait(sleep_time, hogCPUperiod=0)
+
+        end_time = core.getTime()
+        info = {'cpu_time': sum(os.times()[:2]) - start_cpu_time}
+        if key_pressed is not None:
+            info['key_latency'] = end_time - key_pressed[1]
+        self.experiment.log_timing('wait_for_prompt', end_time - start_time, **info)
+
+        if key_pressed is None:
+            return None
+        return key_pressed[0]
 
     def close(self):
         """ Closes this window"""
+        self._prefetcher.close()
+        if self._assets is not None:
+            # Keep the copies that were made during the session
+            self._assets.save()
         self._window.close()
 
     def get_input_text(self, prompt=None, prompt_font_size=24, input_font_size=20, submit_key='0'):
@@ -281,39 +689,46 @@ class Window:
         show the user what they type until they press {submit_key} and the text is
         submitted and returned by this function
 
-        @rtype: str
-        """
-        # Calculate font sizes in cm
-        prompt_font_size = pt_to_cm(prompt_font_size)
-        input_font_size = pt_to_cm(input_font_size)
-
-        # Clear the keys buffer
-        event.getKeys()
+        Checks for keys every input_poll_interval, handles all the keys that were pressed since the last check at once,
+        and only redraws the screen when the text changed. How long it took, how many keys were pressed and how many
+        times the screen was redrawn are added to the timing log.
 
+        @return (str, lst(float)): The text, and when each key was pressed in seconds after the prompt appeared. The
+        last one is the submit key
+        """
         # Set up the prompt's textbox's text
         prompt = "" if prompt is None or prompt == "" else prompt + ". "
         text = prompt + "Please type in your answer, press the key '{}' to submit it:".format(submit_key)
 
-        # Make the prompt textbox
-        text_instr = visual.TextStim(win=self._window, text=text, color=-1, wrapWidth=self.scalar_norm_to_cm(1.8),
-                                     alignHoriz='left', alignVert='top', units='cm',
-                                     pos=self.norm_to_cm((-.9, .9)), height=prompt_font_size)
+        # Make the textboxes, or reuse the ones from the last time this prompt was shown
+        text_instr, input_box = self.__get_input_stims(text, prompt_font_size, input_font_size)
 
-        # Set up a textbox for user input
-        input_text = ""
+        # Clear the keys buffer
+        self.__clear_keys()
 
-        input_box = visual.TextStim(win=self._window, text=input_text, color=-1, units='cm', height=input_font_size,
-                                    wrapWidth=self.scalar_norm_to_cm(1.8))
+        input_text = ""
+        key_times = []
+        redraws = 0
+        start_time = None
+        changed = True
 
         # Get user input
         inputting = True
-
         while inputting:
-            # Get the keys that were pressed
-            keys = event.getKeys()
-
-            # Handle each key. Some key presses have special meaning
-            for key in keys:
+            if changed:
+                # Draw what the user wrote and the instructions to the screen
+                input_box.text = input_text
+                input_box.draw()
+                text_instr.draw()
+                flip_time = self.__flip()
+                if start_time is None:
+                    start_time = flip_time
+                redraws += 1
+                changed = False
+
+            # Handle each key that was pressed since the last check. Some key presses have special meaning
+            for key, key_time in self.__get_keys(None):
+                key_times.append(key_time - start_time)
                 if key == submit_key:
                     # submit_key means we submit the captured text
                     inputting = False
@@ -322,36 +737,50 @@ class Window:
                     # escape means we exit the experiment
                     self.experiment.save_data()
                     core.quit()
-                elif key == 'space':
-                    # space means we add a blank
-                    input_text += ' '
                 elif key == 'backspace':
                     # backspace means we delete a char
                     if len(input_text) > 0:
                         input_text = input_text[:-1]
-                elif key == 'return':
-                    # return means we add a newline
-                    input_text += '\n'
-                elif key == 'comma':
-                    input_text += ','
-                elif key == 'period':
-                    input_text += '.'
+                        changed = True
+                elif key in _TYPED_KEYS:
+                    input_text += _TYPED_KEYS[key]
+                    changed = True
                 elif len(key) == 1 and key.isalnum():
                     # Regular character to be inputted
                     input_text += key
+                    changed = True
+
+            if inputting and not changed:
+                core.wait(self.config.input_poll_interval, hogCPUperiod=0)
 
-            # Draw what the user wrote and the instructions to the screen
-            input_box.text = input_text
-            input_box.draw()
-            text_instr.draw()
-            self._window.flip()
+        self.experiment.log_timing('get_input_text', core.getTime() - start_time, keys=len(key_times),
+                                   redraws=redraws)
+        return input_text, key_times
 
-            # Only check evey 100 ms
-            core.wait(0.1, 0)
+    def __get_input_stims(self, text, prompt_font_size, input_font_size):
+        """ Gets the textboxes for the prompt and the input of get_input_text. They are made the first time they are
+        asked for, and kept, so the prompt is only laid out once. Should not use this outside of this file
 
-        return input_text
+        @param str text: The text of the prompt
+        @param int prompt_font_size: The font size of the prompt, in pt
+        @param int input_font_size: The font size of the input, in pt
+        @return (visual.TextStim, visual.TextStim): The prompt textbox and the input textbox
+        """
+        key = (text, prompt_font_size, input_font_size)
+        if key not in self._input_stims:
+            # Make the prompt textbox
+            text_instr = visual.TextStim(win=self._window, text=text, color=-1,
+                                         wrapWidth=self.scalar_norm_to_cm(1.8), alignHoriz='left', alignVert='top',
+                                         units='cm', pos=self.norm_to_cm((-.9, .9)),
+                                         height=pt_to_cm(prompt_font_size))
+
+            # Set up a textbox for user input
+            input_box = visual.TextStim(win=self._window, text="", color=-1, units='cm',
+                                        height=pt_to_cm(input_font_size), wrapWidth=self.scalar_norm_to_cm(1.8))
+            self._input_stims[key] = (text_instr, input_box)
+        return self._input_stims[key]
 
     def clear(self, time):
-        """ Clears the screen and pauses execution for the given amount of time"""
-        self._window.flip()
-        core.wait(time)
+        """ Clears the screen and keeps it clear for the whole number of frames closest to the given amount of time"""
+        self.__flip('blank', time)
+        self.__hold([])